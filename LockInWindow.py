@@ -0,0 +1,172 @@
+"""
+Модуль окна lock-in изображения, уточняемого во время записи
+"""
+
+import logging
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtWidgets import QDialog, QFrame, QGraphicsView, QLabel, QVBoxLayout
+
+from cameras import FrameDisplay
+from PreviewWindow import colorize
+from processing import LockInDemodulator, LockInResult
+from profiles import HeatingProfile
+from recording import BACKPRESSURE_DROP_NEWEST, AsyncFrameWriter, RecordingError
+from ui_constants import DIALOG_SMALL, WINDOW_MARGINS
+from ui_fonts import FORM_LABEL_FONT
+
+logger = logging.getLogger(__name__)
+
+
+class LiveLockIn(QObject):
+    """
+    Lock-in демодуляция записываемой термограммы на лету.
+
+    submit() вызывается потоком захвата для каждого записанного кадра: кадр
+    (в любой форме, как отдаёт get_radiometric_frame() - у Optris плоский)
+    приводится к shape (высота, ширина) радиометрических кадров камеры и
+    копируется в предвыделенный слот AsyncFrameWriter, как при записи, а
+    при заполненной очереди отбрасывается - подгонка по методу наименьших
+    квадратов допускает пропуски. Поток очереди собирает кадры модуляции в
+    пачки, обновляет по ним LockInDemodulator (опора фазы - заданная
+    мощность профиля) и не чаще update_interval выдаёт оценку.
+    """
+
+    MAX_BATCH = 32          # Кадров в одном обновлении
+
+    result_ready = Signal(object)   # LockInResult
+
+    def __init__(self, profile: HeatingProfile, start_time: float, shape: Tuple[int, int],
+                 update_interval: float = 1.0, max_queue: int = 64, parent=None):
+        super().__init__(parent)
+        self.profile = profile
+        self.start_time = start_time    # time.monotonic() начала профиля
+        self.shape = tuple(shape)
+        self.update_interval = update_interval
+        self.demodulator: Optional[LockInDemodulator] = None
+        self._batch: Optional[np.ndarray] = None
+        self._batch_times: List[float] = []
+        self._last_update = time.monotonic()
+        self._failed = False
+        self._writer = AsyncFrameWriter(
+            self._accumulate, self._finish, max_queue=max_queue, policy=BACKPRESSURE_DROP_NEWEST, name='lock-in'
+        )
+
+    @property
+    def dropped(self) -> int:
+        return self._writer.dropped
+
+    def submit(self, frame: np.ndarray, sync_time: float):
+        """
+        Кадр термограммы и его время (вызывается в потоке захвата, вне
+        блокировки записи). Не ждёт: одно копирование в слот очереди.
+        """
+        offset = sync_time - self.start_time
+        if self._failed or not 0 <= offset < self.profile.heating_duration:
+            return
+        try:
+            self._writer.submit(frame.reshape(self.shape), offset)
+        except (RecordingError, ValueError) as e:
+            self._fail(e)
+
+    def stop(self):
+        """Обрабатывает оставшиеся кадры и выдаёт итоговую оценку"""
+        self._writer.close()
+
+    def _fail(self, error: Exception):
+        # Ошибка обработки не должна мешать записи: сообщаем один раз и
+        # больше не принимаем кадры
+        if not self._failed:
+            self._failed = True
+            logger.error(f"Lock-in на лету остановлен: {error}")
+
+    def _accumulate(self, frame: np.ndarray, offset: float):
+        if self._failed:
+            return
+        try:
+            self._add(frame, offset)
+        except Exception as e:
+            self._fail(e)
+
+    def _add(self, frame: np.ndarray, offset: float):
+        if self._batch is None:
+            self._batch = np.empty((self.MAX_BATCH, *self.shape), dtype=frame.dtype)
+            self.demodulator = LockInDemodulator(self.shape, self.profile.frequency)
+        self._batch[len(self._batch_times)] = frame
+        self._batch_times.append(offset)
+        due = time.monotonic() - self._last_update >= self.update_interval
+        if due or len(self._batch_times) == self.MAX_BATCH:
+            self._update()
+        if due:
+            self._last_update = time.monotonic()
+            self._emit()
+
+    def _update(self):
+        times = np.array(self._batch_times)
+        self.demodulator.update(self._batch[:len(times)], times, self.profile.power(times))
+        self._batch_times = []
+
+    def _emit(self):
+        try:
+            self.result_ready.emit(self.demodulator.result())
+        except ValueError:
+            pass
+
+    def _finish(self):
+        if self.demodulator is None or self._failed:
+            return
+        if self._batch_times:
+            self._update()
+        self._emit()
+        if self.dropped:
+            logger.warning(f"Lock-in на лету: пропущено кадров {self.dropped}")
+
+
+class LockInWindow(QDialog):
+    """
+    Немодальное окно фазового изображения lock-in, которое сходится по мере
+    записи зоны с модулированным нагревом.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._last_phase: Optional[np.ndarray] = None
+        self._setup_window_properties()
+        self._create_widgets()
+        self._setup_layout()
+
+    def _setup_window_properties(self):
+        self.setModal(False)
+        self.setWindowTitle("Lock-in: фаза отклика")
+        self.resize(DIALOG_SMALL)
+
+    def _create_widgets(self):
+        self._view = QGraphicsView()
+        self._view.setFrameShape(QFrame.StyledPanel)
+        self._display = FrameDisplay(self._view)
+        self._status_label = QLabel("Ожидание кадров модуляции...")
+        self._status_label.setFont(FORM_LABEL_FONT)
+
+    def _setup_layout(self):
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(*WINDOW_MARGINS)
+        main_layout.addWidget(self._view, stretch=1)
+        main_layout.addWidget(self._status_label)
+
+    def reset(self):
+        """Подготовка к новой записи"""
+        self._last_phase = None
+        self._status_label.setText("Ожидание кадров модуляции...")
+
+    def show_result(self, result: LockInResult):
+        """Показывает текущую оценку и её изменение с прошлого обновления"""
+        self._display.show(colorize(result.phase, (-np.pi, np.pi)))
+        text = f"{result.frequency:g} Гц, кадров: {result.frames}"
+        if self._last_phase is not None:
+            change = np.angle(np.exp(1j * (result.phase[::4, ::4] - self._last_phase[::4, ::4])))
+            text += f", изменение фазы: {np.degrees(np.median(np.abs(change))):.2f}°"
+        self._last_phase = result.phase
+        self._status_label.setText(text)
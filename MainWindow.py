@@ -4,6 +4,7 @@
 import logging
 import os
 import shutil
+from typing import Optional
 import numpy as np
 from PySide6.QtCore import QTimer, QPropertyAnimation, QEasingCurve, Qt, QSize
 from PySide6.QtWidgets import (
@@ -14,10 +15,21 @@ from PySide6.QtWidgets import (
 from ui_fonts import TITLE_FONT, SUBTITLE_FONT
 from cameras import CameraFactory, CameraManager
 from FinishDialog import FinishDialog
-from heater_interface import Heater
+from heater import HeaterClient
+from cache import CACHE_DIR, ResultCache
+from LockInWindow import LiveLockIn, LockInWindow
+from jobs import ALGORITHMS, RESULT_IMAGES, JobScheduler, result_image, zone_result_files
+from mosaic import ZoneMosaic
+from pyramid import PYRAMID_DIR, TilePyramid
+from PreviewWindow import PreviewWindow
 from RetestDialog import RetestDialog
-from settings import Settings, UserData
+from settings import PreviewSettings, Settings, UserData
 from SettingsWindow import SettingsWindow
+from profiles import HeatingProfile
+from sequencer import (
+    EDGE_STATES, HEATER_STEPS, RECORDING_LEAD, RECORDING_START, JitterStats, Sequencer, StepTiming,
+    testing_schedule
+)
 from TrajectoryDialog import TrajectoryDialog
 from ui_constants import BUTTON_SIZE, WINDOW_MARGINS, WINDOW_MAIN_MIN, STATUS_BAR_LABEL_SIZE
 logger = logging.getLogger(__name__)
@@ -34,12 +46,17 @@ class MainWindow(QMainWindow):
         }
     """
 
-    def __init__(self, heater: Heater, settings: Settings, parent=None):
+    def __init__(self, heater: HeaterClient, settings: Settings, parent=None):
         super().__init__(parent)
         
         # Сохраняем глобальные объекты
         self.heater = heater
+        self.heater.command_finished.connect(self._on_heater_confirmed)
+        self.heater.command_failed.connect(self._on_heater_failed)
         self.settings = settings
+        # Порт открывается сразу: первая команда нагрева не ждёт открытия
+        self.heater.open_channel()
+        self.heater.set_poll_interval(self.settings.heater_poll_interval)
         self.user_data = UserData.get_instance()
         
         # Поля состояния
@@ -48,6 +65,14 @@ class MainWindow(QMainWindow):
         self.progress = 0
         self.current_base_path = None
         
+        # Циклограмма нагрева и записи текущей зоны
+        self._sequencer: Optional[Sequencer] = None
+        self._heating_profile: Optional[HeatingProfile] = None
+        self._jitter = JitterStats()
+        # Lock-in изображение зоны с модулированным нагревом, уточняемое во время записи
+        self._live_lock_in: Optional[LiveLockIn] = None
+        self._lock_in_window: Optional[LockInWindow] = None
+        
         # Инициализация UI
         self._setup_window_properties()
         self._create_widgets()
@@ -56,6 +81,16 @@ class MainWindow(QMainWindow):
         self.update_position_status(*self.current_position)
         self._connect_signals()
         
+        # Фоновая обработка записанных зон
+        self._jobs = JobScheduler(workers=self.settings.processing_workers, parent=self)
+        self._jobs.progress_changed.connect(self.update_processing_status)
+        self._jobs.job_finished.connect(self.add_zone_to_mosaic)
+        
+        # Мозаика обработанных зон (создаётся по первому результату)
+        self._mosaic: Optional[ZoneMosaic] = None
+        self._mosaic_pyramid: Optional[TilePyramid] = None   # Тайлы мозаики на диске для просмотра
+        self._mosaic_zones = {}     # Зона -> (позиция в сетке, кадр видимой камеры)
+        
         # Инициализация
         self._initialize_cameras()
         self._initialize_timers()
@@ -148,7 +183,8 @@ class MainWindow(QMainWindow):
         self._settings_button.clicked.connect(self.open_settings_window)
 
     def _initialize_cameras(self):
-        self._camera_manager = CameraManager()
+        self._camera_manager = CameraManager(sync_tolerance=self.settings.sync_tolerance_ms / 1000)
+        self._camera_manager.heater_telemetry = self.heater.telemetry
         
         try:
             self._visible_camera = CameraFactory.create_camera(
@@ -182,14 +218,6 @@ class MainWindow(QMainWindow):
             )
 
     def _initialize_timers(self):
-        self._heating_timer = QTimer()
-        self._heating_timer.setSingleShot(True)
-        self._heating_timer.timeout.connect(self.start_cooling)
-        
-        self._cooling_timer = QTimer()
-        self._cooling_timer.setSingleShot(True)
-        self._cooling_timer.timeout.connect(self.finish_testing)
-        
         self._progress_bar_animation = QPropertyAnimation(self._progress_bar, b"value")
         self._progress_bar_animation.setEasingCurve(QEasingCurve.Linear)
 
@@ -211,35 +239,128 @@ class MainWindow(QMainWindow):
         # Деактивируем кнопку Start
         self._play_button.setEnabled(False)
         
-        # Начинаем запись видео на всех камерах
+        # Запись, нагрев и охлаждение выполняет поток циклограммы по монотонным
+        # часам: занятый цикл событий Qt не сдвигает фронты нагрева. Окно
+        # обновляется по сигналам уже после выполнения шагов
         try:
-            self._camera_manager.start_recording_all(base_path)
+            self._heating_profile = HeatingProfile.from_settings(self.settings)
+        except ValueError as e:
+            QMessageBox.critical(self, "Профиль нагрева", str(e))
+            self._reset_main_window_state()
+            return
+        steps = testing_schedule(
+            self._heating_profile, self.settings.duration_of_testing,
+            lambda: self._camera_manager.start_recording_all(base_path),
+            self.heater.turn_on, self.heater.turn_off, self._camera_manager.stop_recording_all
+        )
+        # Проверка связи не должна задерживать команды циклограммы
+        self.heater.set_poll_interval(0)
+        self._sequencer = Sequencer(
+            steps, on_step=self._mark_sequence_step,
+            on_abort=(self.heater.turn_off, self._camera_manager.stop_recording_all), parent=self
+        )
+        self._sequencer.finished.connect(self._sequencer.deleteLater)
+        self._sequencer.step_done.connect(self._on_sequence_step)
+        self._sequencer.step_failed.connect(self._on_sequence_failed)
+        self._sequencer.sequence_finished.connect(self._on_sequence_finished)
+        self._process_status_label.setText("Подготовка записи...")
+        self._sequencer.start()
+
+    def _mark_sequence_step(self, timing: StepTiming):
+        """
+        Отмечает фронты нагрева в записи (вызывается в потоке циклограммы).
+        Момент отправки первой команды включения - граница фона и нагрева:
+        кадры до него (включая предзапись) - холодное состояние объекта.
+        Все фронты профиля сохраняются в sidecar для lock-in обработки.
+        """
+        if timing.name == RECORDING_START:
+            self._camera_manager.start_modulation(self._heating_profile.to_dict(), timing.planned + RECORDING_LEAD)
+        if timing.name in EDGE_STATES:
+            self._camera_manager.mark_modulation_edge(
+                EDGE_STATES[timing.name], timing.actual, planned_time=timing.planned, confirmed_time=timing.confirmed
+            )
+        if timing.name in HEATER_STEPS:
+            self._camera_manager.mark_event(
+                timing.name, timing.actual, planned_time=timing.planned, confirmed_time=timing.confirmed
+            )
+
+    def _on_sequence_step(self, name: str, planned: float, actual: float):
+        """Обновляет окно после выполненного шага циклограммы"""
+        if name == RECORDING_START:
             self.update_recording_status(is_recording=True)
-        except Exception as e:
-            logger.error(f"Не удалось начать запись видео: {e}")
+            if self._heating_profile.kind != 'pulse':
+                self._start_live_lock_in(planned + RECORDING_LEAD)
+        elif name == CameraManager.HEATING_EVENT:
+            self.start_heating()
+        elif name == CameraManager.COOLING_EVENT:
+            self.start_cooling()
+
+    def _on_sequence_failed(self, name: str, error: str):
+        """
+        Сообщает об ошибке шага. Ошибка записи или включения нагрева прерывает
+        циклограмму, файлы зоны удаляются по её завершении (_on_sequence_finished)
+        """
+        if name == RECORDING_START:
             QMessageBox.critical(
                 self, 
                 "Ошибка камер", 
-                f"Не удалось запустить запись: {e}"
+                f"Не удалось запустить запись: {error}"
             )
-            self.stop_testing()
-            return
-        
-        # Включаем нагрев
-        try:
-            self.heater.turn_on()
-            self.update_heater_status(is_on=True)
-        except Exception as e:
-            logger.error(f"Не удалось включить нагреватель: {e}")
-            self.update_heater_status(is_on=False, has_error=True)
+        elif name == CameraManager.HEATING_EVENT:
             QMessageBox.critical(
                 self, 
                 "Нагреватель: ошибка", 
-                f"Не удалось запустить нагреватель: {e}"
+                f"Не удалось запустить нагреватель: {error}"
             )
-            self.stop_testing()
+
+    def _on_sequence_finished(self, stats: dict):
+        """Журналирует точность шагов циклограммы и завершает контроль зоны"""
+        sequencer = self._sequencer
+        if sequencer is None:
             return
-        
+        self._sequencer = None
+        self.heater.set_poll_interval(self.settings.heater_poll_interval)
+        self._stop_live_lock_in()
+        self._jitter.add(sequencer.timings)
+        summary = self._jitter.summary()
+        logger.info(f"Шаги циклограммы: {stats['steps']}; за сессию: {summary}")
+        if summary['steps']:
+            self.lbl_heater.setToolTip(
+                f"Опоздание фронтов: среднее {summary['mean_ms']:.2f} мс, "
+                f"95% {summary['p95_ms']:.2f} мс, наибольшее {summary['max_ms']:.2f} мс"
+            )
+        if stats['completed']:
+            self.finish_testing()
+        else:
+            self._discard_testing()
+
+    def _start_live_lock_in(self, start_time: float):
+        """Запускает lock-in обработку записываемой термограммы и показывает её окно"""
+        camera = self._camera_manager.cameras.get('thermal')
+        if camera is None:
+            return
+        raw_width, raw_height = camera.get_radiometric_resolution()
+        self._live_lock_in = LiveLockIn(self._heating_profile, start_time, (raw_height, raw_width), parent=self)
+        if self._lock_in_window is None:
+            self._lock_in_window = LockInWindow(parent=self)
+        self._lock_in_window.reset()
+        self._live_lock_in.result_ready.connect(self._lock_in_window.show_result)
+        camera.thermogram_observer = self._live_lock_in.submit
+        self._lock_in_window.show()
+
+    def _stop_live_lock_in(self):
+        """Отключает lock-in обработку от камеры и дожидается итоговой оценки"""
+        if self._live_lock_in is None:
+            return
+        camera = self._camera_manager.cameras.get('thermal')
+        if camera is not None:
+            camera.thermogram_observer = None
+        self._live_lock_in.stop()
+        self._live_lock_in.deleteLater()
+        self._live_lock_in = None
+
+    def start_heating(self):
+        """Отображает процесс нагрева"""
         # Обновляем текст с оставшимся временем
         self._process_status_label.setText(
             f"Нагрев... (осталось {self.settings.heating_duration} с)"
@@ -257,21 +378,9 @@ class MainWindow(QMainWindow):
         self._progress_bar_animation.setStartValue(0)
         self._progress_bar_animation.setEndValue(100)
         self._progress_bar_animation.start()
-        
-        # Запускаем таймер нагрева
-        heating_duration = self.settings.heating_duration * 1000
-        self._heating_timer.start(heating_duration)
 
     def start_cooling(self):
-        """Переходит к процессу охлаждения"""
-        # Выключаем нагреватель
-        try:
-            self.heater.turn_off()
-            self.update_heater_status(is_on=False)
-        except Exception as e:
-            logger.error(f"Ошибка выключения нагревателя: {e}")
-            self.update_heater_status(is_on=True, has_error=True)
-        
+        """Отображает процесс охлаждения"""
         # Обновляем текст процесса
         cooling_duration = (
             self.settings.duration_of_testing - self.settings.heating_duration
@@ -279,20 +388,21 @@ class MainWindow(QMainWindow):
         self._process_status_label.setText(
             f"Охлаждение... (осталось {cooling_duration} с)"
         )
-        
-        # Запускаем таймер охлаждения
-        cooling_duration_ms = cooling_duration * 1000
-        self._cooling_timer.start(cooling_duration_ms)
+
+    def _on_heater_confirmed(self, command: str, confirmed_time: float):
+        """Отображает подтверждённое контроллером состояние нагревателя"""
+        self.update_heater_status(is_on=self.heater.state)
+
+    def _on_heater_failed(self, command: str, error: str):
+        """Отображает неподтверждённую команду нагревателю"""
+        self.update_heater_status(is_on=self.heater.state, has_error=True)
 
     def finish_testing(self):
-        """Завершает процесс контроля и запись видео"""
-        # Останавливаем таймеры
-        self._heating_timer.stop()
-        self._cooling_timer.stop()
-        
-        # Останавливаем запись на всех камерах
-        self._camera_manager.stop_recording_all()
-        self.update_recording_status(is_recording=False)
+        """Завершает процесс контроля (запись остановлена циклограммой)"""
+        self.update_recording_status(
+            is_recording=False,
+            stats=self._camera_manager.get_last_recording_stats()
+        )
         
         # Деактивируем кнопку Stop после успешного завершения
         self._stop_button.setEnabled(False)
@@ -309,26 +419,24 @@ class MainWindow(QMainWindow):
         self._process_status_label.setText("Контроль зоны успешно завершён!")
         logger.info(f"Контроль зоны {tuple(self.current_position)} завершён.")
         
+        # Обработка идёт, пока оператор выбирает и занимает следующую зону
+        # Lock-in обработка имеет смысл только для модулированного нагрева
+        algorithms = [name for name in self.settings.processing_algorithms if name != 'lockin']
+        if self._heating_profile is not None and self._heating_profile.kind != 'pulse':
+            algorithms.append('lockin')
+        if algorithms:
+            self._mosaic_zones[self.current_base_path] = (
+                tuple(int(v) for v in self.current_position), self._visible_reference_frame()
+            )
+            self._jobs.set_cache(self._cache_root(), self.settings.cache_size_mb * 2 ** 20)
+            self._jobs.submit_zone(self.current_base_path, algorithms)
+        
         # Переход к следующему действию
         self.open_trajectory_dialog()
 
     def stop_testing(self):
-        """Прерывает процесс контроля"""
-        # Останавливаем таймеры
-        self._heating_timer.stop()
-        self._cooling_timer.stop()
-        
-        # Выключаем нагреватель
-        try:
-            self.heater.turn_off()
-            self.update_heater_status(is_on=False)
-        except Exception as e:
-            logger.error(f"Ошибка выключения нагревателя при прерывании: {e}")
-            self.update_heater_status(is_on=False, has_error=True)
-        
-        # Останавливаем запись на всех камерах
-        self._camera_manager.stop_recording_all()
-        self.update_recording_status(is_recording=False)
+        """Прерывает процесс контроля, не дожидаясь ответа нагревателя"""
+        self._stop_button.setEnabled(False)
         
         # Останавливаем анимацию прогресс-бара
         self._progress_bar_animation.stop()
@@ -337,9 +445,22 @@ class MainWindow(QMainWindow):
         if hasattr(self, '_status_update_timer'):
             self._status_update_timer.stop()
         
-        # Обновляем статус
-        self._process_status_label.setText("Контроль прерван")
         logger.warning("Контроль был прерван пользователем")
+        if self._sequencer is not None:
+            # Нагрев выключит и запись остановит поток циклограммы после
+            # текущего шага, файлы удаляются по его завершении
+            self._sequencer.abort()
+            self._process_status_label.setText("Прерывание контроля...")
+            return
+        
+        self.heater.turn_off_async()
+        self._camera_manager.stop_recording_all()
+        self._discard_testing()
+
+    def _discard_testing(self):
+        """Удаляет записи прерванного контроля и сбрасывает окно"""
+        self.update_recording_status(is_recording=False)
+        self._process_status_label.setText("Контроль прерван")
         
         # Удаляем записанные файлы текущей зоны
         self.delete_current_zone_files()
@@ -351,15 +472,75 @@ class MainWindow(QMainWindow):
         """Удаляет файлы текущей зоны при прерывании контроля"""
         try:
             if hasattr(self, 'current_base_path') and self.current_base_path:
-                # Удаляем файлы для всех камер
-                for camera_name in self._camera_manager.cameras.keys():
-                    file_path = f"{self.current_base_path}_{camera_name}.avi"
-                    if os.path.exists(file_path):
+                # Удаляем файлы для всех камер и результаты обработки
+                files = self._camera_manager.get_recording_files(self.current_base_path)
+                files += zone_result_files(self.current_base_path)
+                for file_path in files:
+                    # PNG-последовательность записывается в папку
+                    if os.path.isdir(file_path):
+                        shutil.rmtree(file_path)
+                        logger.info(f"Удалена папка: {file_path}")
+                    elif os.path.exists(file_path):
                         os.remove(file_path)
                         logger.info(f"Удален файл: {file_path}")
+                
+                # Результаты удалённых записей в кэше больше не понадобятся
+                cache_root = self._cache_root()
+                if cache_root and os.path.isdir(cache_root):
+                    ResultCache(cache_root, self.settings.cache_size_mb * 2 ** 20).invalidate(files)
         except Exception as e:
             logger.error(f"Ошибка при удалении файлов: {e}")
 
+    def _visible_reference_frame(self) -> Optional[np.ndarray]:
+        """Копия последнего кадра видимой камеры для совмещения зон в мозаике"""
+        ring = getattr(self._visible_camera, 'frame_ring', None)
+        if ring is None:
+            return None
+        seq, frame = ring.latest()
+        if frame is None:
+            return None
+        frame = frame.copy()
+        # Слот мог быть перезаписан во время копирования
+        return frame if ring.is_valid(seq) else None
+
+    def add_zone_to_mosaic(self, zone_base: str, algorithm: str, path: str):
+        """Добавляет обработанную зону в мозаику (пересчитывается только её окрестность)"""
+        if algorithm != self.settings.mosaic_algorithm or algorithm not in RESULT_IMAGES:
+            return
+        zone = self._mosaic_zones.pop(zone_base, None)
+        if zone is None:
+            return
+        position, frame = zone
+        try:
+            image = result_image(path, algorithm)
+            if self._mosaic is None or self._mosaic.tile_shape != image.shape:
+                self._mosaic = ZoneMosaic(image.shape, overlap=self.settings.mosaic_overlap)
+                self._mosaic_pyramid = None
+                if self.user_data.save_path:
+                    self._mosaic_pyramid = TilePyramid(
+                        os.path.join(self.user_data.save_path, PYRAMID_DIR), reset=True
+                    )
+            self._mosaic.add_zone(position, image, frame)
+            self._update_mosaic_pyramid()
+        except Exception as e:
+            logger.error(f"Не удалось добавить зону {position} в мозаику: {e}")
+
+    def _update_mosaic_pyramid(self):
+        """Переносит в тайлы на диске только изменённые области мозаики"""
+        if self._mosaic_pyramid is None:
+            return
+        try:
+            image, offset = self._mosaic.image()
+            self._mosaic_pyramid.update(image, offset, self._mosaic.updated_rects)
+        except OSError as e:
+            logger.error(f"Не удалось обновить тайлы мозаики: {e}")
+
+    def _cache_root(self) -> Optional[str]:
+        """Папка кэша результатов в папке сохранения сессии"""
+        if not self.user_data.save_path:
+            return None
+        return os.path.join(self.user_data.save_path, CACHE_DIR)
+
     def open_settings_window(self):
         """Открывает окно настроек"""
         self._settings_window = SettingsWindow(settings=self.settings, parent=self)
@@ -367,7 +548,18 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """Закрывает камеры при завершении работы приложения"""
+        # Дописываем очереди записи до остановки камер, чтобы файлы были целыми
+        if self._sequencer is not None:
+            self._sequencer.abort()
+            self._sequencer.wait()
+        self._stop_live_lock_in()
+        self._camera_manager.stop_recording_all()
         self._camera_manager.release_all()
+        self._jobs.shutdown()
+        
+        # Выключаем нагреватель: очередь команд выполняется до закрытия порта
+        self.heater.turn_off_async()
+        self.heater.close()
         event.accept()
 
     def update_status_text(self):
@@ -471,6 +663,14 @@ class MainWindow(QMainWindow):
 
     def handle_retest_confirm(self):
         """Обрабатывает подтверждение повторного контроля текущей зоны"""
+        # Обработка старой записи больше не нужна
+        if self.current_base_path:
+            self._jobs.cancel_zone(self.current_base_path)
+            self._mosaic_zones.pop(self.current_base_path, None)
+            if self._mosaic is not None:
+                self._mosaic.remove_zone(tuple(int(v) for v in self.current_position))
+                self._update_mosaic_pyramid()
+        
         # Удаляем записанные файлы текущей зоны
         self.delete_current_zone_files()
         
@@ -497,14 +697,17 @@ class MainWindow(QMainWindow):
             self._trajectory_dialog.allow_close_flag = True
             self._trajectory_dialog.close()
         
-        # Показываем сообщение о том, что функция в разработке
-        QMessageBox.information(
-            self,
-            "Предпросмотр",
-            "Функция предпросмотра ещё в разработке"
-        )
+        # Открываем окно предпросмотра на текущей зоне
+        if self.user_data.save_path:
+            preview_settings = PreviewSettings.get_instance()
+            preview_settings.number_of_zone = [int(v) for v in self.current_position]
+            preview_settings.current_frame = 0
+            preview_window = PreviewWindow(self.user_data.save_path, self._cache_root(), parent=self)
+            preview_window.exec()
+        else:
+            QMessageBox.information(self, "Предпросмотр", "Папка сохранения не выбрана")
         
-        # После закрытия сообщения снова открываем диалог выбора траектории
+        # После закрытия предпросмотра снова открываем диалог выбора траектории
         self.open_trajectory_dialog()
 
     def open_finish_dialog(self):
@@ -552,18 +755,15 @@ class MainWindow(QMainWindow):
         # Сбрасываем анимацию прогресс-бара
         self._progress_bar_animation.stop()
         
-        # Останавливаем все таймеры, если они запущены
-        self._heating_timer.stop()
-        self._cooling_timer.stop()
+        # Останавливаем таймеры, если они запущены
         if hasattr(self, '_status_update_timer'):
             self._status_update_timer.stop()
         
-        # Выключаем нагреватель на всякий случай
-        try:
-            self.heater.turn_off()
-            self.update_heater_status(is_on=False)
-        except:
-            pass
+        # Выключаем нагреватель на всякий случай (циклограмма, если идёт, выключит его сама)
+        if self._sequencer is not None:
+            self._sequencer.abort()
+        else:
+            self.heater.turn_off_async()
         
         # Обновляем текст статуса
         self._process_status_label.setText("Готов к началу")
@@ -575,6 +775,7 @@ class MainWindow(QMainWindow):
         self.status_bar.setStyleSheet("QLabel { padding: 0 5px; }")
         self.lbl_position = QLabel("Координаты: (0, 0)")
         self.lbl_heater = QLabel("Нагреватель: выкл")
+        self.lbl_heater_link = QLabel("Связь: нет данных")
         
         self.lbl_cam_vis = QLabel("Камера: ожидание")
         self.lbl_fps_vis = QLabel("FPS: 0")
@@ -583,24 +784,29 @@ class MainWindow(QMainWindow):
         self.lbl_fps_therm = QLabel("FPS: 0")
         
         self.lbl_recording = QLabel(" Запись: выкл")
+        self.lbl_processing = QLabel("Обработка: нет")
         self.lbl_disk = QLabel("Диск: вычисление...")
 
-        for label in [self.lbl_position, self.lbl_heater, self.lbl_cam_vis, self.lbl_fps_vis, self.lbl_cam_therm, self.lbl_fps_therm, self.lbl_recording]:
+        for label in [self.lbl_position, self.lbl_heater, self.lbl_heater_link, self.lbl_cam_vis, self.lbl_fps_vis, self.lbl_cam_therm, self.lbl_fps_therm, self.lbl_recording]:
             label.setFixedSize(STATUS_BAR_LABEL_SIZE) # Для всех одинаковый размер
 
 
         self.status_bar.addWidget(self.lbl_position)
         self.status_bar.addWidget(self.lbl_heater)
+        self.status_bar.addWidget(self.lbl_heater_link)
         self.status_bar.addWidget(self.lbl_cam_vis)
         self.status_bar.addWidget(self.lbl_fps_vis)
         self.status_bar.addWidget(self.lbl_cam_therm)
         self.status_bar.addWidget(self.lbl_fps_therm)
 
         self.status_bar.addPermanentWidget(self.lbl_recording)
+        self.status_bar.addPermanentWidget(self.lbl_processing)
         self.status_bar.addPermanentWidget(self.lbl_disk)
 
         self.telemetry_timer = QTimer(self)
         self.telemetry_timer.timeout.connect(self._update_disk_space)
+        self.telemetry_timer.timeout.connect(self._update_cameras_telemetry)
+        self.telemetry_timer.timeout.connect(self._update_heater_telemetry)
         self.telemetry_timer.start(500)
         self._update_disk_space()
 
@@ -626,6 +832,53 @@ class MainWindow(QMainWindow):
         except Exception as e:
             self.lbl_disk.setText("Свободно: ошибка")
 
+    def _update_cameras_telemetry(self):
+        """Обновляет состояние и фактический FPS камер в строке состояния"""
+        if not hasattr(self, '_camera_manager'):
+            return
+        for cam_type, camera in self._camera_manager.cameras.items():
+            if camera.is_acquiring():
+                status = "ОК"
+            elif camera.is_disconnected:
+                status = "Ошибка"
+            else:
+                status = "Ожидание"
+            self.update_camera_telemetry(cam_type, status, round(camera.get_fps()))
+        
+        if any(camera.is_recording for camera in self._camera_manager.cameras.values()):
+            self.update_recording_status(True, self._camera_manager.get_recording_stats())
+
+    def _update_heater_telemetry(self):
+        """
+        Обновляет состояние линии связи с нагревателем: время ответа,
+        тайм-ауты и повторы за последнюю минуту, температуру и ток элемента
+        """
+        summary = self.heater.telemetry.summary()
+        if not summary['attempts']:
+            self.lbl_heater_link.setText("Связь: нет данных")
+            self.lbl_heater_link.setStyleSheet("color: palette(window-text);")
+            return
+        if 'p95_ms' in summary:
+            self.lbl_heater_link.setText(f"Связь: {summary['p95_ms']:.0f} мс")
+        else:
+            self.lbl_heater_link.setText("Связь: нет ответа")
+        color = "#e74c3c" if summary['degraded'] else "palette(window-text)"
+        self.lbl_heater_link.setStyleSheet(f"color: {color};")
+        lines = [
+            f"Попыток за минуту: {summary['attempts']}",
+            f"Повторов: {summary['retries']}, тайм-аутов: {summary['timeouts']}, ошибок: {summary['errors']}",
+        ]
+        if 'p95_ms' in summary:
+            lines.append(
+                f"Ответ: среднее {summary['latency_ms']:.1f} мс, 95% {summary['p95_ms']:.1f} мс, "
+                f"наибольшее {summary['max_ms']:.1f} мс"
+            )
+        if 'temperature' in summary:
+            lines.append(f"Температура элемента: {summary['temperature']:.1f} °C")
+        if 'current' in summary:
+            lines.append(f"Ток: {summary['current']:.2f} А")
+        self.lbl_heater_link.setToolTip("\n".join(lines))
+
     def update_position_status(self, x: int, y: int):
         self.lbl_position.setText(f"Зона: ({x}, {y})")
 
@@ -639,13 +892,46 @@ class MainWindow(QMainWindow):
             self.lbl_heater.setText(f"Нагреватель: {state}")
             self.lbl_heater.setStyleSheet(f"color: {color};")
 
-    def update_recording_status(self, is_recording: bool):
+    def update_recording_status(self, is_recording: bool, stats: Optional[dict] = None):
+        """
+        stats: счётчики очередей записи {'queued', 'written', 'dropped'}
+        """
         if is_recording:
             self.lbl_recording.setText("Запись: идет")
             self.lbl_recording.setStyleSheet("color: #e74c3c; font-weight: bold;")
         else:
             self.lbl_recording.setText("Запись: выкл")
             self.lbl_recording.setStyleSheet("color: palette(window-text);")
+        
+        if stats:
+            if stats['dropped']:
+                self.lbl_recording.setText(f"Пропущено: {stats['dropped']}")
+            self.lbl_recording.setToolTip(
+                f"В очереди: {stats['queued']}\n"
+                f"Записано: {stats['written']}\n"
+                f"Пропущено: {stats['dropped']}"
+            )
+
+    def update_processing_status(self, stats: dict):
+        """
+        stats: состояние очереди обработки {'total', 'done', 'failed', 'queued', 'running'}
+        """
+        if not stats['total']:
+            self.lbl_processing.setText("Обработка: нет")
+        elif stats['running'] or stats['queued']:
+            self.lbl_processing.setText(f"Обработка: {stats['done'] + stats['failed']}/{stats['total']}")
+        else:
+            self.lbl_processing.setText("Обработка: готово")
+        
+        if stats['failed']:
+            self.lbl_processing.setStyleSheet("color: #e74c3c;")
+        else:
+            self.lbl_processing.setStyleSheet("color: palette(window-text);")
+        
+        running = [f"{zone}: {ALGORITHMS[algorithm].title}" for zone, algorithm in stats['running']]
+        self.lbl_processing.setToolTip(
+            "\n".join(running + [f"В очереди: {stats['queued']}", f"Ошибок: {stats['failed']}"])
+        )
 
     def update_camera_telemetry(self, cam_type: str, status: str, fps: int = 0):
         """
@@ -0,0 +1,644 @@
+"""
+Модуль окна предпросмотра записанных зон
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from PySide6.QtCore import QSize, Qt, QThread, QTimer, Signal
+from PySide6.QtGui import QIcon, QImage, QPainter, QPixmap
+from PySide6.QtWidgets import (
+    QButtonGroup, QDialog, QFrame, QGraphicsPixmapItem, QGraphicsScene, QGraphicsView, QHBoxLayout,
+    QLabel, QListView, QListWidget, QListWidgetItem, QPushButton, QRadioButton, QSlider, QTabWidget,
+    QVBoxLayout, QWidget
+)
+
+from cameras import FrameDisplay
+from jobs import (
+    RESULT_IMAGES, differential_path, find_zones, load_zone, result_image, result_path, thermogram_path
+)
+from pyramid import PYRAMID_DIR, TileLoader, TilePyramid
+from recording import FrameSource, open_frame_source
+from settings import PreviewSettings
+from sync import HEATING_EVENT, SIDECAR_SUFFIX, event_frame, paired_frame, read_sidecar
+from ui_constants import BUTTON_SIZE, WINDOW_MAIN, WINDOW_MARGINS, LAYOUT_SPACING
+from ui_fonts import FORM_LABEL_FONT, SUBTITLE_FONT
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = QSize(160, 120)
+THUMBNAIL_DIR = 'thumbnails'        # Папка миниатюр внутри папки кэша
+THERMAL_COLORMAP = cv2.COLORMAP_INFERNO
+
+# Режимы отображения термограммы: (атрибут PreviewSettings или None, подпись)
+DISPLAY_MODES = {
+    'raw': (None, "Термограмма"),
+    'bs': ('bs_alg', "Вычитание фона"),
+    'fft': ('fft_alg', "Фазовая (FFT)"),
+    'pca': ('pca_alg', "Главные компоненты"),
+}
+
+
+# ==================== RENDERING ====================
+def display_range(image: np.ndarray, step: int = 4) -> Tuple[float, float]:
+    """Диапазон палитры по 1-му и 99-му процентилям (по каждому step-му пикселю)"""
+    sample = np.asarray(image[::step, ::step], dtype=np.float32)
+    sample = sample[np.isfinite(sample)]
+    if not sample.size:
+        return 0.0, 1.0
+    low, high = np.percentile(sample, (1, 99))
+    return float(low), float(high) if high > low else float(low) + 1.0
+
+
+def colorize(image: np.ndarray, value_range: Optional[Tuple[float, float]] = None) -> np.ndarray:
+    """Одноканальное изображение в BGR uint8 с палитрой THERMAL_COLORMAP (NaN - чёрный)"""
+    low, high = value_range or display_range(image)
+    scaled = (np.asarray(image, dtype=np.float32) - low) * (255.0 / (high - low))
+    missing = np.isnan(scaled)
+    np.clip(np.nan_to_num(scaled, copy=False), 0, 255, out=scaled)
+    colored = cv2.applyColorMap(scaled.astype(np.uint8), THERMAL_COLORMAP)
+    colored[missing] = 0
+    return colored
+
+
+def to_display(frame: np.ndarray) -> np.ndarray:
+    """Кадр видимой камеры в uint8 для FrameDisplay"""
+    if frame.dtype == np.uint8:
+        return frame
+    return cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+
+
+def _pixmap(image: np.ndarray) -> QPixmap:
+    image = np.ascontiguousarray(image)
+    height, width = image.shape[:2]
+    # fromImage копирует данные - массив можно освободить
+    return QPixmap.fromImage(QImage(image.data, width, height, image.strides[0], QImage.Format_BGR888))
+
+
+# ==================== ZONE DATA ====================
+class ZoneFiles:
+    """
+    Записи зоны, открываемые при первом обращении. Кадры не читаются
+    заранее: термограмма и разностная последовательность отображаются на
+    память, видео и сжатые записи декодируют только запрошенный кадр.
+    """
+
+    def __init__(self, zone_base: str):
+        self.zone_base = zone_base
+        self.sidecar = {}
+        sidecar_path = zone_base + SIDECAR_SUFFIX
+        if os.path.exists(sidecar_path):
+            try:
+                self.sidecar = read_sidecar(sidecar_path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Не удалось прочитать {sidecar_path}: {e}")
+        directory = os.path.dirname(zone_base)
+        visible = self.sidecar.get('cameras', {}).get('visible', {}).get('files', {}).get('video')
+        self.paths = {
+            'thermal': thermogram_path(zone_base),
+            'differential': differential_path(zone_base),
+            'visible': os.path.join(directory, visible) if visible else None,
+        }
+        self._sources: Dict[str, Optional[FrameSource]] = {}
+
+    def source(self, name: str) -> Optional[FrameSource]:
+        if name not in self._sources:
+            path = self.paths.get(name)
+            source = None
+            if path and os.path.exists(path):
+                try:
+                    source = open_frame_source(path)
+                except Exception as e:
+                    logger.error(f"Не удалось открыть {path}: {e}")
+            self._sources[name] = source
+        return self._sources[name]
+
+    def frames(self) -> int:
+        """Число кадров термограммы (шкала просмотра)"""
+        source = self.source('thermal')
+        return len(source) if source is not None else 0
+
+    def differential_index(self, index: int) -> int:
+        """Кадр разностной последовательности: она начинается с включения нагрева"""
+        heating = event_frame(self.sidecar, HEATING_EVENT) or 0
+        return max(index - heating, 0)
+
+    def visible_index(self, index: int) -> int:
+        """Кадр видимой камеры, снятый одновременно с кадром термограммы index"""
+        paired = paired_frame(self.sidecar, index)
+        return index if paired is None else paired
+
+    def close(self):
+        for source in self._sources.values():
+            if source is not None:
+                source.close()
+        self._sources = {}
+
+
+class ThumbnailCache:
+    """
+    Миниатюры зон на диске: одна .npz на термограмму, действительна, пока
+    не изменились размер и время изменения термограммы. Без папки (root is
+    None) миниатюры хранятся только в памяти.
+    """
+
+    def __init__(self, root: Optional[str]):
+        self.root = os.path.join(root, THUMBNAIL_DIR) if root else None
+        self._memory: Dict[str, Tuple[np.ndarray, Tuple[float, float]]] = {}
+        if self.root:
+            os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, source: str) -> str:
+        name = hashlib.sha1(os.path.abspath(source).encode('utf-8')).hexdigest()
+        return os.path.join(self.root, name + '.npz')
+
+    def get(self, source: str) -> Optional[Tuple[np.ndarray, Tuple[float, float]]]:
+        if source in self._memory:
+            return self._memory[source]
+        if not self.root:
+            return None
+        try:
+            stat = os.stat(source)
+            with np.load(self._path(source)) as data:
+                if int(data['size']) != stat.st_size or int(data['mtime_ns']) != stat.st_mtime_ns:
+                    return None
+                entry = data['thumbnail'], tuple(float(v) for v in data['range'])
+        except (OSError, ValueError, KeyError):
+            return None
+        self._memory[source] = entry
+        return entry
+
+    def put(self, source: str, thumbnail: np.ndarray, value_range: Tuple[float, float]):
+        self._memory[source] = (thumbnail, value_range)
+        if not self.root:
+            return
+        stat = os.stat(source)
+        path = self._path(source)
+        try:
+            with open(path + '.part', 'wb') as f:
+                np.savez(f, thumbnail=thumbnail, range=np.array(value_range),
+                         size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            os.replace(path + '.part', path)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить миниатюру {path}: {e}")
+
+
+def make_thumbnail(zone_base: str) -> Tuple[np.ndarray, Tuple[float, float]]:
+    """
+    Миниатюра зоны - кадр начала охлаждения (наибольший контраст) - и
+    диапазон палитры термограммы по нескольким кадрам записи.
+    """
+    zone = load_zone(zone_base)
+    source = open_frame_source(zone.thermogram)
+    try:
+        frames = len(source)
+        samples = np.linspace(0, frames - 1, min(frames, 8)).astype(int)
+        ranges = np.array([display_range(source.read(index)) for index in samples])
+        value_range = float(ranges[:, 0].min()), float(ranges[:, 1].max())
+        frame = source.read(min(zone.cooling_frame, frames - 1))
+        thumbnail = cv2.resize(colorize(frame, value_range), (THUMBNAIL_SIZE.width(), THUMBNAIL_SIZE.height()),
+                               interpolation=cv2.INTER_AREA)
+    finally:
+        source.close()
+    return thumbnail, value_range
+
+
+# ==================== WORKERS ====================
+class ThumbnailWorker(QThread):
+    """Фоновая подготовка миниатюр: из кэша или по одному кадру каждой записи"""
+
+    thumbnail_ready = Signal(str, object)   # база зоны, (миниатюра BGR, диапазон палитры)
+
+    def __init__(self, zones, cache: ThumbnailCache, parent=None):
+        super().__init__(parent)
+        self.zones = list(zones)
+        self.cache = cache
+
+    def run(self):
+        for zone_base in self.zones:
+            if self.isInterruptionRequested():
+                return
+            source = thermogram_path(zone_base)
+            entry = self.cache.get(source)
+            if entry is None:
+                try:
+                    entry = make_thumbnail(zone_base)
+                except Exception as e:
+                    logger.error(f"Не удалось подготовить миниатюру {zone_base}: {e}")
+                    continue
+                self.cache.put(source, *entry)
+            self.thumbnail_ready.emit(zone_base, entry)
+
+
+class FrameLoader(QThread):
+    """
+    Декодирование кадров для шкалы просмотра в отдельном потоке.
+
+    Запросы не копятся в очереди: новый запрос заменяет ещё не начатый,
+    поэтому при быстром перемещении ползунка декодируются только кадры, до
+    которых поток успевает дойти, и последний кадр показывается без
+    задержки на промежуточные. Записи прежней зоны закрываются в этом же
+    потоке после переключения.
+    """
+
+    # Кадр и пара (термограмма BGR, кадр видимой камеры), любой из них может быть None.
+    # None передаётся внутри кортежа: отдельным аргументом object между потоками
+    # PySide6 портит счётчик ссылок None
+    frame_ready = Signal(int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._condition = threading.Condition()
+        self._pending = None
+        self._stopped = False
+        self._zone: Optional[ZoneFiles] = None
+
+    def request(self, zone: ZoneFiles, index: int, stream: str, value_range: Optional[Tuple[float, float]]):
+        """Запрашивает кадр index; stream - 'thermal' или 'differential' (None - только видимая камера)"""
+        with self._condition:
+            self._pending = (zone, index, stream, value_range)
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    break
+                zone, index, stream, value_range = self._pending
+                self._pending = None
+            if zone is not self._zone:
+                if self._zone is not None:
+                    self._zone.close()
+                self._zone = zone
+            try:
+                thermal = visible = None
+                source = zone.source(stream) if stream else None
+                if source is not None and len(source):
+                    if stream == 'differential':
+                        index_in_stream = zone.differential_index(index)
+                    else:
+                        index_in_stream = index
+                    frame = source.read(min(index_in_stream, len(source) - 1))
+                    thermal = colorize(frame, value_range)
+                source = zone.source('visible')
+                if source is not None and len(source):
+                    visible = to_display(source.read(min(zone.visible_index(index), len(source) - 1)))
+            except Exception as e:
+                logger.error(f"Ошибка чтения кадра {index} зоны {zone.zone_base}: {e}")
+                continue
+            self.frame_ready.emit(index, (thermal, visible))
+        if self._zone is not None:
+            self._zone.close()
+
+
+# ==================== MOSAIC VIEW ====================
+class MosaicView(QGraphicsView):
+    """
+    Просмотр мозаики зон из пирамиды тайлов: после прокрутки и
+    масштабирования загружается только видимая область уровня, разрешение
+    которого соответствует масштабу.
+    """
+
+    ZOOM_STEP = 1.25
+
+    def __init__(self, root: str, parent=None):
+        super().__init__(parent)
+        self.loader = TileLoader(root)
+        self.scene = QGraphicsScene(self)
+        self.setScene(self.scene)
+        self.item = QGraphicsPixmapItem()
+        self.item.setTransformationMode(Qt.SmoothTransformation)
+        self.scene.addItem(self.item)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setRenderHint(QPainter.SmoothPixmapTransform)
+        self.value_range = (0.0, 1.0)
+        self._render_timer = QTimer(self)
+        self._render_timer.setSingleShot(True)
+        self._render_timer.timeout.connect(self._render)
+        self.horizontalScrollBar().valueChanged.connect(self._schedule_render)
+        self.verticalScrollBar().valueChanged.connect(self._schedule_render)
+        self.reload()
+
+    def reload(self):
+        """Перечитывает пирамиду (после добавления зон)"""
+        self.loader.clear()
+        bounds = self.loader.pyramid.bounds
+        if bounds is None:
+            return
+        top, left, height, width = bounds
+        self.scene.setSceneRect(left, top, width, height)
+        # Диапазон палитры по верхнему уровню - одинаковый при любом масштабе
+        level = self.loader.pyramid.levels - 1
+        factor = 2 ** level
+        self.value_range = display_range(
+            self.loader.region(level, top // factor, left // factor, -(-height // factor) + 1,
+                               -(-width // factor) + 1), step=1
+        )
+        self.fit()
+
+    def fit(self):
+        self.fitInView(self.scene.sceneRect(), Qt.KeepAspectRatio)
+        self._schedule_render()
+
+    def _schedule_render(self):
+        # Несколько событий прокрутки подряд - одна перерисовка
+        self._render_timer.start(0)
+
+    def _render(self):
+        bounds = self.loader.pyramid.bounds
+        if bounds is None:
+            return
+        visible = self.mapToScene(self.viewport().rect()).boundingRect().intersected(self.scene.sceneRect())
+        if visible.isEmpty():
+            return
+        level = self.loader.level_for_scale(self.transform().m11() * self.viewport().devicePixelRatioF())
+        factor = 2 ** level
+        top, left = math.floor(visible.top() / factor), math.floor(visible.left() / factor)
+        bottom, right = math.ceil(visible.bottom() / factor), math.ceil(visible.right() / factor)
+        region = self.loader.region(level, top, left, bottom - top, right - left)
+        self.item.setPixmap(_pixmap(colorize(region, self.value_range)))
+        self.item.setPos(left * factor, top * factor)
+        self.item.setScale(factor)
+
+    def wheelEvent(self, event):
+        factor = self.ZOOM_STEP if event.angleDelta().y() > 0 else 1 / self.ZOOM_STEP
+        self.scale(factor, factor)
+        self._schedule_render()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._schedule_render()
+
+
+# ==================== WINDOW ====================
+class PreviewWindow(QDialog):
+    """
+    Просмотр записанных зон сессии: лента миниатюр зон, кадры видимой
+    камеры и термограммы с шкалой кадров, результаты обработки и мозаика.
+    Выбор зоны, кадра, алгоритма и режима карты хранится в PreviewSettings.
+    """
+
+    def __init__(self, save_path: str, cache_root: Optional[str] = None, parent=None):
+        super().__init__(parent)
+        self.preview_settings = PreviewSettings.get_instance()
+        self.save_path = save_path
+        self.zones = find_zones(save_path)
+        self._zone: Optional[ZoneFiles] = None
+        self._zone_position: Optional[Tuple[int, int]] = None
+        self._ranges: Dict[str, Tuple[float, float]] = {}   # база зоны -> диапазон палитры термограммы
+        self._result_mode: Optional[str] = None             # Алгоритм показанного результата
+        self._closed = False
+
+        self._setup_window_properties()
+        self._create_widgets()
+        self._setup_layout()
+        self._connect_signals()
+
+        self._loader = FrameLoader(self)
+        self._loader.frame_ready.connect(self._show_frame)
+        self._loader.start()
+        self._thumbnails = ThumbnailWorker(self.zones.values(), ThumbnailCache(cache_root), self)
+        self._thumbnails.thumbnail_ready.connect(self._set_thumbnail)
+        self._thumbnails.start()
+
+        self._apply_settings()
+
+    def _setup_window_properties(self):
+        self.setModal(True)
+        self.setWindowTitle("Предпросмотр результатов")
+        self.resize(WINDOW_MAIN)
+
+    def _create_widgets(self):
+        # Лента зон
+        self._zone_strip = QListWidget()
+        self._zone_strip.setViewMode(QListView.IconMode)
+        self._zone_strip.setFlow(QListView.LeftToRight)
+        self._zone_strip.setWrapping(False)
+        self._zone_strip.setMovement(QListView.Static)
+        self._zone_strip.setIconSize(THUMBNAIL_SIZE)
+        self._zone_strip.setFixedHeight(THUMBNAIL_SIZE.height() + 50)
+        placeholder = QPixmap(THUMBNAIL_SIZE)
+        placeholder.fill(Qt.darkGray)
+        self._zone_items: Dict[str, QListWidgetItem] = {}
+        for (x, y), zone_base in sorted(self.zones.items()):
+            item = QListWidgetItem(QIcon(placeholder), f"Зона ({x}, {y})")
+            item.setData(Qt.UserRole, (x, y))
+            self._zone_strip.addItem(item)
+            self._zone_items[zone_base] = item
+
+        # Кадры зоны
+        self._visible_view = QGraphicsView()
+        self._thermal_view = QGraphicsView()
+        for view in (self._visible_view, self._thermal_view):
+            view.setFrameShape(QFrame.StyledPanel)
+        self._visible_display = FrameDisplay(self._visible_view)
+        self._thermal_display = FrameDisplay(self._thermal_view)
+
+        self._mode_buttons: Dict[str, QRadioButton] = {}
+        self._mode_group = QButtonGroup(self)
+        for mode, (_, title) in DISPLAY_MODES.items():
+            button = QRadioButton(title)
+            button.setFont(FORM_LABEL_FONT)
+            self._mode_group.addButton(button)
+            self._mode_buttons[mode] = button
+
+        self._frame_slider = QSlider(Qt.Horizontal)
+        self._frame_slider.setTracking(True)
+        self._frame_label = QLabel("Кадр: -")
+        self._frame_label.setFont(SUBTITLE_FONT)
+        self._message_label = QLabel("")
+        self._message_label.setFont(FORM_LABEL_FONT)
+
+        # Мозаика
+        pyramid_root = os.path.join(self.save_path, PYRAMID_DIR)
+        if TilePyramid.read_meta(pyramid_root) is not None:
+            self._map_view: QWidget = MosaicView(pyramid_root)
+        else:
+            self._map_view = QLabel("Мозаика появится после обработки зон")
+            self._map_view.setAlignment(Qt.AlignCenter)
+            self._map_view.setFont(SUBTITLE_FONT)
+
+        self._tabs = QTabWidget()
+        self._close_button = QPushButton("Закрыть")
+        self._close_button.setMinimumSize(BUTTON_SIZE)
+
+    def _setup_layout(self):
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(*WINDOW_MARGINS)
+        main_layout.setSpacing(LAYOUT_SPACING)
+        main_layout.addWidget(self._zone_strip)
+
+        zone_page = QWidget()
+        zone_layout = QVBoxLayout(zone_page)
+        views_layout = QHBoxLayout()
+        views_layout.addWidget(self._visible_view)
+        views_layout.addWidget(self._thermal_view)
+        zone_layout.addLayout(views_layout, 1)
+
+        modes_layout = QHBoxLayout()
+        for button in self._mode_buttons.values():
+            modes_layout.addWidget(button)
+        modes_layout.addStretch()
+        modes_layout.addWidget(self._message_label)
+        zone_layout.addLayout(modes_layout)
+
+        slider_layout = QHBoxLayout()
+        slider_layout.addWidget(self._frame_slider, 1)
+        slider_layout.addWidget(self._frame_label)
+        zone_layout.addLayout(slider_layout)
+
+        self._tabs.addTab(zone_page, "Зона")
+        self._tabs.addTab(self._map_view, "Карта")
+        main_layout.addWidget(self._tabs, 1)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self._close_button)
+        main_layout.addLayout(buttons_layout)
+
+    def _connect_signals(self):
+        self.preview_settings.data_changed.connect(self._apply_settings)
+        self._zone_strip.currentItemChanged.connect(self._on_zone_selected)
+        self._frame_slider.valueChanged.connect(self.preview_settings.set_current_frame)
+        self._mode_group.buttonClicked.connect(self._on_mode_selected)
+        self._tabs.currentChanged.connect(lambda index: self.preview_settings.set_map_flag(int(index == 1)))
+        self._close_button.clicked.connect(self.accept)
+
+    # ---------- Настройки просмотра ----------
+    def _on_zone_selected(self, item: Optional[QListWidgetItem]):
+        if item is not None:
+            self.preview_settings.set_number_of_zone(list(item.data(Qt.UserRole)))
+
+    def _on_mode_selected(self, button: QRadioButton):
+        settings = self.preview_settings
+        selected = next(mode for mode, candidate in self._mode_buttons.items() if candidate is button)
+        # Режимы взаимоисключающие: флаги остальных алгоритмов сбрасываются без лишних уведомлений
+        for mode, (attribute, _) in DISPLAY_MODES.items():
+            if attribute is not None and mode != selected:
+                setattr(settings, attribute, 0)
+        attribute = DISPLAY_MODES[selected][0]
+        if attribute is None:
+            settings.data_changed.emit()
+        else:
+            getattr(settings, f"set_{attribute}")(1)
+
+    def _display_mode(self) -> str:
+        # Если включено несколько флагов, показывается последний по DISPLAY_MODES
+        mode = 'raw'
+        for candidate, (attribute, _) in DISPLAY_MODES.items():
+            if attribute is not None and getattr(self.preview_settings, attribute):
+                mode = candidate
+        return mode
+
+    def _apply_settings(self):
+        """Приводит окно в соответствие с PreviewSettings"""
+        settings = self.preview_settings
+        position = tuple(settings.number_of_zone)
+        if position not in self.zones and self.zones:
+            position = max(self.zones)
+        zone_changed = position != self._zone_position
+        if zone_changed:
+            self._open_zone(position)
+
+        mode = self._display_mode()
+        self._mode_buttons[mode].setChecked(True)
+        self._tabs.blockSignals(True)
+        self._tabs.setCurrentIndex(1 if settings.map_flag else 0)
+        self._tabs.blockSignals(False)
+        if self._zone is None:
+            self._message_label.setText("Нет записанных зон")
+            return
+
+        frames = self._zone.frames()
+        self._frame_slider.blockSignals(True)
+        self._frame_slider.setRange(0, max(frames - 1, 0))
+        self._frame_slider.setValue(min(settings.current_frame, max(frames - 1, 0)))
+        self._frame_slider.blockSignals(False)
+        index = self._frame_slider.value()
+        self._frame_label.setText(f"Кадр: {index + 1} / {frames}")
+
+        self._message_label.setText("")
+        stream = {'raw': 'thermal', 'bs': 'differential'}.get(mode)
+        if stream is None and mode != self._result_mode and not self._show_result(mode):
+            # Результата ещё нет - показывается исходная термограмма
+            stream = 'thermal'
+        if stream is not None:
+            self._result_mode = None
+            if stream == 'differential' and self._zone.source('differential') is None:
+                self._message_label.setText("Разностная запись ещё не получена")
+        value_range = self._ranges.get(self._zone.zone_base) if stream == 'thermal' else None
+        self._loader.request(self._zone, index, stream, value_range)
+
+    def _open_zone(self, position: Tuple[int, int]):
+        self._zone_position = position
+        self._result_mode = None
+        zone_base = self.zones.get(position)
+        # Прежнюю зону закроет поток загрузки, когда переключится на новую
+        self._zone = ZoneFiles(zone_base) if zone_base else None
+        if zone_base in self._zone_items:
+            self._zone_strip.blockSignals(True)
+            self._zone_strip.setCurrentItem(self._zone_items[zone_base])
+            self._zone_strip.blockSignals(False)
+
+    def _show_result(self, mode: str) -> bool:
+        """Показывает результат алгоритма для зоны вместо кадров термограммы"""
+        path = result_path(self._zone.zone_base, mode)
+        if mode not in RESULT_IMAGES or not os.path.exists(path):
+            self._message_label.setText("Результат ещё не получен, показана термограмма")
+            return False
+        try:
+            image = result_image(path, mode)
+        except Exception as e:
+            logger.error(f"Не удалось прочитать результат {path}: {e}")
+            self._message_label.setText("Не удалось прочитать результат, показана термограмма")
+            return False
+        self._result_mode = mode
+        self._thermal_display.show(colorize(image))
+        return True
+
+    # ---------- Кадры и миниатюры ----------
+    def _show_frame(self, index: int, frames: tuple):
+        thermal, visible = frames
+        if visible is not None:
+            self._visible_display.show(visible)
+        if thermal is not None:
+            self._thermal_display.show(thermal)
+
+    def _set_thumbnail(self, zone_base: str, entry):
+        thumbnail, value_range = entry
+        self._ranges[zone_base] = value_range
+        item = self._zone_items.get(zone_base)
+        if item is not None:
+            item.setIcon(QIcon(_pixmap(thumbnail)))
+
+    def closeEvent(self, event):
+        self._shutdown()
+        super().closeEvent(event)
+
+    def done(self, result: int):
+        self._shutdown()
+        super().done(result)
+
+    def _shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.preview_settings.data_changed.disconnect(self._apply_settings)
+        self._thumbnails.requestInterruption()
+        self._thumbnails.wait()
+        self._loader.stop()
@@ -9,6 +9,7 @@ from PySide6.QtWidgets import (
     QSpinBox, QCheckBox, QMessageBox
 )
 from ui_fonts import TAB_FONT, FORM_LABEL_FONT
+from recording import RECORDER_BACKENDS, get_available_backends
 from settings import Settings
 from ui_constants import (
     CONTROL_HEIGHT,
@@ -306,12 +307,18 @@ class SettingsWindow(QMainWindow):
         )
         visible_record_layout.addWidget(self._visible_record_checkbox)
 
+        # Названия форматов записи -> ключи в настройках. Недоступные в этом
+        # окружении форматы показываются неактивными, чтобы сохранённый
+        # формат не подменялся первым в списке при сохранении
+        self._record_formats = {cls.title: cls.name for cls in RECORDER_BACKENDS.values()}
+
         format_layout, self._visible_record_format_combo = self._create_combo_row(
             "Формат записи видео:",
-            ["AVI", "MP4", "MKV"],
-            "AVI",
+            list(self._record_formats),
+            self._record_format_title(self._settings.visible_camera_record_format),
             font
         )
+        self._disable_unavailable_formats(self._visible_record_format_combo)
         visible_record_layout.addLayout(format_layout)
 
         fps_layout, self._visible_record_fps_combo = self._create_combo_row(
@@ -338,10 +345,11 @@ class SettingsWindow(QMainWindow):
 
         thermal_format_layout, self._thermal_record_format_combo = self._create_combo_row(
             "Формат записи видео:",
-            ["AVI", "MP4", "MKV"],
-            "AVI",
+            list(self._record_formats),
+            self._record_format_title(self._settings.thermal_camera_record_format),
             font
         )
+        self._disable_unavailable_formats(self._thermal_record_format_combo)
         thermal_record_layout.addLayout(thermal_format_layout)
 
         thermal_fps_layout, self._thermal_record_fps_combo = self._create_combo_row(
@@ -689,6 +697,20 @@ class SettingsWindow(QMainWindow):
         group.setStyleSheet(self.GROUP_BOX_STYLE)
         return group
 
+    @staticmethod
+    def _record_format_title(name):
+        """Возвращает название формата записи для комбобокса по ключу из настроек"""
+        backend = RECORDER_BACKENDS.get(name)
+        return backend.title if backend is not None else ''
+
+    @staticmethod
+    def _disable_unavailable_formats(combo):
+        """Делает неактивными форматы записи, недоступные в текущем окружении"""
+        available = {cls.title for cls in get_available_backends()}
+        for index in range(combo.count()):
+            if combo.itemText(index) not in available:
+                combo.model().item(index).setEnabled(False)
+
     def _load_settings(self):
         # TODO: загрузить настройки в UI элементы
         pass
@@ -699,6 +721,12 @@ class SettingsWindow(QMainWindow):
 
         try:
             # TODO: сохранить настройки из UI элементов
+            self._settings.set_visible_camera_record_format(
+                self._record_formats[self._visible_record_format_combo.currentText()]
+            )
+            self._settings.set_thermal_camera_record_format(
+                self._record_formats[self._thermal_record_format_combo.currentText()]
+            )
             self._settings.save_to_file()
 
             QMessageBox.information(
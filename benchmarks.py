@@ -0,0 +1,1438 @@
+"""
+Модуль замеров производительности конвейера камер и записи.
+
+Запуск без оборудования (используются заглушки камер):
+    python benchmarks.py            # все замеры
+    python benchmarks.py preview    # только выбранный замер
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import cv2
+import numpy as np
+import psutil
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QImage, QPixmap
+from PySide6.QtWidgets import QApplication, QGraphicsPixmapItem, QGraphicsScene, QGraphicsView
+
+from cameras import AcquisitionWorker, FrameDisplay, FrameRing, ThermalCamera
+from recording import (
+    BACKPRESSURE_POLICIES, AsyncFrameWriter, FrameDecimator, PreTriggerBuffer, RecordingError, ThermogramReader,
+    ThermogramWriter, create_backend, get_available_backends, open_frame_source, read_npy_chunks
+)
+from cache import ResultCache
+from heater import FakeHeaterController, Heater, HeaterError, HeaterSample, HeaterTelemetry, MockHeater
+from mosaic import ZoneMosaic
+from pyramid import TileLoader, TilePyramid
+from LockInWindow import LiveLockIn
+from PreviewWindow import PreviewWindow, ThumbnailCache
+from profiles import HeatingProfile
+from sequencer import EDGE_STATES, HEATER_STEPS, RECORDING_LEAD, Sequencer, testing_schedule
+from processing import (
+    DifferentialWriter, LockInDemodulator, lock_in, principal_components, pulsed_phase,
+    thermographic_signal_reconstruction
+)
+from settings import PreviewSettings, Settings
+from sync import (
+    SIDECAR_SUFFIX, FrameSynchronizer, build_sidecar, heater_telemetry, modulation_timeline, write_sidecar
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SlowThermalCamera(ThermalCamera):
+    """Заглушка тепловизора, имитирующая блокирующее ожидание кадра в SDK"""
+
+    def __init__(self, settings: Settings, graphics_view: QGraphicsView, capture_delay: float):
+        super().__init__(settings, graphics_view)
+        self.capture_delay = capture_delay
+        self.frames_shown = 0
+
+    def capture_frame(self):
+        time.sleep(self.capture_delay)
+        return super().capture_frame()
+
+    def _show_frame(self, frame, is_valid=None):
+        super()._show_frame(frame, is_valid)
+        self.frames_shown += 1
+
+
+def _run_event_loop(app: QApplication, seconds: float):
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    app.exec()
+
+
+def bench_preview(app: QApplication, seconds: float = 3.0) -> dict:
+    """
+    Сравнивает FPS двух панелей предпросмотра: опрос камер таймером в потоке
+    GUI (как было) и потоки захвата AcquisitionWorker.
+    """
+    settings = Settings()
+    settings.thermal_camera_previewFPS = 30
+    delays = (0.025, 0.010)  # «медленная» и «быстрая» камеры
+    results = {}
+
+    # Опрос таймером в потоке GUI: захват блокирует отрисовку обеих панелей
+    cameras = [SlowThermalCamera(settings, QGraphicsView(), d) for d in delays]
+    timers = []
+    for camera in cameras:
+        camera._initialized = True
+        timer = QTimer()
+        timer.timeout.connect(lambda c=camera: c._show_frame(c.capture_frame()))
+        timer.start(1000 // camera.get_preview_fps())
+        timers.append(timer)
+    _run_event_loop(app, seconds)
+    for timer in timers:
+        timer.stop()
+    results["gui_timer"] = [round(c.frames_shown / seconds, 1) for c in cameras]
+
+    # Потоки захвата: каждая камера ограничена только своей задержкой
+    cameras = [SlowThermalCamera(settings, QGraphicsView(), d) for d in delays]
+    for camera in cameras:
+        camera.initialize()
+    _run_event_loop(app, seconds)
+    for camera in cameras:
+        camera.release()
+    results["acquisition_worker"] = [round(c.frames_shown / seconds, 1) for c in cameras]
+
+    return results
+
+
+def bench_allocations(app: QApplication, seconds: float = 2.0) -> dict:
+    """
+    Проверяет, что в установившемся режиме конвейер захват → FrameRing →
+    отображение не выделяет память под кадры.
+    """
+    settings = Settings()
+    camera = ThermalCamera(settings, QGraphicsView())
+    camera.initialize()
+    _run_event_loop(app, seconds / 2)
+    warmup = camera.get_allocation_stats()
+    _run_event_loop(app, seconds / 2)
+    steady = camera.get_allocation_stats()
+    camera.release()
+
+    return {
+        "frames": steady["frames"] - warmup["frames"],
+        "ring_allocations": steady["allocations"] - warmup["allocations"],
+        "copy_writes": steady["copy_writes"] - warmup["copy_writes"],
+        "display_allocations": steady["display_allocations"] - warmup["display_allocations"],
+    }
+
+
+def bench_thermogram(app: QApplication, frames: int = 300) -> dict:
+    """
+    Сравнивает файл термограммы (.tgs) с AVI, который писался до него:
+    скорость записи, доступ к произвольному кадру и временной ряд пикселя
+    (640x480, как у Optris PI 640).
+    """
+    width, height = 640, 480
+    rng = np.random.default_rng(0)
+    sequence = rng.integers(0, 2 ** 14, size=(frames, height, width), dtype=np.uint16)
+    indices = rng.integers(0, frames, size=20)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tgs_path = os.path.join(tmp, "bench.tgs")
+        writer = ThermogramWriter(tgs_path, width, height, fps=32)
+        worst = 0.0
+        started = time.perf_counter()
+        for frame in sequence:
+            t = time.perf_counter()
+            writer.write(frame)
+            worst = max(worst, time.perf_counter() - t)
+        writer.close()
+        results["tgs_write_fps"] = round(frames / (time.perf_counter() - started), 1)
+        results["tgs_worst_write_ms"] = round(worst * 1000, 2)
+
+        avi_path = os.path.join(tmp, "bench.avi")
+        video = cv2.VideoWriter(avi_path, cv2.VideoWriter_fourcc(*'XVID'), 32, (width, height))
+        for frame in sequence:
+            video.write(cv2.applyColorMap((frame >> 6).astype(np.uint8), cv2.COLORMAP_JET))
+        video.release()
+
+        with ThermogramReader(tgs_path) as reader:
+            assert reader.shape == sequence.shape
+            assert np.array_equal(reader[frames - 1], sequence[-1])
+
+            started = time.perf_counter()
+            for i in indices:
+                np.asarray(reader.frame(int(i))).sum()
+            results["tgs_random_frame_ms"] = round((time.perf_counter() - started) / len(indices) * 1000, 3)
+
+            started = time.perf_counter()
+            np.asarray(reader.pixel_series(height // 2, width // 2)).copy()
+            results["tgs_pixel_series_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+        capture = cv2.VideoCapture(avi_path)
+        if capture.isOpened():
+            started = time.perf_counter()
+            for i in indices:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, int(i))
+                capture.read()
+            results["avi_random_frame_ms"] = round((time.perf_counter() - started) / len(indices) * 1000, 3)
+
+            # Временной ряд пикселя из видео требует декодировать все кадры
+            capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            started = time.perf_counter()
+            series = []
+            ok, frame = capture.read()
+            while ok:
+                series.append(frame[height // 2, width // 2, 0])
+                ok, frame = capture.read()
+            results["avi_pixel_series_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        capture.release()
+
+    return results
+
+
+def bench_decimation(app: QApplication, seconds: float = 2.0) -> dict:
+    """
+    Запись с заглушки тепловизора: кадров предпросмотра, кадров в видео
+    (должно соответствовать thermal_camera_recordFPS) и в термограмме
+    (каждый захваченный кадр). FrameDecimator на известных метках времени
+    (захват 27 Гц с джиттером): по одному кадру на каждый узел общей сетки
+    1/recordFPS без пропусков и накопления сдвига, в режиме усреднения -
+    среднее всех кадров интервала. Выход за допуски - CheckFailed.
+    """
+    settings = Settings()
+    settings.thermal_camera_previewFPS = 20
+    settings.thermal_camera_recordFPS = 5
+    settings.thermal_camera_record_averaging = True
+    settings.pretrigger_seconds = 0
+    camera = ThermalCamera(settings, QGraphicsView())
+    camera.initialize()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        camera.start_recording(os.path.join(tmp, "bench_thermal"))
+        decimator = camera.decimator
+        _run_event_loop(app, seconds)
+        camera.stop_recording()
+        camera.release()
+        with ThermogramReader(os.path.join(tmp, "bench_thermal.tgs")) as reader:
+            thermogram_frames = len(reader)
+
+    results = {
+        "captured": decimator.frames_in,
+        "video_frames": decimator.frames_out,
+        "video_fps": round(decimator.frames_out / seconds, 1),
+        "reduction": round(decimator.frames_in / max(1, decimator.frames_out), 1),
+        "thermogram_frames": thermogram_frames,
+    }
+
+    capture_fps, record_fps, duration = 27.0, settings.thermal_camera_recordFPS, 10.0
+    rng = np.random.default_rng(0)
+    count = int(capture_fps * duration)
+    timestamps = 100.0 + np.arange(count) / capture_fps + rng.uniform(-0.004, 0.004, count)
+    frames = rng.integers(0, 4096, size=(count, 4, 4), dtype=np.uint16)
+    decimator = FrameDecimator(record_fps, average=True, origin=0.0)
+    selected, mean_error, first = [], 0.0, 0
+    for index, (frame, timestamp) in enumerate(zip(frames, timestamps)):
+        output = decimator.push(frame, timestamp)
+        if output is not None:
+            expected = frames[first:index + 1].mean(axis=0)
+            mean_error = max(mean_error, float(np.abs(output.astype(np.float64) - expected).max()))
+            selected.append(timestamp)
+            first = index + 1
+    nodes = np.round(np.array(selected) * record_fps)
+    results["grid"] = {
+        "frames": len(selected),
+        "expected_frames": round(duration * record_fps),
+        "node_gaps": int(np.count_nonzero(np.diff(nodes) != 1)),
+        "max_offset_ms": round(float(np.abs(np.array(selected) - nodes / record_fps).max()) * 1000, 2),
+        "mean_error": round(mean_error, 3),
+    }
+    _check(results, [
+        ("video_frames", results["video_frames"] - record_fps * seconds, 1),
+        ("thermogram_every_frame", results["thermogram_frames"] - results["captured"], 0),
+        ("grid_frames", results["grid"]["frames"] - results["grid"]["expected_frames"], 1),
+        ("grid_node_gaps", results["grid"]["node_gaps"], 0),
+        # Кадр выбирается не раньше полкадра захвата до узла и не позже кадра после него
+        ("grid_offset_ms", results["grid"]["max_offset_ms"], 1000 / capture_fps + 4),
+        # Среднее округляется к ближайшему целому
+        ("averaging_mean", results["grid"]["mean_error"], 0.501),
+    ])
+    return results
+
+
+def bench_async_writer(app: QApplication, frames: int = 60) -> dict:
+    """
+    Время, которое поток захвата тратит на кадр при записи XVID напрямую и
+    через AsyncFrameWriter, а также поведение политик при медленном диске.
+    """
+    results = {}
+    rng = np.random.default_rng(0)
+    for width, height in ((640, 480), (1936, 1464)):
+        frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp:
+            video = cv2.VideoWriter(
+                os.path.join(tmp, "inline.avi"), cv2.VideoWriter_fourcc(*'XVID'), 5, (width, height)
+            )
+            started = time.perf_counter()
+            for _ in range(frames):
+                video.write(frame)
+            inline = (time.perf_counter() - started) / frames
+            video.release()
+
+            video = cv2.VideoWriter(
+                os.path.join(tmp, "async.avi"), cv2.VideoWriter_fourcc(*'XVID'), 5, (width, height)
+            )
+            writer = AsyncFrameWriter(video.write, video.release, max_queue=frames)
+            started = time.perf_counter()
+            for _ in range(frames):
+                writer.submit(frame)
+            submit = (time.perf_counter() - started) / frames
+            writer.close()
+
+        results[f"{width}x{height}"] = {
+            "inline_ms": round(inline * 1000, 2),
+            "submit_ms": round(submit * 1000, 2),
+        }
+
+    # Запись втрое медленнее поступления кадров
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    for policy in BACKPRESSURE_POLICIES:
+        writer = AsyncFrameWriter(lambda f: time.sleep(0.003), max_queue=8, policy=policy)
+        for _ in range(frames):
+            writer.submit(frame)
+            time.sleep(0.001)
+        writer.close()
+        results[policy] = {"written": writer.written, "dropped": writer.dropped}
+
+    return results
+
+
+def _path_size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def _thermal_scene(frames: int, width: int, height: int) -> np.ndarray:
+    """Гладкое остывающее пятно с шумом сенсора - сжимается как реальная термограмма"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    spot = np.exp(-((x - width / 2) ** 2 + (y - height / 2) ** 2) / (2 * (width / 6) ** 2))
+    decay = np.exp(-np.arange(frames) / frames)
+    scene = 7000 + 2000 * decay[:, None, None] * spot
+    return (scene + rng.normal(0, 4, size=scene.shape)).astype(np.uint16)
+
+
+def bench_codecs(app: QApplication, frames: int = 30) -> dict:
+    """
+    Форматы записи: скорость (МБ/с несжатых кадров), степень сжатия и
+    процессорное время на кадр для палитры тепловизора 640x480, сырых
+    uint16 640x480 и кадров FLIR 1936x1464.
+    """
+    raw = _thermal_scene(frames, 640, 480)
+    palette = np.stack([cv2.applyColorMap((f >> 6).astype(np.uint8), cv2.COLORMAP_JET) for f in raw])
+    flir = np.stack([cv2.resize(f, (1936, 1464)) for f in palette[: max(1, frames // 3)]])
+    streams = {"thermal_bgr": palette, "thermal_raw16": raw, "flir_bgr": flir}
+    results = {}
+
+    for backend_cls in get_available_backends():
+        for stream_name, sequence in streams.items():
+            _, height, width = sequence.shape[:3]
+            channels = sequence.shape[3] if sequence.ndim == 4 else 1
+            with tempfile.TemporaryDirectory() as tmp:
+                try:
+                    backend = create_backend(
+                        backend_cls.name, os.path.join(tmp, "bench"), width, height, 5,
+                        channels=channels, dtype=sequence.dtype
+                    )
+                except RecordingError:
+                    continue
+                wall, cpu = time.perf_counter(), time.process_time()
+                for frame in sequence:
+                    backend.write(frame)
+                backend.close()
+                wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+                if backend_cls.name.startswith("npy-"):
+                    restored = np.concatenate(list(read_npy_chunks(backend.path)))
+                    assert np.array_equal(restored, sequence)
+                results[f"{backend_cls.name}/{stream_name}"] = {
+                    "mb_per_s": round(sequence.nbytes / wall / 2 ** 20, 1),
+                    "ratio": round(sequence.nbytes / max(1, _path_size(backend.path)), 1),
+                    "cpu_ms_per_frame": round(cpu / len(sequence) * 1000, 2),
+                }
+
+    return results
+
+
+def bench_display(app: QApplication, frames: int = 100) -> dict:
+    """
+    Время отображения кадра в потоке GUI, мс: прежний путь (cvtColor в RGB,
+    QPixmap и fitInView на каждый кадр) и FrameDisplay. Каждый кадр
+    перерисовывается сразу, чтобы учесть и стоимость отрисовки.
+    """
+    rng = np.random.default_rng(0)
+    results = {}
+    for width, height in ((640, 480), (1936, 1464)):
+        sequence = rng.integers(0, 256, size=(4, height, width, 3), dtype=np.uint8)
+
+        view = QGraphicsView()
+        view.resize(800, 600)
+        view.show()
+        scene = QGraphicsScene()
+        view.setScene(scene)
+        pixmap_item = QGraphicsPixmapItem()
+        scene.addItem(pixmap_item)
+        app.processEvents()
+        started = time.perf_counter()
+        for i in range(frames):
+            rgb = cv2.cvtColor(sequence[i % len(sequence)], cv2.COLOR_BGR2RGB)
+            q_image = QImage(rgb.data, width, height, 3 * width, QImage.Format_RGB888)
+            pixmap_item.setPixmap(QPixmap.fromImage(q_image))
+            view.fitInView(pixmap_item, Qt.KeepAspectRatio)
+            view.viewport().repaint()
+        legacy = (time.perf_counter() - started) / frames
+        view.close()
+
+        view = QGraphicsView()
+        view.resize(800, 600)
+        view.show()
+        display = FrameDisplay(view)
+        app.processEvents()
+        started = time.perf_counter()
+        for i in range(frames):
+            display.show(sequence[i % len(sequence)])
+            view.viewport().repaint()
+        current = (time.perf_counter() - started) / frames
+        view.close()
+
+        results[f"{width}x{height}"] = {
+            "legacy_ms": round(legacy * 1000, 2),
+            "frame_display_ms": round(current * 1000, 2),
+            "allocations": display.allocations,
+            "fits": display.fits,
+        }
+    return results
+
+
+def bench_preview_scaling(app: QApplication, frames: int = 60) -> dict:
+    """
+    Кадры FLIR 1936x1464 в области просмотра 800x600: время потока GUI на
+    кадр (отображение и отрисовка, мс) без уменьшения и с уменьшением в
+    потоке захвата, а также цена уменьшения для потока захвата.
+    """
+    rng = np.random.default_rng(0)
+    width, height = 1936, 1464
+    ring = FrameRing((height, width, 3))
+    for _ in range(ring.capacity):
+        ring.write(rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8))
+    results = {}
+
+    for name, downscale in (("full_resolution", False), ("downscaled", True)):
+        view = QGraphicsView()
+        view.resize(800, 600)
+        view.show()
+        display = FrameDisplay(view)
+        app.processEvents()
+        worker = AcquisitionWorker(None, ring)
+        if downscale:
+            worker.set_preview_size(*display.viewport_size())
+
+        worker_time = gui_time = 0.0
+        for i in range(frames):
+            seq = ring.latest_seq - i % ring.capacity
+            started = time.perf_counter()
+            worker._downscale_preview(seq, ring.get(seq))
+            worker_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            preview_ring, preview_seq, frame = worker.take_latest()
+            display.show(frame)
+            view.viewport().repaint()
+            gui_time += time.perf_counter() - started
+        view.close()
+
+        results[name] = {
+            "preview_size": list(frame.shape[1::-1]),
+            "gui_ms": round(gui_time / frames * 1000, 2),
+            "worker_ms": round(worker_time / frames * 1000, 2),
+        }
+    return results
+
+
+def bench_sync(app: QApplication, seconds: float = 60.0) -> dict:
+    """
+    Синхронизация на модели двух камер: тепловизор 27 Гц с часами +80 ppm и
+    видимая камера 30 Гц с часами -40 ppm, метки хоста с задержкой доставки
+    1-6 мс. Точность времени кадра по меткам хоста и после коррекции по
+    часам камер (СКО относительно истинного момента захвата, мс), оценка
+    дрейфа и доля сопоставленных кадров.
+    """
+    rng = np.random.default_rng(0)
+    streams = {"thermal": (27.0, 80e-6, 12.5), "visible": (30.0, -40e-6, 3.2)}
+    events = []
+    for name, (fps, drift, device_offset) in streams.items():
+        capture = np.arange(0.0, seconds, 1.0 / fps) + rng.uniform(0, 1.0 / fps)
+        host = capture + rng.uniform(0.001, 0.006, size=len(capture))
+        device = device_offset + capture * (1 + drift)
+        events += [(h, name, i, d, c) for i, (h, d, c) in enumerate(zip(host, device, capture))]
+    events.sort()
+
+    synchronizer = FrameSynchronizer("thermal", tolerance=0.02)
+    errors = {name: ([], []) for name in streams}
+    started = time.perf_counter()
+    for host, name, seq, device, capture in events:
+        corrected = synchronizer.stamp(name, seq, host, device, seq)
+        if host > 10.0:  # после прогрева оценки
+            errors[name][0].append(host - capture)
+            errors[name][1].append(corrected - capture)
+    stamp_us = (time.perf_counter() - started) / len(events) * 1e6
+
+    stats = synchronizer.stats()
+    results = {"stamp_us": round(stamp_us, 1)}
+    for name, (fps, drift, _) in streams.items():
+        host_error, corrected_error = (np.asarray(e) for e in errors[name])
+        results[name] = {
+            "true_drift_ppm": drift * 1e6,
+            "estimated_drift_ppm": stats["cameras"][name]["drift_ppm"],
+            "host_jitter_ms": round(float(np.std(host_error)) * 1000, 3),
+            "corrected_jitter_ms": round(float(np.std(corrected_error)) * 1000, 3),
+        }
+    results["matched"] = round(stats["pairs_matched"] / (stats["pairs_matched"] + stats["pairs_unmatched"]), 3)
+    return results
+
+
+def bench_pretrigger(app: QApplication, frames: int = 200) -> dict:
+    """
+    Буфер предзаписи 3 с при настройках по умолчанию (бюджет 256 МБ на
+    камеру): сколько секунд помещается и сколько стоит кадр потоку захвата.
+    """
+    settings = Settings()
+    budget = settings.pretrigger_memory_mb * 2 ** 20
+    streams = {
+        "flir_video": ((1464, 1936, 3), np.uint8, settings.visible_camera_recordFPS),
+        "optris_raw": ((480, 640), np.uint16, 32),
+    }
+    results = {}
+    for name, (shape, dtype, fps) in streams.items():
+        buffer = PreTriggerBuffer(settings.pretrigger_seconds, fps, shape, dtype, budget)
+        frame = np.zeros(shape, dtype=dtype)
+        started = time.perf_counter()
+        for i in range(frames):
+            buffer.push(frame, i / fps, i / fps)
+        push = (time.perf_counter() - started) / frames
+        results[name] = {
+            "seconds": round(buffer.capacity / fps, 2),
+            "memory_mb": round(buffer.nbytes / 2 ** 20, 1),
+            "push_ms": round(push * 1000, 3),
+            "drained": sum(1 for _ in buffer.drain()),
+        }
+
+    # Бюджет меньше потребности: хранится столько, сколько помещается
+    buffer = PreTriggerBuffer(10, 5, (1464, 1936, 3), np.uint8, 64 * 2 ** 20)
+    results["flir_10s_in_64mb"] = {"seconds": buffer.capacity / 5, "memory_mb": round(buffer.nbytes / 2 ** 20, 1)}
+
+    # Запись с заглушки тепловизора: кадры предзаписи дописываются потоком
+    # записи термограммы перед кадрами, пришедшими после старта
+    settings.thermal_camera_previewFPS = 20
+    settings.pretrigger_seconds = 1.0
+    camera = ThermalCamera(settings, QGraphicsView())
+    camera.initialize()
+    with tempfile.TemporaryDirectory() as tmp:
+        _run_event_loop(app, 1.5)
+        pretrigger = len(camera.pretrigger_thermal)
+        started = time.perf_counter()
+        camera.start_recording(os.path.join(tmp, "bench_pretrigger"))
+        start_ms = (time.perf_counter() - started) * 1000
+        _run_event_loop(app, 1.0)
+        camera.stop_recording()
+        camera.release()
+        times = camera.recorded_times["thermogram"]
+        with ThermogramReader(os.path.join(tmp, "bench_pretrigger.tgs")) as reader:
+            host_times = reader.metadata["host_time"].copy()
+    results["thermal_recording"] = {
+        "pretrigger_frames": pretrigger,
+        "frames": len(host_times),
+        "start_recording_ms": round(start_ms, 2),
+    }
+    _check(results, [
+        ("thermal_pretrigger_seconds", pretrigger - settings.pretrigger_seconds * settings.thermal_camera_previewFPS, 1),
+        ("thermal_times_per_frame", len(times) - len(host_times), 0),
+        ("thermal_order", int(np.count_nonzero(np.diff(host_times) <= 0)), 0),
+    ])
+    return results
+
+
+def _peak_rss_mb() -> float:
+    """Пиковый RSS процесса (и самого большого из завершившихся дочерних), МБ"""
+    try:
+        import resource
+    except ImportError:
+        # Windows: дочерние процессы пула не учитываются
+        return psutil.Process().memory_info().peak_wset / 2 ** 20
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+class CheckFailed(AssertionError):
+    """Проверка корректности в бенчмарке не прошла"""
+    pass
+
+
+def _check(results: dict, checks):
+    """
+    Проверки корректности: checks - (имя, значение, допуск), проходит
+    |значение| <= допуск. Итог - в results['checks']; при непрошедших
+    проверках - CheckFailed со всеми ними и результатами бенчмарка.
+    """
+    failed = []
+    for name, value, limit in checks:
+        passed = bool(abs(value) <= limit)
+        results.setdefault("checks", {})[name] = "ok" if passed else f"FAIL ({value} > {limit})"
+        if not passed:
+            failed.append(f"{name}: {value} > {limit}")
+    if failed:
+        raise CheckFailed(f"{'; '.join(failed)}\n{results}")
+
+
+def _run_isolated(function, *args):
+    """Выполняет function в отдельном процессе, чтобы пиковый RSS относился только к ней"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(function, *args).result()
+
+
+def _write_cooling_sequence(path: str, frames: int, width: int, height: int, fps: float):
+    """Синтетическое остывание после импульса с подповерхностным дефектом (медленнее остывает)"""
+    rng = np.random.default_rng(0)
+    defect = np.zeros((height, width), dtype=np.float32)
+    defect[height // 3: height // 2, width // 3: width // 2] = 0.15
+    writer = ThermogramWriter(path, width, height, fps=fps)
+    for t in range(frames):
+        contrast = 3000.0 / np.sqrt(1.0 + t / fps * 4)
+        frame = 7000.0 + contrast * (1.0 + defect * min(1.0, t / (fps * 2))) + rng.normal(0, 4, (height, width))
+        writer.write(frame.astype(np.uint16))
+    writer.close()
+
+
+def bench_background(app: QApplication, frames: int = 600, background_frames: int = 96) -> dict:
+    """
+    Вычитание фона для записи 640x480x600 (32 к/с, 3 с до нагрева): время
+    потока записи на кадр при вычислении по ходу записи (среднее по
+    Уэлфорду и медиана 15 кадров) и второй проход по готовой термограмме,
+    который оно заменяет.
+    """
+    rng = np.random.default_rng(0)
+    sequence = rng.integers(7000, 7100, size=(16, 480, 640), dtype=np.uint16)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, median_frames in (("streaming_mean", 0), ("streaming_median", 15)):
+            differential = DifferentialWriter(os.path.join(tmp, name), (480, 640), median_frames)
+            started = time.perf_counter()
+            for i in range(frames):
+                if i == background_frames:
+                    differential.start_heating(i)
+                differential.write(sequence[i % len(sequence)], i)
+            elapsed = time.perf_counter() - started
+            differential.close()
+            results[name] = {"ms_per_frame": round(elapsed / frames * 1000, 3), "seconds": round(elapsed, 2)}
+
+        path = os.path.join(tmp, "zone.tgs")
+        writer = ThermogramWriter(path, 640, 480, fps=32)
+        for i in range(frames):
+            writer.write(sequence[i % len(sequence)])
+        writer.close()
+
+        started = time.perf_counter()
+        with ThermogramReader(path) as reader:
+            background = reader.frames[:background_frames].mean(axis=0, dtype=np.float32)
+            output = np.lib.format.open_memmap(
+                os.path.join(tmp, "second_pass.npy"), mode='w+', dtype=np.float32,
+                shape=(frames - background_frames, 480, 640)
+            )
+            for i in range(background_frames, frames):
+                np.subtract(reader.frames[i], background, out=output[i - background_frames], dtype=np.float32)
+            output.flush()
+            del output
+        results["second_pass"] = {"seconds": round(time.perf_counter() - started, 2)}
+    return results
+
+
+def _ppt_job(variant: str, path: str) -> dict:
+    started = time.perf_counter()
+    if variant == "idle":
+        pass
+    elif variant == "naive_rfft":
+        # Вся запись в памяти и полный спектр по оси времени
+        with ThermogramReader(path) as reader:
+            spectrum = np.fft.rfft(np.asarray(reader.frames, dtype=np.float32), axis=0)[1:11]
+        np.abs(spectrum), np.angle(spectrum)
+    else:
+        method, workers = {
+            "bands_fft": ("fft", 0), "bands_dft": ("dft", 0), "bands_dft_2proc": ("dft", 2),
+        }[variant]
+        pulsed_phase(path, bins=10, fps=32, method=method, workers=workers)
+    return {"seconds": round(time.perf_counter() - started, 2), "peak_rss_mb": round(_peak_rss_mb(), 1)}
+
+
+def bench_ppt(app: QApplication, frames: int = 600) -> dict:
+    """
+    Импульсная фазовая термография записи 640x480x600 (.tgs): время и
+    пиковый RSS процесса для полного БПФ всей записи в памяти и обработки
+    полосами (БПФ, прямое ДПФ по 10 частотам, ДПФ в двух процессах).
+    Каждый вариант выполняется в отдельном процессе; idle - RSS процесса
+    без обработки (интерпретатор, numpy, Qt).
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ppt.tgs")
+        _write_cooling_sequence(path, frames, 640, 480, fps=32)
+        for variant in ("idle", "naive_rfft", "bands_fft", "bands_dft", "bands_dft_2proc"):
+            results[variant] = _run_isolated(_ppt_job, variant, path)
+    return results
+
+
+def _pct_job(variant: str, path: str):
+    started = time.perf_counter()
+    result = None
+    if variant == "randomized_q1":
+        result = principal_components(path, components=5, method="randomized", power_iterations=1)
+    elif variant == "randomized_q2":
+        result = principal_components(path, components=5, method="randomized", power_iterations=2)
+    elif variant == "gram":
+        result = principal_components(path, components=5, method="gram")
+    stats = {"seconds": round(time.perf_counter() - started, 2), "peak_rss_mb": round(_peak_rss_mb(), 1)}
+    return stats, result
+
+
+def bench_pct(app: QApplication, frames: int = 1000) -> dict:
+    """
+    Термография главных компонент записи 640x480x1000 (.tgs): время и пиковый
+    RSS рандомизированного SVD (1 и 2 степенные итерации) и точного
+    разложения через матрицу T x T. Плотная матрица X (H*W, T) в float32
+    заняла бы 1,2 ГБ. similarity - |косинус| между изображениями значимых
+    компонент и точным решением.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pct.tgs")
+        _write_cooling_sequence(path, frames, 640, 480, fps=32)
+        exact = None
+        for variant in ("idle", "gram", "randomized_q1", "randomized_q2"):
+            stats, result = _run_isolated(_pct_job, variant, path)
+            if variant == "gram":
+                exact = result
+                stats["explained"] = [round(float(e), 6) for e in result.explained]
+            elif result is not None:
+                # Компоненты на уровне шума определены лишь с точностью до поворота в своём подпространстве
+                significant = exact.explained > 1e-4
+                stats["similarity"] = [
+                    round(abs(float(np.dot(a.ravel(), b.ravel()))), 4)
+                    for a, b in zip(result.images[significant], exact.images[significant])
+                ]
+                stats["singular_values_error"] = round(float(np.max(
+                    np.abs(result.singular_values - exact.singular_values)[significant]
+                    / exact.singular_values[significant])), 6)
+            results[variant] = stats
+    return results
+
+
+def _plate_response(times: np.ndarray, tau: float, terms: int = 200) -> np.ndarray:
+    """
+    Нагрев поверхности теплоизолированной пластины после импульса (1-D
+    теплопроводность), в долях установившегося значения:
+    1 + 2 * sum(exp(-n^2 t / tau)), tau = L^2 / (pi^2 * температуропроводность).
+    """
+    n = np.arange(1, terms + 1)[:, None]
+    return 1.0 + 2.0 * np.exp(-n ** 2 * times[None] / tau).sum(axis=0)
+
+
+def _tsr_job(path: str) -> dict:
+    started = time.perf_counter()
+    thermographic_signal_reconstruction(path, fps=32, background=7000.0)
+    return {"seconds": round(time.perf_counter() - started, 2), "peak_rss_mb": round(_peak_rss_mb(), 1)}
+
+
+def bench_tsr(app: QApplication, frames: int = 600, fps: float = 30) -> dict:
+    """
+    TSR: время и пиковый RSS для записи 640x480x600 и проверки на решениях
+    одномерной задачи теплопроводности.
+
+    semi_infinite - полубесконечное тело, ln(ΔT) = C - ln(t) / 2: первая
+    производная -0.5, вторая 0. plate - пластины с tau от 0.3 до 4 с:
+    ошибка восстановления и момент максимума второй производной (полином
+    степени 9) против аналитического t* = L^2 / (pi a) = pi tau (Shepard).
+    noisy - шум 2 % на пластине: восстановление ближе к точному решению,
+    чем кадры. Выход за допуски - CheckFailed.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tsr.tgs")
+        _write_cooling_sequence(path, frames, 640, 480, fps=32)
+        results["640x480x600"] = _run_isolated(_tsr_job, path)
+
+    times = np.arange(1, frames + 1) / fps
+    semi_infinite = (3.0 / np.sqrt(times)).astype(np.float32)[:, None, None]
+    result = thermographic_signal_reconstruction(semi_infinite, fps)
+    results["semi_infinite"] = {
+        "first_error": round(float(np.abs(result.first + 0.5).max()), 6),
+        "second_error": round(float(np.abs(result.second).max()), 6),
+        "reconstruction_error": round(float(np.abs(result.reconstruct() / semi_infinite - 1).max()), 6),
+    }
+
+    taus = np.array([0.3, 0.5, 1.0, 2.0, 4.0])
+    plates = np.stack([_plate_response(times, tau) for tau in taus], axis=1).astype(np.float32)[:, None, :]
+    expected = np.pi * taus
+    reconstruction = thermographic_signal_reconstruction(plates, fps)
+    peaks = thermographic_signal_reconstruction(plates, fps, order=9).second_peak_time.ravel()
+    results["plate"] = {
+        "reconstruction_error": round(float(np.abs(reconstruction.reconstruct() / plates - 1).max()), 4),
+        "peak_time": [round(float(t), 2) for t in peaks],
+        "expected_peak_time": [round(float(t), 2) for t in expected],
+        "peak_error": round(float(np.max(np.abs(peaks / expected - 1))), 3),
+    }
+
+    rng = np.random.default_rng(0)
+    noisy = plates * (1 + rng.normal(0, 0.02, plates.shape)).astype(np.float32)
+    denoised = thermographic_signal_reconstruction(noisy, fps).reconstruct()
+    results["noisy"] = {
+        "frames_rms": round(float(np.sqrt(np.mean((noisy / plates - 1) ** 2))), 4),
+        "reconstruction_rms": round(float(np.sqrt(np.mean((denoised / plates - 1) ** 2))), 4),
+    }
+    _check(results, [
+        ("semi_infinite_slope", results["semi_infinite"]["first_error"], 1e-3),
+        ("semi_infinite_second", results["semi_infinite"]["second_error"], 1e-3),
+        ("semi_infinite_reconstruction", results["semi_infinite"]["reconstruction_error"], 1e-3),
+        ("plate_reconstruction", results["plate"]["reconstruction_error"], 0.03),
+        ("plate_peak_time", results["plate"]["peak_error"], 0.15),
+        ("noisy_rms_gain", results["noisy"]["reconstruction_rms"] / results["noisy"]["frames_rms"], 0.75),
+    ])
+    return results
+
+
+def bench_cache(app: QApplication, frames: int = 600) -> dict:
+    """
+    Кэш результатов для записи 640x480x600: PCT и TSR с вычислением и из
+    кэша, хэш записи (первый раз и запомненный), вытеснение при малом лимите
+    и инвалидация по удалённому файлу.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "zone_thermal.tgs")
+        _write_cooling_sequence(path, frames, 640, 480, fps=32)
+        cache = ResultCache(os.path.join(tmp, "cache"), 2 ** 30)
+
+        started = time.perf_counter()
+        cache.file_hash(path)
+        results["hash_first_s"] = round(time.perf_counter() - started, 3)
+        started = time.perf_counter()
+        cache.file_hash(path)
+        results["hash_memoized_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+        computations = {
+            "pca": lambda: principal_components(path, components=5)._asdict(),
+            "tsr": lambda: {
+                name: value for name, value in
+                thermographic_signal_reconstruction(path, 32, background=7000.0)._asdict().items()
+            },
+        }
+        for name, compute in computations.items():
+            timings = []
+            for _ in range(2):
+                started = time.perf_counter()
+                arrays = cache.fetch(path, name, {"frames": frames}, compute)
+                timings.append(time.perf_counter() - started)
+            results[name] = {
+                "computed_s": round(timings[0], 3),
+                "cached_s": round(timings[1], 3),
+                "arrays": len(arrays),
+            }
+        results["hits"], results["misses"] = cache.hits, cache.misses
+        results["cache_mb"] = round(cache.size() / 2 ** 20, 1)
+
+        # Лимит меньше двух записей: остаётся только последняя прочитанная
+        cache.max_bytes = cache.size() - 1
+        cache.get(cache.key(path, "tsr", {"frames": frames}))
+        cache.evict()
+        results["after_evict"] = {
+            name: cache.get(cache.key(path, name, {"frames": frames})) is not None for name in computations
+        }
+        results["invalidated"] = cache.invalidate([path])
+    return results
+
+
+def bench_mosaic(app: QApplication, columns: int = 4, rows: int = 3, jitter: int = 8) -> dict:
+    """
+    Мозаика зон 4x3 (зона 240x320, перекрытие 20%) на синтетической сцене:
+    фактические положения зон отличаются от шага сетки на +-jitter пикселей.
+    Ошибка положений после совмещения (относительно первой зоны), отклонение
+    мозаики от сцены с совмещением и без, время добавления зоны и число
+    пересчитанных пикселей против полного пересчёта холста.
+    """
+    height, width = 240, 320
+    rng = np.random.default_rng(0)
+    step = (int(round(height * 0.8)), int(round(width * 0.8)))
+    scene_shape = (step[0] * rows + height + 4 * jitter, step[1] * columns + width + 4 * jitter)
+    texture = cv2.GaussianBlur(rng.random(scene_shape, dtype=np.float32), (0, 0), 3)
+    texture = cv2.normalize(texture, None, 0, 255, cv2.NORM_MINMAX)
+    # Обработанное изображение - гладкая функция той же сцены плюс дефекты
+    processed = cv2.GaussianBlur(texture, (0, 0), 8) / 255
+    for _ in range(20):
+        y, x = rng.integers(0, scene_shape[0]), rng.integers(0, scene_shape[1])
+        cv2.circle(processed, (int(x), int(y)), 12, 1.0, -1)
+
+    # Обход змейкой, как в траектории; y сетки направлен вверх
+    order = [(x if y % 2 == 0 else columns - 1 - x, y) for y in range(rows) for x in range(columns)]
+    truth = {}
+    for x, y in order:
+        truth[(x, y)] = (2 * jitter + (rows - 1 - y) * step[0] + int(rng.integers(-jitter, jitter + 1)),
+                         2 * jitter + x * step[1] + int(rng.integers(-jitter, jitter + 1)))
+
+    results = {}
+    for variant in ("nominal", "registered"):
+        mosaic = ZoneMosaic((height, width), overlap=0.2)
+        add_times, updated = [], []
+        for position in order:
+            top, left = truth[position]
+            image = processed[top:top + height, left:left + width]
+            frame = None
+            if variant == "registered":
+                # Кадр видимой камеры в 2 раза больше и цветной
+                frame = cv2.resize(texture[top:top + height, left:left + width].astype(np.uint8),
+                                   (width * 2, height * 2), interpolation=cv2.INTER_LINEAR)
+                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+            started = time.perf_counter()
+            mosaic.add_zone(position, image, frame)
+            add_times.append(time.perf_counter() - started)
+            updated.append(mosaic.pixels_updated)
+
+        first = mosaic.zones[order[0]].origin
+        errors = []
+        for position, (top, left) in truth.items():
+            origin = mosaic.zones[position].origin
+            errors.append(np.hypot(origin[0] - first[0] - (top - truth[order[0]][0]),
+                                   origin[1] - first[1] - (left - truth[order[0]][1])))
+        # Отклонение мозаики от сцены в области зон
+        image, offset = mosaic.image()
+        top = truth[order[0]][0] - (first[0] - offset[0])
+        left = truth[order[0]][1] - (first[1] - offset[1])
+        reference = np.full(image.shape, np.nan, dtype=np.float32)
+        src_top, src_left = max(top, 0), max(left, 0)
+        dst_top, dst_left = src_top - top, src_left - left
+        rows_count = min(image.shape[0] - dst_top, scene_shape[0] - src_top)
+        cols_count = min(image.shape[1] - dst_left, scene_shape[1] - src_left)
+        reference[dst_top:dst_top + rows_count, dst_left:dst_left + cols_count] = \
+            processed[src_top:src_top + rows_count, src_left:src_left + cols_count]
+        covered = ~np.isnan(image) & ~np.isnan(reference)
+        results[variant] = {
+            "position_error_px": {"mean": round(float(np.mean(errors)), 2), "max": round(float(np.max(errors)), 2)},
+            "rms_vs_scene": round(float(np.sqrt(np.mean((image[covered] - reference[covered]) ** 2))), 4),
+            "add_ms": {"mean": round(float(np.mean(add_times)) * 1000, 2),
+                       "max": round(float(np.max(add_times)) * 1000, 2)},
+            "pixels_per_add": int(np.mean(updated)),
+            "full_recompute_pixels": int(image.size),
+        }
+    return results
+
+
+def bench_pyramid(app: QApplication, columns: int = 8, rows: int = 6) -> dict:
+    """
+    Пирамида мозаики 8x6 зон 480x640: время переноса в пирамиду каждой
+    добавленной зоны, объём на диске, и просмотр окном 1280x800 - проход
+    по мозаике в полном разрешении и в масштабе "вся мозаика на экране":
+    время сборки кадра, обращения к диску и память кэша тайлов против
+    изображения мозаики целиком.
+    """
+    rng = np.random.default_rng(0)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        mosaic = ZoneMosaic((480, 640), overlap=0.2)
+        pyramid = TilePyramid(tmp, reset=True)
+        update_times = []
+        order = [(x if y % 2 == 0 else columns - 1 - x, y) for y in range(rows) for x in range(columns)]
+        for position in order:
+            mosaic.add_zone(position, rng.random((480, 640), dtype=np.float32))
+            image, offset = mosaic.image()
+            started = time.perf_counter()
+            pyramid.update(image, offset, mosaic.updated_rects)
+            update_times.append(time.perf_counter() - started)
+        image, offset = mosaic.image()
+        results["update_ms"] = {"mean": round(float(np.mean(update_times)) * 1000, 1),
+                                "max": round(float(np.max(update_times)) * 1000, 1)}
+        results["levels"] = pyramid.levels
+        results["disk_mb"] = round(sum(
+            _path_size(os.path.join(tmp, str(level))) for level in range(pyramid.levels)
+        ) / 2 ** 20, 1)
+        results["mosaic_mb"] = round(image.nbytes / 2 ** 20, 1)
+
+        top, left, height, width = pyramid.bounds
+        fit = min(800 / height, 1280 / width)
+        for name, scale in (("full_resolution", 1.0), ("fit", fit)):
+            loader = TileLoader(tmp, max_bytes=32 * 2 ** 20)
+            level = loader.level_for_scale(scale)
+            factor = 2 ** level
+            level_top, level_left = top // factor, left // factor
+            level_height, level_width = -(-height // factor), -(-width // factor)
+            # В полном разрешении окно 1280x800 проходит мозаику с шагом в
+            # четверть окна, в масштабе "вся мозаика" читается весь уровень
+            view_height, view_width = (800, 1280) if name == "full_resolution" else (level_height, level_width)
+            timings = []
+            for y in range(level_top, level_top + max(1, level_height - view_height + 1), view_height // 4):
+                for x in range(level_left, level_left + max(1, level_width - view_width + 1), view_width // 4):
+                    started = time.perf_counter()
+                    loader.region(level, y, x, view_height, view_width)
+                    timings.append(time.perf_counter() - started)
+            results[name] = {
+                "level": level,
+                "frames": len(timings),
+                "frame_ms": {"mean": round(float(np.mean(timings)) * 1000, 2),
+                             "max": round(float(np.max(timings)) * 1000, 2)},
+                **loader.stats(),
+            }
+    return results
+
+
+def _write_preview_zone(zone_base: str, frames: int, visible_format: str, visible_size=(960, 720)):
+    """Зона для предпросмотра: термограмма 640x480 (32 Гц), видео видимой камеры (30 Гц) и sidecar"""
+    thermogram = f"{zone_base}_thermal{ThermogramWriter.EXTENSION}"
+    _write_cooling_sequence(thermogram, frames, 640, 480, fps=32)
+    width, height = visible_size
+    visible_frames = frames * 30 // 32
+    backend = create_backend(visible_format, f"{zone_base}_visible", width, height, 30)
+    rng = np.random.default_rng(1)
+    texture = cv2.resize(rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8), visible_size)
+    for index in range(visible_frames):
+        backend.write(np.roll(texture, index, axis=1))
+    backend.close()
+    recordings = {
+        "thermal": {"files": {"thermogram": thermogram}, "times": {"thermogram": list(np.arange(frames) / 32)}},
+        "visible": {"files": {"video": backend.path}, "times": {"video": list(np.arange(visible_frames) / 30)}},
+    }
+    write_sidecar(zone_base + SIDECAR_SUFFIX, build_sidecar("thermal", 0.02, recordings))
+    return thermogram, backend.path
+
+
+def bench_preview_window(app: QApplication, frames: int = 3600) -> dict:
+    """
+    Окно предпросмотра на сессии из двух зон, первая - термограмма
+    640x480x3600 (2,2 ГБ) с видео 960x720 XVID. Открытие окна, миниатюры
+    (первый раз и из кэша), произвольный доступ к кадру в разных форматах
+    записи и перемещение ползунка: задержка от последнего запроса до
+    показанного кадра, сколько промежуточных кадров пропущено, рост RSS.
+    """
+    results = {}
+    process = psutil.Process()
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {}
+        paths["tgs"], paths["xvid"] = _write_preview_zone(os.path.join(tmp, "obj_zone(0,0)"), frames, "xvid")
+        _, paths["npy-zlib"] = _write_preview_zone(os.path.join(tmp, "obj_zone(1,0)"), 300, "npy-zlib")
+        _, paths["png"] = _write_preview_zone(os.path.join(tmp, "obj_zone(2,0)"), 64, "png")
+        results["session_gb"] = round(sum(
+            _path_size(os.path.join(tmp, name)) for name in os.listdir(tmp)
+        ) / 2 ** 30, 2)
+
+        rng = np.random.default_rng(0)
+        access = {}
+        for name, path in paths.items():
+            source = open_frame_source(path)
+            indices = rng.integers(0, len(source), 30)
+            started = time.perf_counter()
+            for index in indices:
+                np.asarray(source.read(int(index))).sum()
+            access[name] = round((time.perf_counter() - started) / len(indices) * 1000, 2)
+            source.close()
+        results["random_frame_ms"] = access
+
+        cache_root = os.path.join(tmp, ".cache")
+        settings = PreviewSettings.get_instance()
+        settings.number_of_zone, settings.current_frame = [0, 0], 0
+        rss_before = process.memory_info().rss
+        started = time.perf_counter()
+        window = PreviewWindow(tmp, cache_root)
+        window.show()
+        results["open_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        while window._thumbnails.isRunning():
+            app.processEvents()
+            time.sleep(0.005)
+        results["thumbnails_first_s"] = round(time.perf_counter() - started, 3)
+
+        shown = []
+        window._loader.frame_ready.connect(lambda index, *_: shown.append((time.perf_counter(), index)))
+        slider = window._frame_slider
+        latencies = []
+        requested = 0
+        for _ in range(10):
+            # Перетаскивание: 20 значений за 0,25 с, затем ожидание последнего кадра
+            targets = np.sort(rng.integers(0, frames, 20))
+            for target in targets:
+                slider.setValue(int(target))
+                requested += 1
+                app.processEvents()
+                time.sleep(0.25 / len(targets))
+            last_request = time.perf_counter()
+            target = int(targets[-1])
+            while not shown or shown[-1][1] != target:
+                app.processEvents()
+                time.sleep(0.002)
+            latencies.append(shown[-1][0] - last_request)
+        window.accept()
+        results["scrub"] = {
+            "requests": requested,
+            "decoded": len(shown),
+            "final_frame_ms": {"mean": round(float(np.mean(latencies)) * 1000, 1),
+                               "max": round(float(np.max(latencies)) * 1000, 1)},
+            "rss_growth_mb": round((process.memory_info().rss - rss_before) / 2 ** 20, 1),
+        }
+
+        started = time.perf_counter()
+        cache = ThumbnailCache(cache_root)
+        for zone in ("obj_zone(0,0)", "obj_zone(1,0)", "obj_zone(2,0)"):
+            cache.get(os.path.join(tmp, zone + "_thermal.tgs"))
+        results["thumbnails_cached_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return results
+
+
+def _busy_gui(app: QApplication, until, stall: float, rng: np.random.Generator):
+    """Цикл событий Qt, занятый обработчиками длительностью до stall с (удерживают GIL)"""
+    while not until():
+        app.processEvents()
+        busy_until = time.perf_counter() + rng.uniform(0, stall)
+        while time.perf_counter() < busy_until:
+            pass
+        time.sleep(0.002)
+
+
+def _lateness_summary(lateness) -> dict:
+    lateness = np.array(lateness) * 1000
+    return {"mean_ms": round(float(lateness.mean()), 3),
+            "p95_ms": round(float(np.percentile(lateness, 95)), 3),
+            "max_ms": round(float(lateness.max()), 3)}
+
+
+def bench_sequencer(app: QApplication, cycles: int = 10, heating: float = 0.3,
+                    duration: float = 0.6, stall: float = 0.08) -> dict:
+    """
+    Опоздание фронтов нагрева относительно циклограммы при занятом GUI:
+    одноразовые QTimer главного окна (как было) и поток Sequencer.
+    Фактические времена команд берутся из MockHeater.switch_times.
+    """
+    rng = np.random.default_rng(0)
+    results = {}
+
+    # Одноразовые QTimer: срабатывают, когда освободится цикл событий
+    heater = MockHeater(0, 0, response_delay=0.002)
+    lateness = []
+    for _ in range(cycles):
+        heater.switch_times.clear()
+        start = time.monotonic()
+        QTimer.singleShot(0, heater.turn_on)
+        QTimer.singleShot(int(heating * 1000), heater.turn_off)
+        _busy_gui(app, lambda: len(heater.switch_times) == 2, stall, rng)
+        lateness += [heater.switch_times[0][1] - start, heater.switch_times[1][1] - (start + heating)]
+    results["qtimer"] = _lateness_summary(lateness)
+    heater.close()
+
+    # Поток циклограммы
+    heater = MockHeater(0, 0, response_delay=0.002)
+    lateness, reported = [], []
+    for _ in range(cycles):
+        heater.switch_times.clear()
+        steps = testing_schedule(HeatingProfile(heating_duration=heating), duration,
+                                 lambda: None, heater.turn_on, heater.turn_off, lambda: None)
+        sequencer = Sequencer(steps)
+        sequencer.start()
+        _busy_gui(app, sequencer.isFinished, stall, rng)
+        sequencer.wait()
+        planned = {timing.name: timing.planned for timing in sequencer.timings}
+        for (state, actual), name in zip(heater.switch_times, HEATER_STEPS):
+            lateness.append(actual - planned[name])
+        reported += [timing.lateness for timing in sequencer.timings if timing.name in HEATER_STEPS]
+        assert sequencer.completed and [state for state, _ in heater.switch_times] == [True, False]
+    heater.close()
+    results["sequencer"] = _lateness_summary(lateness)
+    results["sequencer_reported"] = _lateness_summary(reported)
+    return results
+
+
+def bench_heater(app: QApplication, commands: int = 20, response_delay: float = 0.02) -> dict:
+    """
+    Очередь команд Heater с контроллером на псевдотерминале: время возврата
+    из turn_*_async() (вызов из GUI) и до подтверждения, повтор после
+    пропущенного ответа, отказ при молчащем контроллере, порядок команд.
+    """
+    controller = FakeHeaterController(response_delay=response_delay)
+    heater = Heater(controller.port, 115200, timeout=0.2, retries=2)
+    heater.OPEN_SETTLE = 0.0    # Псевдотерминал не перезапускается при открытии
+    results = {}
+    try:
+        submit, round_trip = [], []
+        for index in range(commands):
+            started = time.perf_counter()
+            future = heater.turn_on_async() if index % 2 == 0 else heater.turn_off_async()
+            submit.append(time.perf_counter() - started)
+            future.result()
+            round_trip.append(time.perf_counter() - started)
+        results["submit_us"] = round(float(np.median(submit)) * 1e6, 1)
+        results["round_trip_ms"] = round(float(np.median(round_trip)) * 1000, 1)
+
+        # Пропущенный ответ: подтверждение со второй попытки
+        controller.drop(1)
+        attempts = heater.attempts
+        started = time.perf_counter()
+        heater.turn_on()
+        results["retry"] = {"attempts": heater.attempts - attempts,
+                            "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+        # Молчащий контроллер: вызов возвращается сразу, отказ - через (retries + 1) * timeout
+        controller.silent = True
+        started = time.perf_counter()
+        future = heater.turn_off_async()
+        submit_silent = time.perf_counter() - started
+        error = future.exception()
+        results["timeout"] = {"submit_us": round(submit_silent * 1e6, 1),
+                              "failed_after_ms": round((time.perf_counter() - started) * 1000, 1),
+                              "error": isinstance(error, HeaterError)}
+        controller.silent = False
+
+        # Выключение, отправленное во время включения, выполняется после него
+        first, second = heater.turn_on_async(), heater.turn_off_async()
+        second.result()
+        results["ordered"] = first.result() < second.result() and not controller.state and not heater.state
+    finally:
+        heater.close()
+        controller.close()
+    return results
+
+
+def bench_heater_link(app: QApplication, poll_interval: float = 0.05, stage: float = 1.0) -> dict:
+    """
+    Телеметрия канала нагревателя: проверка связи в простое на контроллере
+    с псевдотерминалом, время ответа которого растёт, а затем пропадает
+    вовсе - когда summary() отмечает деградацию (до первой команды нагрева);
+    стоимость записи и сводки телеметрии; ряд телеметрии в sidecar-файле.
+    """
+    import json
+
+    controller = FakeHeaterController()
+    controller.reported = {"T": 85.2, "I": 1.35}
+    heater = Heater(controller.port, 115200, timeout=0.2, retries=2)
+    heater.OPEN_SETTLE = 0.0    # Псевдотерминал не перезапускается при открытии
+    results = {}
+    try:
+        heater.set_poll_interval(poll_interval)
+        recording_start = time.monotonic()
+        for name, delay in (("healthy", 0.005), ("slow", 0.05), ("degraded", 0.15), ("silent", None)):
+            controller.silent = delay is None
+            controller.response_delay = delay or 0.0
+            started = time.monotonic()
+            time.sleep(stage)
+            summary = heater.telemetry.summary(window=time.monotonic() - started)
+            results[name] = {key: summary[key] for key in
+                             ("attempts", "timeouts", "p95_ms", "temperature", "degraded") if key in summary}
+        heater.set_poll_interval(0)
+        series = heater.telemetry.series(recording_start)
+    finally:
+        heater.close()
+        controller.close()
+
+    # Запись и сводка в потоке обмена и GUI
+    telemetry = HeaterTelemetry()
+    started = time.perf_counter()
+    for index in range(10000):
+        telemetry.add(HeaterSample(float(index), "off", 0, "ack", 0.02, True, 85.0, 1.3))
+    results["add_us"] = round((time.perf_counter() - started) / 10000 * 1e6, 2)
+    started = time.perf_counter()
+    telemetry.summary(window=1e9)
+    results["summary_10k_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    sidecar = json.loads(json.dumps(build_sidecar("thermal", 0.05, {}, heater=series)))
+    columns = heater_telemetry(sidecar)
+    results["sidecar"] = {
+        "samples": len(columns["time"]),
+        "timeouts": int(np.count_nonzero(columns["outcome"] == "timeout")),
+        "temperature_missing": int(np.count_nonzero(np.isnan(columns["temperature"]))),
+    }
+    return results
+
+
+def bench_profiles(app: QApplication, heating: float = 4.0, frequency: float = 0.5, fps: float = 30) -> dict:
+    """
+    Профили нагрева на MockHeater через Sequencer: опоздание фронтов,
+    совпадение состояния нагрева по кадрам из sidecar (modulation_timeline)
+    с выполненными командами и первая гармоника фактического нагрева
+    относительно заданной мощности профиля.
+    """
+    results = {}
+    for kind in ("pulse_train", "sine"):
+        profile = HeatingProfile(kind=kind, heating_duration=heating, frequency=frequency, carrier_frequency=5.0)
+        heater = MockHeater(0, 0, response_delay=0.01)
+        modulation = {}
+
+        def on_step(timing):
+            if timing.name == "recording_start":
+                modulation.update(profile=profile.to_dict(), start=timing.planned + RECORDING_LEAD, edges=[])
+            if timing.name in EDGE_STATES:
+                modulation["edges"].append({"state": EDGE_STATES[timing.name], "time": timing.actual})
+
+        steps = testing_schedule(profile, heating + 1.0, lambda: None, heater.turn_on, heater.turn_off, lambda: None)
+        sequencer = Sequencer(steps, on_step=on_step)
+        sequencer.start()
+        while not sequencer.isFinished():
+            app.processEvents()
+            time.sleep(0.05)
+        sequencer.wait()
+        heater.close()
+
+        # Кадры не совпадают с фронтами: сдвиг на полкадра
+        frame_times = modulation["start"] - RECORDING_LEAD + np.arange(0.5 / fps, heating + 1.0 + RECORDING_LEAD, 1 / fps)
+        sidecar = build_sidecar("thermal", 0.05, {"thermal": {"files": {"thermogram": "zone_thermal.tgs"},
+                                                             "times": {"thermogram": list(frame_times)}}},
+                                modulation=modulation)
+        times, state = modulation_timeline(sidecar)
+        simulated = heater.state_at(frame_times)
+
+        # Первая гармоника на частоте модуляции: фактический нагрев против заданного
+        inside = (times >= 0) & (times < heating)
+        reference = np.exp(-2j * np.pi * frequency * times[inside])
+        actual = np.sum(state[inside] * reference)
+        planned = np.sum(profile.power(times[inside]) * reference)
+        lateness = [timing.lateness for timing in sequencer.timings if timing.name in EDGE_STATES]
+        results[kind] = {
+            "edges": len(profile.edges()),
+            "lateness": _lateness_summary(lateness),
+            "frames_state_mismatch": int(np.count_nonzero(state != simulated)),
+            "amplitude_ratio": round(float(abs(actual) / abs(planned)), 3),
+            "phase_error_deg": round(float(np.degrees(np.angle(actual / planned))), 2),
+        }
+    return results
+
+
+def bench_lockin(app: QApplication, frames: int = 300, height: int = 480, width: int = 640,
+                 frequency: float = 0.5, fps: float = 30, batch: int = 32) -> dict:
+    """
+    Lock-in демодуляция 640x480: пропускная способность потокового
+    обновления (кадр/с), время оценки result(), обработка записи целиком
+    (lock_in) и LiveLockIn на лету; точность фазы и амплитуды на
+    синтетической термограмме с известной картой фазы, дрейфом и шумом.
+    LiveLockIn проверяется и на плоских кадрах, как их отдаёт Optris.
+    """
+    rng = np.random.default_rng(0)
+    profile = HeatingProfile(kind="sine", heating_duration=frames / fps, frequency=frequency)
+    times = np.arange(frames) / fps
+    true_phase = np.linspace(-2.5, 2.5, width, dtype=np.float32)[None, :].repeat(height, axis=0)
+    amplitude = 40.0
+    # Отклик запаздывает относительно мощности 0.5 * (1 - cos(w t)) на true_phase
+    omega = 2 * np.pi * frequency
+    sequence = np.empty((frames, height, width), dtype=np.uint16)
+    cos_phase, sin_phase = np.cos(true_phase), np.sin(true_phase)
+    for index, t in enumerate(times):
+        response = -amplitude * (np.cos(omega * t) * cos_phase + np.sin(omega * t) * sin_phase)
+        sequence[index] = 20000 + 30 * t + response + rng.normal(0, 5, (height, width))
+
+    def accuracy(result):
+        error = np.angle(np.exp(1j * (result.phase - true_phase)))
+        return {
+            "phase_error_rad": round(float(np.mean(np.abs(error))), 4),
+            "amplitude": round(float(np.median(result.amplitude)), 3),
+        }
+
+    heating = profile.power(times)
+    demodulator = LockInDemodulator((height, width), frequency)
+    start = time.perf_counter()
+    for first in range(0, frames, batch):
+        demodulator.update(sequence[first:first + batch], times[first:first + batch], heating[first:first + batch])
+    update_time = time.perf_counter() - start
+    start = time.perf_counter()
+    result = demodulator.result()
+    result_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    offline = lock_in(sequence, times, frequency, heating)
+    offline_time = time.perf_counter() - start
+
+    # На лету: кадры поступают из потока захвата через submit()
+    origin = time.monotonic()
+    live = LiveLockIn(profile, origin, (height, width), update_interval=0.5, max_queue=frames)
+    updates = []
+    live.result_ready.connect(updates.append)
+    start = time.perf_counter()
+    for index in range(frames):
+        live.submit(sequence[index], origin + times[index])
+    submit_time = time.perf_counter() - start
+    live.stop()
+    live_time = time.perf_counter() - start
+    app.processEvents()
+
+    # Optris отдаёт радиометрический кадр плоским массивом (W*H,)
+    flat = LiveLockIn(profile, origin, (height, width), update_interval=0.5, max_queue=frames)
+    flat_updates = []
+    flat.result_ready.connect(flat_updates.append)
+    for index in range(frames):
+        flat.submit(sequence[index].reshape(-1), origin + times[index])
+    flat.stop()
+    app.processEvents()
+
+    results = {
+        "update_fps": round(frames / update_time, 1),
+        "result_ms": round(result_time * 1000, 1),
+        "offline_fps": round(frames / offline_time, 1),
+        "live_fps": round(frames / live_time, 1),
+        "live_submit_us": round(submit_time / frames * 1e6, 1),    # Время потока захвата на кадр
+        "live_updates": len(updates),
+        "live_dropped": live.dropped,
+        "streaming": accuracy(result),
+        "offline": accuracy(offline),
+        "live": accuracy(updates[-1]) if updates else None,
+        "live_flat": accuracy(flat_updates[-1]) if flat_updates else None,
+    }
+    _check(results, [
+        ("live_result", 0 if updates else 1, 0),
+        ("live_flat_result", 0 if flat_updates else 1, 0),
+        ("live_phase_error_rad", results["live"]["phase_error_rad"] if updates else np.pi, 0.01),
+        ("live_flat_phase_error_rad", results["live_flat"]["phase_error_rad"] if flat_updates else np.pi, 0.01),
+    ])
+    return results
+
+
+BENCHMARKS = {
+    "preview": bench_preview,
+    "allocations": bench_allocations,
+    "thermogram": bench_thermogram,
+    "decimation": bench_decimation,
+    "async_writer": bench_async_writer,
+    "codecs": bench_codecs,
+    "display": bench_display,
+    "preview_scaling": bench_preview_scaling,
+    "sync": bench_sync,
+    "pretrigger": bench_pretrigger,
+    "background": bench_background,
+    "ppt": bench_ppt,
+    "tsr": bench_tsr,
+    "cache": bench_cache,
+    "pct": bench_pct,
+    "mosaic": bench_mosaic,
+    "pyramid": bench_pyramid,
+    "preview_window": bench_preview_window,
+    "sequencer": bench_sequencer,
+    "heater": bench_heater,
+    "heater_link": bench_heater_link,
+    "profiles": bench_profiles,
+    "lockin": bench_lockin,
+}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    app = QApplication(sys.argv)
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    failed = []
+    for name in selected:
+        try:
+            print(f"{name}: {BENCHMARKS[name](app)}")
+        except CheckFailed as e:
+            print(f"{name}: FAIL {e}")
+            failed.append(name)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,203 @@
+"""
+Модуль дискового кэша результатов обработки
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+import zipfile
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+
+from processing import PROCESSING_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Папка кэша внутри папки сохранения сессии
+CACHE_DIR = '.cache'
+
+
+class ResultCache:
+    """
+    Кэш результатов алгоритмов, адресуемый содержимым.
+
+    Ключ - хэш (хэш содержимого входного файла, алгоритм, параметры,
+    PROCESSING_VERSION): переименованная или повторно открытая запись
+    находит свои результаты, а изменённая запись или параметры - нет.
+    Результат хранится как сжатый .npz, рядом - .json с источником для
+    инвалидации. Время изменения .npz обновляется при каждом чтении, и при
+    превышении max_bytes удаляются давно не читанные записи (LRU).
+
+    Кэшем могут одновременно пользоваться несколько процессов обработки:
+    файлы пишутся во временные и переименовываются, исчезнувшие при
+    вытеснении записи считаются промахом.
+    """
+
+    HASH_CHUNK = 4 * 2 ** 20
+    COMPRESS_LEVEL = 1
+
+    def __init__(self, root: str, max_bytes: int = 1024 * 2 ** 20):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(root, 'hashes'), exist_ok=True)
+
+    # ---------- Ключи ----------
+    def _hash_record_path(self, path: str) -> str:
+        name = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+        return os.path.join(self.root, 'hashes', name + '.json')
+
+    def file_hash(self, path: str) -> str:
+        """
+        Хэш содержимого файла. Запоминается по (размер, время изменения),
+        чтобы запись в сотни мегабайт читалась один раз, а не при каждом запросе.
+        """
+        stat = os.stat(path)
+        record_path = self._hash_record_path(path)
+        try:
+            with open(record_path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            if record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+                return record['digest']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK), b''):
+                digest.update(chunk)
+        record = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest.hexdigest()}
+        self._write_json(record_path, record)
+        return record['digest']
+
+    def key(self, source: str, algorithm: str, parameters: dict) -> str:
+        description = json.dumps(
+            [self.file_hash(source), algorithm, parameters, PROCESSING_VERSION], sort_keys=True
+        )
+        return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key + '.npz')
+
+    # ---------- Чтение и запись ----------
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """Результат по ключу или None"""
+        path = self._entry_path(key)
+        try:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return arrays
+
+    def put(self, key: str, arrays: Dict[str, np.ndarray], source: str, algorithm: str, parameters: dict):
+        """Сохраняет результат и вытесняет старые записи сверх max_bytes"""
+        path = self._entry_path(key)
+        temporary = f"{path}.{os.getpid()}.part"
+        self._save_npz(temporary, arrays)
+        self._write_json(path[:-len('.npz')] + '.json', {
+            'source': os.path.abspath(source),
+            'algorithm': algorithm,
+            'parameters': parameters,
+            'version': PROCESSING_VERSION,
+            'created': time.time(),
+        })
+        os.replace(temporary, path)
+        self.evict()
+
+    def fetch(self, source: str, algorithm: str, parameters: dict,
+              compute: Callable[[], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        """Результат из кэша или compute() с сохранением в кэш"""
+        key = self.key(source, algorithm, parameters)
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = compute()
+            try:
+                self.put(key, arrays, source, algorithm, parameters)
+            except OSError as e:
+                logger.error(f"Не удалось сохранить результат в кэш: {e}")
+        return arrays
+
+    def _save_npz(self, path: str, arrays: Dict[str, np.ndarray]):
+        """
+        Сжатый .npz, как np.savez_compressed, но с быстрым уровнем сжатия:
+        изображения float32 с шумом сжимаются плохо при любом уровне, а
+        уровень по умолчанию в разы дольше самой обработки.
+        """
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=self.COMPRESS_LEVEL) as archive:
+            for name, array in arrays.items():
+                with archive.open(name + '.npy', 'w', force_zip64=True) as f:
+                    np.lib.format.write_array(f, np.asanyarray(array), allow_pickle=False)
+
+    @staticmethod
+    def _write_json(path: str, data: dict):
+        temporary = f"{path}.{os.getpid()}.part"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temporary, path)
+
+    # ---------- Размер и инвалидация ----------
+    def _entries(self):
+        """(время последнего чтения, размер, ключ) всех записей"""
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.npz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name[:-len('.npz')]))
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _remove(self, key: str):
+        for suffix in ('.npz', '.json'):
+            try:
+                os.remove(os.path.join(self.root, key + suffix))
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """Удаляет давно не читанные записи, пока кэш больше max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+            logger.debug(f"Из кэша вытеснен результат {key}")
+
+    def invalidate(self, sources: Iterable[str]) -> int:
+        """Удаляет результаты, полученные из файлов sources; возвращает их число"""
+        sources = {os.path.abspath(path) for path in sources}
+        removed = 0
+        for name in os.listdir(self.root):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.root, name), 'r', encoding='utf-8') as f:
+                    source = json.load(f)['source']
+            except (OSError, ValueError, KeyError):
+                continue
+            if source in sources:
+                self._remove(name[:-len('.json')])
+                removed += 1
+        for path in sources:
+            try:
+                os.remove(self._hash_record_path(path))
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.info(f"Удалено результатов из кэша: {removed}")
+        return removed
@@ -4,11 +4,14 @@
 
 import cv2
 import logging
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Optional
-from PySide6.QtCore import QTimer, Qt, Slot
-from PySide6.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QMessageBox
-from PySide6.QtGui import QImage, QPixmap
+from typing import Callable, Dict, List, Tuple, Optional
+from PySide6.QtCore import QEvent, QObject, QRectF, QTimer, QThread, Qt, Signal, Slot
+from PySide6.QtWidgets import QGraphicsItem, QGraphicsView, QGraphicsScene, QMessageBox
+from PySide6.QtGui import QImage
 import numpy as np
 import ctypes as ct
 
@@ -19,7 +22,15 @@ except ImportError:
     PYSPIN_AVAILABLE = False
     logging.warning("PySpin not available. FLIR cameras will not work.")
 
+from recording import (
+    BACKPRESSURE_BLOCK, AsyncFrameWriter, FrameDecimator, PreTriggerBuffer, RecordingError, ThermogramWriter,
+    create_backend, frame_metadata_record
+)
+from processing import DifferentialWriter
 from settings import Settings
+from sync import (
+    COOLING_EVENT, HEATING_EVENT, SIDECAR_SUFFIX, FrameSynchronizer, build_sidecar, write_sidecar
+)
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +53,403 @@ class CameraConnectionError(CameraError):
     pass
 
 
+# ==================== FRAME RING ====================
+class FrameRing:
+    """
+    Кольцевой буфер предвыделенных кадров с номерами последовательности.
+
+    Единственный поток-производитель пишет кадры прямо в слоты
+    (acquire → commit), а потребители (предпросмотр, запись, анализ) читают
+    слоты по номеру кадра без копирования. На время записи слот помечается
+    номером -1, поэтому потребитель после работы с кадром проверяет
+    is_valid(seq): если производитель успел перезаписать слот, кадр
+    отбрасывается. Блокировки не нужны: у каждого слота один писатель,
+    а публикация номера - последняя операция записи.
+
+    Счётчики allocations / copy_writes позволяют убедиться, что в
+    установившемся режиме кадры не выделяются и не копируются.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, capacity: int = 4):
+        if capacity < 2:
+            raise ValueError("Ёмкость FrameRing должна быть не меньше 2")
+        self.capacity = capacity
+        self.allocations = 0        # Выделения памяти под слоты
+        self.in_place_writes = 0    # Кадры, записанные прямо в слот
+        self.copy_writes = 0        # Кадры, скопированные в слот
+        self._next_seq = 0
+        self._latest_seq = -1
+        self._allocate(tuple(shape), np.dtype(dtype))
+
+    def _allocate(self, shape, dtype):
+        self._slots = np.empty((self.capacity, *shape), dtype=dtype)
+        self._seqs = np.full(self.capacity, -1, dtype=np.int64)
+        self._timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.allocations += 1
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._slots.shape[1:]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._slots.dtype
+
+    def acquire(self) -> Tuple[int, np.ndarray]:
+        """Возвращает номер и слот для записи следующего кадра на месте"""
+        seq = self._next_seq
+        index = seq % self.capacity
+        self._seqs[index] = -1
+        return seq, self._slots[index]
+
+    def commit(self, seq: int, timestamp: Optional[float] = None):
+        """Публикует кадр, записанный в слот, полученный через acquire()"""
+        self._publish(seq, timestamp)
+        self.in_place_writes += 1
+
+    def write(self, frame: np.ndarray, timestamp: Optional[float] = None) -> int:
+        """
+        Копирует готовый кадр в очередной слот. При смене разрешения или
+        типа данных слоты выделяются заново, прежние номера становятся
+        недействительными.
+        """
+        if frame.shape != self.shape or frame.dtype != self.dtype:
+            self._allocate(frame.shape, frame.dtype)
+        seq, slot = self.acquire()
+        np.copyto(slot, frame)
+        self._publish(seq, timestamp)
+        self.copy_writes += 1
+        return seq
+
+    def _publish(self, seq: int, timestamp: Optional[float]):
+        index = seq % self.capacity
+        self._timestamps[index] = time.monotonic() if timestamp is None else timestamp
+        self._seqs[index] = seq
+        self._latest_seq = seq
+        self._next_seq = seq + 1
+
+    @property
+    def latest_seq(self) -> int:
+        """Номер последнего опубликованного кадра (-1, если кадров не было)"""
+        return self._latest_seq
+
+    def get(self, seq: int) -> Optional[np.ndarray]:
+        """Возвращает слот с кадром seq без копирования или None, если он перезаписан"""
+        if seq < 0:
+            return None
+        index = seq % self.capacity
+        if self._seqs[index] != seq:
+            return None
+        return self._slots[index]
+
+    def latest(self) -> Tuple[int, Optional[np.ndarray]]:
+        """Возвращает номер и слот самого свежего кадра"""
+        seq = self._latest_seq
+        return seq, self.get(seq)
+
+    def is_valid(self, seq: int) -> bool:
+        """Проверяет, что слот кадра seq ещё не перезаписан"""
+        return seq >= 0 and self._seqs[seq % self.capacity] == seq
+
+    def timestamp(self, seq: int) -> Optional[float]:
+        """Возвращает время захвата кадра (time.monotonic) или None"""
+        if not self.is_valid(seq):
+            return None
+        return float(self._timestamps[seq % self.capacity])
+
+    def stats(self) -> dict:
+        """Возвращает счётчики выделений и записей"""
+        return {
+            'allocations': self.allocations,
+            'in_place_writes': self.in_place_writes,
+            'copy_writes': self.copy_writes,
+            'frames': self._next_seq,
+        }
+
+
+# ==================== ACQUISITION ====================
+class AcquisitionWorker(QThread):
+    """
+    Поток захвата кадров одной камеры.
+
+    Захват (capture_frame может блокироваться на время ожидания кадра от SDK)
+    и запись выполняются в отдельном потоке, кадры складываются в FrameRing
+    камеры, а GUI получает номер самого свежего кадра через сигнал
+    frame_ready. Пока GUI не забрал предыдущий кадр, новые сигналы не
+    отправляются, поэтому очередь событий не переполняется при медленной
+    отрисовке.
+
+    Если задан размер области просмотра (set_preview_size), кадр для
+    предпросмотра уменьшается здесь же в отдельное кольцо preview_ring, а
+    запись получает кадр полного разрешения. Уменьшение пирамидальное:
+    кадр делится пополам (INTER_AREA, быстрый путь OpenCV для кратности 2),
+    пока не станет меньше области вдвое, остаток - INTER_LINEAR. INTER_AREA
+    с дробным коэффициентом для кадра FLIR занимает ~20 мс против ~3 мс.
+    """
+
+    frame_ready = Signal()          # Доступен новый кадр для отображения
+    capture_failed = Signal(str)    # Захват прерван (камера отключена / ошибка)
+
+    FPS_WINDOW = 1.0  # секунды, окно усреднения измеренного FPS
+
+    def __init__(self, camera: 'BaseCamera', ring: FrameRing):
+        super().__init__()
+        self.camera = camera
+        self.ring = ring
+        self.preview_ring: Optional[FrameRing] = None
+        self.preview_allocations = 0
+        self._halving_buffers: List[np.ndarray] = []
+        self._preview_size: Optional[Tuple[int, int]] = None
+        # Взводится до start(): stop(), вызванный раньше, чем поток дошёл до
+        # run(), не должен быть перезаписан
+        self._running = True
+        self._notify_pending = False
+
+        # Счётчики для телеметрии
+        self.frames_captured = 0
+        self._fps = 0.0
+        self._fps_count = 0
+        self._fps_started = 0.0
+
+    def run(self):
+        interval = 1.0 / max(1, self.camera.get_preview_fps())
+        deadline = time.monotonic()
+        self._fps_started = deadline
+
+        while self._running:
+            seq, slot = self.ring.acquire()
+            try:
+                frame = self.camera.capture_into(slot)
+            except Exception as e:
+                logger.error(f"Ошибка захвата кадра {self.camera.get_camera_name()}: {e}")
+                self.capture_failed.emit(f"Ошибка камеры {self.camera.get_camera_name()}: {e}")
+                break
+
+            if frame is None:
+                if self._running:
+                    self.capture_failed.emit(f"Камера {self.camera.get_camera_name()} была отключена.")
+                break
+
+            if frame is slot:
+                self.ring.commit(seq)
+            else:
+                seq = self.ring.write(frame)
+                frame = self.ring.get(seq)
+
+            try:
+                self.camera.record_frame(seq, frame)
+            except Exception as e:
+                logger.error(f"Ошибка записи кадра {self.camera.get_camera_name()}: {e}")
+            self._downscale_preview(seq, frame)
+            self._publish()
+
+            # Выдерживаем частоту предпросмотра: камеры без аппаратного
+            # тактирования (заглушки, часть USB-камер) иначе отдают кадры
+            # с максимально возможной скоростью
+            deadline += interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.monotonic()
+
+        self._running = False
+
+    def set_preview_size(self, width: int, height: int):
+        """
+        Задаёт размер области просмотра в физических пикселях. Кадры крупнее
+        неё уменьшаются для предпросмотра с сохранением пропорций.
+        """
+        self._preview_size = (width, height) if width > 0 and height > 0 else None
+
+    def _preview_shape(self, frame: np.ndarray) -> Optional[Tuple[int, ...]]:
+        """Возвращает форму уменьшенного кадра или None, если уменьшать не нужно"""
+        size = self._preview_size
+        if size is None:
+            return None
+        height, width = frame.shape[:2]
+        scale = min(size[0] / width, size[1] / height)
+        if scale >= 1.0:
+            return None
+        return (max(1, round(height * scale)), max(1, round(width * scale)), *frame.shape[2:])
+
+    def _downscale_preview(self, seq: int, frame: np.ndarray):
+        shape = self._preview_shape(frame)
+        if shape is None:
+            self.preview_ring = None
+            return
+        preview_ring = self.preview_ring
+        if preview_ring is None or preview_ring.shape != shape or preview_ring.dtype != frame.dtype:
+            # Прежнее кольцо остаётся целым у GUI, пока тот его использует
+            preview_ring = FrameRing(shape, frame.dtype)
+            self._allocate_halving_buffers(frame, shape)
+            self.preview_allocations += 1
+        preview_seq, slot = preview_ring.acquire()
+
+        source = frame
+        for buffer in self._halving_buffers:
+            cv2.resize(source, (buffer.shape[1], buffer.shape[0]), dst=buffer, interpolation=cv2.INTER_AREA)
+            source = buffer
+        if source.shape == slot.shape:
+            np.copyto(slot, source)
+        else:
+            cv2.resize(source, (shape[1], shape[0]), dst=slot, interpolation=cv2.INTER_LINEAR)
+        preview_ring.commit(preview_seq, self.ring.timestamp(seq))
+        self.preview_ring = preview_ring
+
+    def _allocate_halving_buffers(self, frame: np.ndarray, shape: Tuple[int, ...]):
+        """Выделяет промежуточные кадры пирамиды: каждый вдвое меньше предыдущего"""
+        self._halving_buffers = []
+        height, width = frame.shape[:2]
+        while height // 2 >= shape[0] and width // 2 >= shape[1]:
+            height, width = height // 2, width // 2
+            self._halving_buffers.append(np.empty((height, width, *shape[2:]), dtype=frame.dtype))
+
+    def _publish(self):
+        notify = not self._notify_pending
+        self._notify_pending = True
+
+        self.frames_captured += 1
+        self._update_fps()
+        if notify:
+            self.frame_ready.emit()
+
+    def _update_fps(self):
+        self._fps_count += 1
+        elapsed = time.monotonic() - self._fps_started
+        if elapsed >= self.FPS_WINDOW:
+            self._fps = self._fps_count / elapsed
+            self._fps_count = 0
+            self._fps_started += elapsed
+
+    def take_latest(self) -> Tuple[FrameRing, int, Optional[np.ndarray]]:
+        """
+        Возвращает кольцо, номер и слот самого свежего кадра для предпросмотра
+        (уменьшенного, если задан размер области просмотра) и разрешает новое
+        уведомление.
+        """
+        self._notify_pending = False
+        ring = self.preview_ring or self.ring
+        seq, frame = ring.latest()
+        return ring, seq, frame
+
+    def get_fps(self) -> float:
+        """Возвращает измеренную частоту захвата кадров"""
+        return self._fps if self.isRunning() else 0.0
+
+    def stop(self):
+        """Останавливает поток и дожидается его завершения"""
+        self._running = False
+        self.wait()
+
+
+# ==================== FRAME DISPLAY ====================
+class FrameItem(QGraphicsItem):
+    """Элемент сцены, рисующий QImage без промежуточного QPixmap"""
+    
+    def __init__(self):
+        super().__init__()
+        self._image = QImage()
+    
+    def set_image(self, image: QImage):
+        """Задаёт изображение; при смене размера пересчитывает геометрию элемента"""
+        if image.size() != self._image.size():
+            self.prepareGeometryChange()
+        self._image = image
+        self.update()
+    
+    def boundingRect(self) -> QRectF:
+        return QRectF(0, 0, self._image.width(), self._image.height())
+    
+    def paint(self, painter, option, widget=None):
+        if not self._image.isNull():
+            painter.drawImage(0, 0, self._image)
+
+
+class FrameDisplay(QObject):
+    """
+    Отображение кадров BGR в QGraphicsView.
+
+    Кадр копируется в единственный буфер отображения, обёрнутый в QImage
+    без копирования: без перестановки каналов и без выделения памяти на
+    каждый кадр. Буфер хранит BGRX - в памяти это Format_RGB32, родной
+    формат растрового движка Qt, который рисуется без преобразования
+    (BGR888 Qt переводит в RGB32 при каждой отрисовке). Слот FrameRing
+    напрямую не оборачивается - Qt рисует позже, и к этому моменту поток
+    захвата может его перезаписать.
+    Масштаб вида пересчитывается только при изменении размера виджета или
+    разрешения кадра.
+    """
+    
+    viewport_resized = Signal(int, int)  # Размер области просмотра в физических пикселях
+    
+    def __init__(self, graphics_view: QGraphicsView):
+        super().__init__(graphics_view)
+        self.graphics_view = graphics_view
+        self.scene = QGraphicsScene(graphics_view)
+        self.graphics_view.setScene(self.scene)
+        self.item = FrameItem()
+        self.scene.addItem(self.item)
+        self.graphics_view.viewport().installEventFilter(self)
+        
+        self._buffer: Optional[np.ndarray] = None
+        self._image: Optional[QImage] = None
+        self.allocations = 0
+        self.fits = 0
+    
+    def show(self, frame: np.ndarray, is_valid=None) -> bool:
+        """
+        Показывает кадр (uint8, BGR или оттенки серого).
+
+        is_valid вызывается после копирования кадра: если слот успели
+        перезаписать, изображение не обновляется. Возвращает, показан ли кадр.
+        """
+        resized = (self._buffer is None or self._buffer.shape[:2] != frame.shape[:2]
+                   or self._buffer.ndim != frame.ndim)
+        if resized:
+            self._allocate(frame.shape)
+        if frame.ndim == 3:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA, dst=self._buffer)
+        else:
+            np.copyto(self._buffer, frame)
+        if is_valid is not None and not is_valid():
+            return False
+        self.item.set_image(self._image)
+        if resized:
+            self.fit()
+        return True
+    
+    def _allocate(self, shape: tuple):
+        height, width = shape[:2]
+        if len(shape) == 3:
+            self._buffer = np.empty((height, width, 4), dtype=np.uint8)
+            image_format = QImage.Format_RGB32
+        else:
+            self._buffer = np.empty((height, width), dtype=np.uint8)
+            image_format = QImage.Format_Grayscale8
+        # QImage ссылается на память буфера без копирования
+        self._image = QImage(self._buffer.data, width, height, self._buffer.strides[0], image_format)
+        self.allocations += 1
+    
+    def fit(self):
+        """Вписывает кадр в область просмотра с сохранением пропорций"""
+        if self._image is not None:
+            self.graphics_view.fitInView(self.item, Qt.KeepAspectRatio)
+            self.fits += 1
+    
+    def viewport_size(self) -> Tuple[int, int]:
+        """Возвращает размер области просмотра в физических пикселях экрана"""
+        viewport = self.graphics_view.viewport()
+        ratio = viewport.devicePixelRatioF()
+        return round(viewport.width() * ratio), round(viewport.height() * ratio)
+    
+    def eventFilter(self, watched, event) -> bool:
+        if event.type() == QEvent.Resize:
+            self.fit()
+            self.viewport_resized.emit(*self.viewport_size())
+        return False
+
+
 # ==================== BASE CLASS ====================
 class BaseCamera(ABC):
     """Абстрактный базовый класс для всех камер"""
@@ -51,6 +459,25 @@ class BaseCamera(ABC):
         self.graphics_view = graphics_view
         self.is_recording = False
         self.video_writer = None
+        self.recording_files: List[str] = []  # Файлы последней записи
+        self.thermogram_writer: Optional[AsyncFrameWriter] = None
+        self.decimator: Optional[FrameDecimator] = None
+        self.pretrigger_video: Optional[PreTriggerBuffer] = None
+        self.pretrigger_thermal: Optional[PreTriggerBuffer] = None
+        self.differential: Optional[DifferentialWriter] = None
+        self.differential_writer: Optional[AsyncFrameWriter] = None
+        self.last_recording_stats: dict = {}
+        self.recording_streams: Dict[str, str] = {}        # Поток ('video', 'thermogram') -> файл
+        self.recorded_times: Dict[str, List[float]] = {}   # Поток -> время каждого записанного кадра
+        # Получатель записанных кадров термограммы (кадр, время) для обработки на лету;
+        # вызывается в потоке захвата после записи кадра, вне блокировки записи, и
+        # должен только передать копию кадра в ограниченную очередь (LiveLockIn.submit)
+        self.thermogram_observer: Optional[Callable[[np.ndarray, float], None]] = None
+        self._record_lock = threading.Lock()
+        
+        # Синхронизация кадров камер (назначается CameraManager)
+        self.synchronizer: Optional[FrameSynchronizer] = None
+        self.sync_name = ''
         self._initialized = False
         self.is_disconnected = False
         
@@ -61,14 +488,12 @@ class BaseCamera(ABC):
         self.reconnect_timer.timeout.connect(self.attempt_reconnect)
         
         # Настройка сцены для отображения
-        self.scene = QGraphicsScene()
-        self.graphics_view.setScene(self.scene)
-        self.pixmap_item = QGraphicsPixmapItem()
-        self.scene.addItem(self.pixmap_item)
+        self.display = FrameDisplay(self.graphics_view)
+        self.display.viewport_resized.connect(self._set_preview_size)
         
-        # Таймер для обновления кадров
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
+        # Поток захвата кадров и кольцевой буфер (создаются при запуске захвата)
+        self._worker: Optional[AcquisitionWorker] = None
+        self.frame_ring: Optional[FrameRing] = None
     
     @abstractmethod
     def initialize(self) -> bool:
@@ -80,6 +505,16 @@ class BaseCamera(ABC):
         """Захватывает кадр с камеры"""
         pass
     
+    def capture_into(self, out: np.ndarray):
+        """
+        Захватывает кадр в предвыделенный буфер out.
+
+        Возвращает out, если кадр записан на месте, иначе - новый массив
+        (или None при ошибке). Реализация по умолчанию вызывает
+        capture_frame(); камеры, умеющие писать в чужой буфер, переопределяют метод.
+        """
+        return self.capture_frame()
+    
     @abstractmethod
     def release_resources(self):
         """Освобождает ресурсы камеры"""
@@ -105,77 +540,387 @@ class BaseCamera(ABC):
         """Возвращает FPS для записи"""
         pass
     
+    @abstractmethod
+    def get_record_averaging(self) -> bool:
+        """Возвращает, усреднять ли кадры при прореживании до FPS записи"""
+        pass
+    
+    @abstractmethod
+    def get_record_format(self) -> str:
+        """Возвращает ключ формата записи видео (см. recording.RECORDER_BACKENDS)"""
+        pass
+    
     def is_initialized(self) -> bool:
         """Проверяет, инициализирована ли камера"""
         return self._initialized
     
-    def start_recording(self, file_path: str):
-        """Начинает запись видео"""
+    def _get_effective_record_fps(self) -> float:
+        # Чаще, чем идут кадры предпросмотра, записывать нечего
+        return min(self.get_record_fps(), self.get_preview_fps())
+    
+    def _create_decimator(self) -> FrameDecimator:
+        # Узлы сетки кратны интервалу записи по time.monotonic, поэтому у всех
+        # камер видео содержат кадры одних и тех же моментов
+        return FrameDecimator(self._get_effective_record_fps(), average=self.get_record_averaging(), origin=0.0)
+    
+    def arm_pretrigger(self):
+        """
+        Начинает хранить последние settings.pretrigger_seconds секунд кадров
+        (в пределах settings.pretrigger_memory_mb), чтобы записать их в начало
+        следующей записи.
+        """
+        seconds = self.settings.pretrigger_seconds
+        if seconds <= 0 or not self.is_initialized():
+            return
+        width, height = self.get_resolution()
+        video_fps = self._get_effective_record_fps()
+        video_shape = (height, width, 3)
+        demands = {'video': (seconds * video_fps * int(np.prod(video_shape)), video_shape, video_fps)}
+        if self.supports_radiometric() and self.settings.thermal_camera_record_radiometric:
+            raw_width, raw_height = self.get_radiometric_resolution()
+            raw_fps = self.get_preview_fps()
+            demands['thermal'] = (seconds * raw_fps * raw_width * raw_height * 2, (raw_height, raw_width), raw_fps)
+        
+        # При нехватке бюджета оба потока сокращаются пропорционально
+        budget = self.settings.pretrigger_memory_mb * 2 ** 20
+        scale = min(1.0, budget / max(1, sum(demand for demand, _, _ in demands.values())))
+        video_demand, video_shape, video_fps = demands['video']
+        video = PreTriggerBuffer(seconds, video_fps, video_shape, np.uint8, int(video_demand * scale))
+        thermal = None
+        if 'thermal' in demands:
+            thermal_demand, thermal_shape, thermal_fps = demands['thermal']
+            thermal = PreTriggerBuffer(
+                seconds, thermal_fps, thermal_shape, np.uint16, int(thermal_demand * scale), with_metadata=True
+            )
+        
+        with self._record_lock:
+            if self.is_recording:
+                return
+            self.decimator = self._create_decimator()
+            self.pretrigger_video = video
+            self.pretrigger_thermal = thermal
+        if scale < 1.0:
+            available = f"видео {video.capacity / video_fps:.1f} с"
+            if thermal is not None:
+                available += f", термограмма {thermal.capacity / thermal_fps:.1f} с"
+            logger.warning(
+                f"Предзапись {self.get_camera_name()} ограничена бюджетом памяти: "
+                f"{available} вместо {seconds} с"
+            )
+    
+    def disarm_pretrigger(self):
+        """Освобождает буферы предзаписи"""
+        with self._record_lock:
+            self.pretrigger_video = None
+            self.pretrigger_thermal = None
+    
+    def start_recording(self, file_base: str):
+        """
+        Начинает запись видео. Расширение файла определяется форматом записи
+        (get_record_format), термограмма пишется рядом с тем же именем. Кадры
+        предзаписи (arm_pretrigger) записываются в начало файлов.
+        """
         if not self.is_initialized():
             raise CameraNotInitializedError(f"Камера {self.get_camera_name()} не инициализирована")
         
         width, height = self.get_resolution()
-        fps = self.get_record_fps()
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        self.video_writer = cv2.VideoWriter(file_path, fourcc, fps, (width, height))
-        self.is_recording = True
-        logger.info(f"Начата запись видео: {file_path}")
+        fps = self._get_effective_record_fps()
+        thermogram_writer = None
+        differential = None
+        if self.supports_radiometric() and self.settings.thermal_camera_record_radiometric:
+            raw_width, raw_height = self.get_radiometric_resolution()
+            thermogram_writer = ThermogramWriter(
+                file_base + ThermogramWriter.EXTENSION, raw_width, raw_height, fps=self.get_preview_fps()
+            )
+            if self.settings.background_subtraction != 'off':
+                median_frames = self.settings.background_median_frames
+                differential = DifferentialWriter(
+                    file_base, (raw_height, raw_width),
+                    median_frames if self.settings.background_subtraction == 'median' else 0
+                )
+        
+        try:
+            backend = create_backend(self.get_record_format(), file_base, width, height, fps)
+        except RecordingError:
+            for writer in (thermogram_writer, differential):
+                if writer is not None:
+                    writer.close()
+            raise
+        
+        # Время кадра отмечается после записи: кадр, вытесненный из очереди,
+        # не должен сдвигать соответствие кадров файла и времени
+        video_times: List[float] = []
+        
+        def write_video(frame, sync_time):
+            backend.write(frame)
+            video_times.append(sync_time)
+        
+        # Кадры предзаписи дописываются в потоках записи до первого кадра их
+        # очередей; под блокировкой только отсоединяются буферы предзаписи
+        with self._record_lock:
+            pretrigger_video, self.pretrigger_video = self.pretrigger_video, None
+            pretrigger_thermal, self.pretrigger_thermal = self.pretrigger_thermal, None
+            if pretrigger_video is None:
+                self.decimator = self._create_decimator()
+            now = time.monotonic()
+            
+            def write_pretrigger():
+                for frame, _, sync_time, _ in pretrigger_video.drain(now):
+                    write_video(frame, sync_time)
+            
+            # Кодирование (и кадры предзаписи видео) - в фоновом потоке записи
+            self.video_writer = AsyncFrameWriter(
+                write_video,
+                backend.close,
+                max_queue=self.settings.record_queue_size,
+                policy=self.settings.record_backpressure,
+                name=os.path.basename(backend.path),
+                prologue=write_pretrigger if pretrigger_video is not None else None
+            )
+            self.recording_files = [backend.path]
+            self.recording_streams = {'video': backend.path}
+            self.recorded_times = {'video': video_times}
+            if thermogram_writer is not None:
+                thermogram_times = []
+                differential_times = []
+                # Буфер предзаписи уже отсоединён от камеры: кадры читаются из
+                # него без копирования обоими потоками записи
+                prologue_frames = list(pretrigger_thermal.drain(now)) if pretrigger_thermal is not None else []
+                
+                def write_thermogram(thermal, metadata, host_time, sync_time):
+                    thermogram_writer.write(thermal, metadata, host_time=host_time)
+                    thermogram_times.append(sync_time)
+                
+                def write_differential(thermal, sync_time):
+                    if differential.write(thermal, sync_time):
+                        differential_times.append(sync_time)
+                
+                def write_thermal_pretrigger():
+                    for thermal, host_time, sync_time, metadata in prologue_frames:
+                        write_thermogram(thermal, metadata, host_time, sync_time)
+                
+                def write_differential_pretrigger():
+                    for thermal, _, sync_time, _ in prologue_frames:
+                        write_differential(thermal, sync_time)
+                
+                # Термограмма хранит каждый кадр: при отставании диска очередь
+                # ждёт, как ждал ThermogramWriter.write() в потоке захвата
+                self.thermogram_writer = AsyncFrameWriter(
+                    write_thermogram,
+                    thermogram_writer.close,
+                    max_queue=self.settings.record_queue_size,
+                    policy=BACKPRESSURE_BLOCK,
+                    name=os.path.basename(thermogram_writer.file_path),
+                    prologue=write_thermal_pretrigger if prologue_frames else None
+                )
+                self.recording_files.append(thermogram_writer.file_path)
+                self.recording_streams['thermogram'] = thermogram_writer.file_path
+                self.recorded_times['thermogram'] = thermogram_times
+                if differential is not None:
+                    # Вычитание и запись float32 - в потоке записи, захват только копирует кадр
+                    self.differential = differential
+                    self.differential_writer = AsyncFrameWriter(
+                        write_differential,
+                        differential.close,
+                        max_queue=self.settings.record_queue_size,
+                        policy=self.settings.record_backpressure,
+                        name=os.path.basename(differential.file_path),
+                        prologue=write_differential_pretrigger if prologue_frames else None
+                    )
+                    self.recording_files.append(differential.file_path)
+                    self.recording_streams['differential'] = differential.file_path
+                    self.recorded_times['differential'] = differential_times
+            self.is_recording = True
+        logger.info(f"Начата запись видео ({backend.title}): {backend.path}")
     
     def stop_recording(self):
-        """Останавливает запись видео"""
-        if self.is_recording and self.video_writer:
-            self.video_writer.release()
+        """Останавливает запись видео и термограммы"""
+        with self._record_lock:
+            if not self.is_recording:
+                return
+            writers = [self.video_writer, self.thermogram_writer, self.differential_writer]
             self.video_writer = None
+            self.thermogram_writer = None
+            self.differential_writer = None
+            self.differential = None
             self.is_recording = False
-            logger.info("Запись видео остановлена.")
+        
+        # Дозапись очередей может занять время - вне блокировки, чтобы не
+        # задерживать поток захвата
+        for writer in writers:
+            if writer is not None:
+                writer.close()
+        self.last_recording_stats = self._sum_writer_stats(writers)
+        logger.info("Запись видео остановлена.")
+        self.arm_pretrigger()
+    
+    def mark_heating(self, event_time: float):
+        """
+        Отмечает начало нагрева: кадры термограммы до него образуют фон,
+        начиная с него записываются разностные кадры.
+        """
+        with self._record_lock:
+            if self.differential is not None:
+                self.differential.start_heating(event_time)
+    
+    def get_recording_stats(self) -> dict:
+        """Возвращает суммарные счётчики очередей записи камеры"""
+        return self._sum_writer_stats([self.video_writer, self.thermogram_writer, self.differential_writer])
+    
+    @staticmethod
+    def _sum_writer_stats(writers) -> dict:
+        stats = {'queued': 0, 'written': 0, 'dropped': 0}
+        for writer in writers:
+            if writer is not None:
+                for key, value in writer.stats().items():
+                    if key in stats:
+                        stats[key] += value
+        return stats
+    
+    def record_frame(self, seq: int, frame):
+        """
+        Отмечает кадр в синхронизаторе и записывает его, если запись активна
+        (вызывается из потока захвата).
+        """
+        timestamp = self.frame_ring.timestamp(seq)
+        sync_time = timestamp
+        if self.synchronizer is not None:
+            device_time, counter = self.get_frame_clock()
+            sync_time = self.synchronizer.stamp(self.sync_name, seq, timestamp, device_time, counter)
+        
+        observed = None
+        with self._record_lock:
+            if self.is_recording:
+                if self.video_writer:
+                    # Видео пишется с частотой записи, термограмма - с полной частотой захвата
+                    decimated = self.decimator.push(frame, timestamp)
+                    if decimated is not None:
+                        self.video_writer.submit(decimated, sync_time)
+                if self.thermogram_writer is not None:
+                    thermal, metadata = self.get_radiometric_frame()
+                    self.thermogram_writer.submit(thermal, frame_metadata_record(metadata), timestamp, sync_time)
+                    if self.differential_writer is not None:
+                        self.differential_writer.submit(thermal, sync_time)
+                    observed = thermal
+            elif self.pretrigger_video is not None:
+                # Запись не идёт: храним последние кадры для начала следующей
+                decimated = self.decimator.push(frame, timestamp)
+                if decimated is not None:
+                    self.pretrigger_video.push(decimated, timestamp, sync_time)
+                if self.pretrigger_thermal is not None:
+                    thermal, metadata = self.get_radiometric_frame()
+                    self.pretrigger_thermal.push(thermal, timestamp, sync_time, metadata)
+        
+        # Обработка на лету не задерживает запись: кадр передаётся вне блокировки
+        observer = self.thermogram_observer
+        if observed is not None and observer is not None:
+            observer(observed, sync_time)
+    
+    def get_frame_clock(self) -> Tuple[Optional[float], Optional[int]]:
+        """
+        Возвращает аппаратную метку времени (с) и счётчик последнего
+        захваченного кадра, если камера их отдаёт (вызывается из потока захвата).
+        """
+        return None, None
+    
+    def supports_radiometric(self) -> bool:
+        """Проверяет, отдаёт ли камера сырые радиометрические кадры"""
+        return False
+    
+    def get_radiometric_frame(self):
+        """
+        Возвращает сырую термограмму uint16 и метаданные последнего
+        захваченного кадра (вызывается из потока захвата после capture_into).
+        """
+        raise NotImplementedError(f"Камера {self.get_camera_name()} не отдаёт радиометрические данные")
+    
+    def get_radiometric_resolution(self) -> List[int]:
+        """Возвращает разрешение радиометрических кадров"""
+        return self.get_resolution()
+    
+    def start_acquisition(self):
+        """Запускает поток захвата кадров"""
+        if self._worker is not None and self._worker.isRunning():
+            return
+        if self.frame_ring is None:
+            width, height = self.get_resolution()
+            self.frame_ring = FrameRing((height, width, 3))
+        if self.pretrigger_video is None and not self.is_recording:
+            self.arm_pretrigger()
+        self._worker = AcquisitionWorker(self, self.frame_ring)
+        self._worker.set_preview_size(*self.display.viewport_size())
+        self._worker.frame_ready.connect(self.update_frame, Qt.QueuedConnection)
+        self._worker.capture_failed.connect(self._handle_capture_failed, Qt.QueuedConnection)
+        self._worker.start()
+    
+    def stop_acquisition(self):
+        """Останавливает поток захвата кадров"""
+        if self._worker is not None:
+            self._worker.stop()
+    
+    def is_acquiring(self) -> bool:
+        """Проверяет, идёт ли захват кадров"""
+        return self._worker is not None and self._worker.isRunning()
+    
+    def get_fps(self) -> float:
+        """Возвращает фактическую частоту захвата кадров"""
+        return self._worker.get_fps() if self._worker is not None else 0.0
+    
+    def get_allocation_stats(self) -> dict:
+        """Возвращает счётчики выделений памяти конвейера кадров"""
+        stats = self.frame_ring.stats() if self.frame_ring is not None else {}
+        stats['display_allocations'] = self.display.allocations
+        stats['preview_allocations'] = self._worker.preview_allocations if self._worker is not None else 0
+        return stats
+    
+    def _set_preview_size(self, width: int, height: int):
+        """Передаёт потоку захвата новый размер области просмотра"""
+        if self._worker is not None:
+            self._worker.set_preview_size(width, height)
     
     def update_frame(self):
-        """Обновляет кадр с камеры и отображает его"""
+        """Отображает самый свежий кадр, полученный потоком захвата"""
+        if self._worker is None:
+            return
+        ring, seq, frame = self._worker.take_latest()
+        if frame is None:
+            return
+        
+        # Если ранее была отключена, но теперь удалось получить кадр
+        if self.is_disconnected:
+            self.is_disconnected = False
+            self.notify_camera_reconnected(f"Камера {self.get_camera_name()} восстановлена.")
+            self.stop_reconnect_timer()
+        
         try:
-            frame = self.capture_frame()
-            if frame is None:
-                if not self.is_disconnected:
-                    self.is_disconnected = True
-                    self.notify_camera_error(f"Камера {self.get_camera_name()} была отключена.")
-                    self.stop_recording_if_needed()
-                    self.timer.stop()
-                    self.start_reconnect_timer()
-                return
-            
-            # Если ранее была отключена, но теперь удалось получить кадр
-            if self.is_disconnected:
-                self.is_disconnected = False
-                self.notify_camera_reconnected(f"Камера {self.get_camera_name()} восстановлена.")
-                self.stop_reconnect_timer()
-                self.timer.start(1000 // self.get_preview_fps())
-            
-            # Если запись активна, записываем кадр
-            if self.is_recording and self.video_writer:
-                self.video_writer.write(frame)
-            
-            # Отображение видео в графической области
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = frame.shape
-            bytes_per_line = ch * w
-            q_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            pixmap = QPixmap.fromImage(q_image)
-            self.pixmap_item.setPixmap(pixmap)
-            self.graphics_view.fitInView(self.pixmap_item, Qt.KeepAspectRatio)
-            
+            self._show_frame(frame, lambda: ring.is_valid(seq))
         except Exception as e:
-            logger.error(f"Ошибка при обновлении кадра: {e}")
-            if not self.is_disconnected:
-                self.is_disconnected = True
-                self.notify_camera_error(f"Ошибка камеры {self.get_camera_name()}: {e}")
-                self.stop_recording_if_needed()
-                self.timer.stop()
-                self.start_reconnect_timer()
+            logger.error(f"Ошибка при отображении кадра: {e}")
+    
+    def _show_frame(self, frame, is_valid=None):
+        """
+        Отображает кадр в графической области.
+
+        is_valid вызывается после копирования кадра: если слот успели
+        перезаписать во время копирования, кадр не показывается.
+        """
+        self.display.show(frame, is_valid)
+    
+    @Slot(str)
+    def _handle_capture_failed(self, message: str):
+        """Обрабатывает потерю камеры, о которой сообщил поток захвата"""
+        self.stop_acquisition()
+        if not self.is_disconnected:
+            self.is_disconnected = True
+            self.stop_recording_if_needed()
+            self.start_reconnect_timer()
+            self.notify_camera_error(message)
     
     def release(self):
         """Освобождает все ресурсы камеры"""
+        self.stop_acquisition()
         self.stop_recording()
-        if self.timer.isActive():
-            self.timer.stop()
+        self.disarm_pretrigger()
         if self.reconnect_timer.isActive():
             self.reconnect_timer.stop()
         self.release_resources()
@@ -198,7 +943,7 @@ class BaseCamera(ABC):
         logger.info(f"Попытка повторного подключения к камере {self.get_camera_name()}...")
         if self.initialize():
             logger.info(f"Повторное подключение к камере {self.get_camera_name()} успешно.")
-            self.timer.start(1000 // self.get_preview_fps())
+            self.start_acquisition()
             self.stop_reconnect_timer()
         else:
             logger.warning(f"Повторное подключение к камере {self.get_camera_name()} неудачно.")
@@ -232,7 +977,7 @@ class OpenCVCamera(BaseCamera):
             if self.camera and self.camera.isOpened():
                 self._apply_opencv_settings()
                 self._initialized = True
-                self.timer.start(1000 // self.get_preview_fps())
+                self.start_acquisition()
                 return True
             else:
                 logger.warning(f"Камера {self.get_camera_name()} не инициализирована.")
@@ -264,6 +1009,19 @@ class OpenCVCamera(BaseCamera):
         
         return frame
     
+    def capture_into(self, out: np.ndarray):
+        """Захватывает кадр с OpenCV камеры в предвыделенный буфер"""
+        if not self.is_initialized():
+            return None
+        
+        # При совпадении размера OpenCV декодирует кадр прямо в out
+        ret, frame = self.camera.read(out)
+        if not ret:
+            logger.error(f"Не удалось получить кадр с камеры {self.get_camera_name()}.")
+            return None
+        
+        return frame
+    
     def release_resources(self):
         """Освобождает ресурсы OpenCV камеры"""
         if self.camera and self.camera.isOpened():
@@ -282,6 +1040,12 @@ class OpenCVCamera(BaseCamera):
     
     def get_record_fps(self) -> int:
         return self.settings.visible_camera_recordFPS
+    
+    def get_record_averaging(self) -> bool:
+        return self.settings.visible_camera_record_averaging
+    
+    def get_record_format(self) -> str:
+        return self.settings.visible_camera_record_format
 
 
 # ==================== FLIR CAMERA ====================
@@ -297,6 +1061,7 @@ class FLIRCamera(BaseCamera):
         self.cam_list = None
         self.camera = None
         self.pixel_format_logged = False
+        self._frame_clock: Tuple[Optional[float], Optional[int]] = (None, None)
     
     def initialize(self) -> bool:
         try:
@@ -316,7 +1081,7 @@ class FLIRCamera(BaseCamera):
             self.camera.BeginAcquisition()
             
             self._initialized = True
-            self.timer.start(1000 // self.get_preview_fps())
+            self.start_acquisition()
             logger.info("FLIR camera initialized successfully")
             return True
             
@@ -399,6 +1164,10 @@ class FLIRCamera(BaseCamera):
     
     def capture_frame(self):
         """Захватывает кадр с FLIR камеры"""
+        return self.capture_into(None)
+    
+    def capture_into(self, out: Optional[np.ndarray]):
+        """Захватывает кадр с FLIR камеры, конвертируя его в BGR прямо в out"""
         if not self.is_initialized():
             return None
         
@@ -409,46 +1178,63 @@ class FLIRCamera(BaseCamera):
                 image_result.Release()
                 return None
             
-            # Получаем изображение в виде numpy массива
-            image_data = image_result.GetNDArray()
-            
-            # Получаем формат пикселя для правильной конвертации
-            pixel_format = image_result.GetPixelFormat()
-            
-            # Логируем формат для отладки
-            if not self.pixel_format_logged:
-                logger.info(f"FLIR Pixel Format: {pixel_format}")
-                logger.info(f"FLIR Image shape: {image_data.shape}")
-                self.pixel_format_logged = True
-            
-            # Конвертируем в BGR в зависимости от формата
-            if pixel_format == PySpin.PixelFormat_Mono8:
-                # Монохромное изображение - конвертируем в псевдоцвет
-                bgr_image = cv2.applyColorMap(image_data, cv2.COLORMAP_JET)
-            elif pixel_format == PySpin.PixelFormat_BayerBG8:
-                bgr_image = cv2.cvtColor(image_data, cv2.COLOR_BAYER_BG2BGR)
-            elif pixel_format == PySpin.PixelFormat_BayerGB8:
-                bgr_image = cv2.cvtColor(image_data, cv2.COLOR_BAYER_GB2BGR)
-            elif pixel_format == PySpin.PixelFormat_BayerGR8:
-                bgr_image = cv2.cvtColor(image_data, cv2.COLOR_BAYER_GR2BGR)
-            elif pixel_format == PySpin.PixelFormat_BayerRG8:
-                bgr_image = cv2.cvtColor(image_data, cv2.COLOR_BAYER_RG2BGR)
-            elif pixel_format == PySpin.PixelFormat_BGR8:
-                bgr_image = image_data  # Уже в BGR
-            elif pixel_format == PySpin.PixelFormat_RGB8:
-                bgr_image = cv2.cvtColor(image_data, cv2.COLOR_RGB2BGR)
-            else:
-                # Для неизвестного формата попробуем конвертировать как есть
-                logger.warning(f"Unsupported pixel format: {pixel_format}. Using raw image.")
-                bgr_image = image_data
-            
-            image_result.Release()
-            return bgr_image
+            try:
+                # Получаем изображение в виде numpy массива (буфер SDK)
+                image_data = image_result.GetNDArray()
+                
+                # Получаем формат пикселя для правильной конвертации
+                pixel_format = image_result.GetPixelFormat()
+                
+                # Логируем формат для отладки
+                if not self.pixel_format_logged:
+                    logger.info(f"FLIR Pixel Format: {pixel_format}")
+                    logger.info(f"FLIR Image shape: {image_data.shape}")
+                    self.pixel_format_logged = True
+                
+                if out is not None and out.shape[:2] != image_data.shape[:2]:
+                    out = None
+                
+                # Метка времени камеры (нс) и номер кадра из заголовка/chunk-данных
+                timestamp = image_result.GetTimeStamp()
+                self._frame_clock = (timestamp * 1e-9 if timestamp > 0 else None), image_result.GetFrameID()
+                
+                # Буфер SDK возвращается камере в Release(), поэтому
+                # кадр обязательно копируется/конвертируется до освобождения
+                return self._convert_to_bgr(image_data, pixel_format, out)
+            finally:
+                image_result.Release()
             
         except PySpin.SpinnakerException as ex:
             logger.error("FLIR camera error: %s", ex)
             return None
     
+    def _convert_to_bgr(self, image_data: np.ndarray, pixel_format, out: Optional[np.ndarray]):
+        """Конвертирует кадр в BGR в зависимости от формата пикселя"""
+        if pixel_format == PySpin.PixelFormat_Mono8:
+            # Монохромное изображение - конвертируем в псевдоцвет
+            return cv2.applyColorMap(image_data, cv2.COLORMAP_JET, dst=out)
+        elif pixel_format == PySpin.PixelFormat_BayerBG8:
+            return cv2.cvtColor(image_data, cv2.COLOR_BAYER_BG2BGR, dst=out)
+        elif pixel_format == PySpin.PixelFormat_BayerGB8:
+            return cv2.cvtColor(image_data, cv2.COLOR_BAYER_GB2BGR, dst=out)
+        elif pixel_format == PySpin.PixelFormat_BayerGR8:
+            return cv2.cvtColor(image_data, cv2.COLOR_BAYER_GR2BGR, dst=out)
+        elif pixel_format == PySpin.PixelFormat_BayerRG8:
+            return cv2.cvtColor(image_data, cv2.COLOR_BAYER_RG2BGR, dst=out)
+        elif pixel_format == PySpin.PixelFormat_RGB8:
+            return cv2.cvtColor(image_data, cv2.COLOR_RGB2BGR, dst=out)
+        
+        if pixel_format != PySpin.PixelFormat_BGR8:
+            # Для неизвестного формата попробуем использовать кадр как есть
+            logger.warning(f"Unsupported pixel format: {pixel_format}. Using raw image.")
+        if out is not None and out.shape == image_data.shape:
+            np.copyto(out, image_data)
+            return out
+        return image_data.copy()
+    
+    def get_frame_clock(self) -> Tuple[Optional[float], Optional[int]]:
+        return self._frame_clock
+    
     def release_resources(self):
         """Освобождает ресурсы FLIR камеры"""
         try:
@@ -485,15 +1271,27 @@ class FLIRCamera(BaseCamera):
     
     def get_record_fps(self) -> int:
         return self.settings.visible_camera_recordFPS
+    
+    def get_record_averaging(self) -> bool:
+        return self.settings.visible_camera_record_averaging
+    
+    def get_record_format(self) -> str:
+        return self.settings.visible_camera_record_format
 
 
 # ==================== THERMAL CAMERA ====================
 class ThermalCamera(BaseCamera):
     """Реализация для тепловизоров (заглушка для будущей реализации)"""
     
+    # Сырое значение заглушки: Optris кодирует температуру как (raw - 1000) / 10 °C
+    AMBIENT_RAW = 1200
+    
     def __init__(self, settings: Settings, graphics_view: QGraphicsView):
         super().__init__(settings, graphics_view)
         self.camera = None
+        self.metadata = EvoIRFrameMetadata()
+        width, height = self.get_resolution()
+        self.np_thermal = np.full((height, width), self.AMBIENT_RAW, dtype=np.uint16)
     
     def initialize(self) -> bool:
         try:
@@ -503,7 +1301,7 @@ class ThermalCamera(BaseCamera):
             
             # Для тестирования создаем заглушку с черным изображением
             self._initialized = True
-            self.timer.start(1000 // self.get_preview_fps())
+            self.start_acquisition()
             return True
             
         except Exception as e:
@@ -520,11 +1318,38 @@ class ThermalCamera(BaseCamera):
         # Заглушка: создаем черное изображение с текстом
         width, height = self.get_resolution()
         frame = np.zeros((height, width, 3), dtype=np.uint8)
+        return self._draw_placeholder(frame)
+    
+    def capture_into(self, out: np.ndarray):
+        """Рисует кадр-заглушку прямо в предвыделенный буфер"""
+        if not self.is_initialized():
+            return None
+        
+        width, height = self.get_resolution()
+        if out.shape != (height, width, 3):
+            return self.capture_frame()
+        out.fill(0)
+        return self._draw_placeholder(out)
+    
+    def _draw_placeholder(self, frame: np.ndarray) -> np.ndarray:
+        self.metadata.counter += 1
+        self.metadata.counterHW = self.metadata.counter
+        self.metadata.timestamp = int(time.monotonic() / OptrisCamera.TIMESTAMP_UNIT)
+        height = frame.shape[0]
         cv2.putText(frame, "Thermal Camera Not Implemented", (10, height//2), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        
         return frame
     
+    def supports_radiometric(self) -> bool:
+        return True
+    
+    def get_radiometric_frame(self):
+        """Равномерная термограмма комнатной температуры для отладки записи"""
+        return self.np_thermal, self.metadata
+    
+    def get_frame_clock(self) -> Tuple[Optional[float], Optional[int]]:
+        return self.metadata.timestamp * OptrisCamera.TIMESTAMP_UNIT, self.metadata.counterHW
+    
     def release_resources(self):
         """Освобождает ресурсы тепловизора"""
         self.camera = None
@@ -541,12 +1366,20 @@ class ThermalCamera(BaseCamera):
     
     def get_record_fps(self) -> int:
         return self.settings.thermal_camera_recordFPS
+    
+    def get_record_averaging(self) -> bool:
+        return self.settings.thermal_camera_record_averaging
+    
+    def get_record_format(self) -> str:
+        return self.settings.thermal_camera_record_format
 
 
 # ==================== OPTRIS CAMERA ====================
 class OptrisCamera(BaseCamera):
     """Реализация для тепловизоров Optris"""
     
+    TIMESTAMP_UNIT = 1e-7  # с, единица EvoIRFrameMetadata.timestamp
+    
     def __init__(self, settings: Settings, graphics_view: QGraphicsView):
         super().__init__(settings, graphics_view)
         self.libir = None
@@ -608,7 +1441,7 @@ class OptrisCamera(BaseCamera):
             self.libir.evo_irimager_set_palette(palette_id)
             
             self._initialized = True
-            self.timer.start(1000 // self.get_preview_fps())
+            self.start_acquisition()
             return True
             
         except Exception as e:
@@ -653,16 +1486,7 @@ class OptrisCamera(BaseCamera):
             return None
         
         try:
-            ret = self.libir.evo_irimager_get_thermal_palette_image_metadata(
-                self.thermal_width, self.thermal_height, 
-                self.np_thermal.ctypes.data_as(ct.POINTER(ct.c_ushort)), 
-                self.palette_width, self.palette_height, 
-                self.np_img.ctypes.data_as(ct.POINTER(ct.c_ubyte)), 
-                ct.byref(self.metadata)
-            )
-            
-            if ret != 0:
-                logger.error(f"Ошибка получения кадра от Optris: {ret}")
+            if not self._grab(self.np_img):
                 return None
             
             # Преобразуем в BGR для совместимости с OpenCV
@@ -678,6 +1502,51 @@ class OptrisCamera(BaseCamera):
             logger.error(f"Ошибка захвата кадра Optris: {e}")
             return None
     
+    def capture_into(self, out: np.ndarray):
+        """Захватывает кадр Optris: библиотека пишет палитровое изображение прямо в out"""
+        if not self.is_initialized():
+            return None
+        
+        expected_shape = (self.palette_height.value, self.palette_width.value, 3)
+        if out.shape != expected_shape or out.dtype != np.uint8 or not out.flags.c_contiguous:
+            return self.capture_frame()
+        
+        try:
+            return out if self._grab(out) else None
+        except Exception as e:
+            logger.error(f"Ошибка захвата кадра Optris: {e}")
+            return None
+    
+    def _grab(self, palette_buffer: np.ndarray) -> bool:
+        """Запрашивает у библиотеки термограмму, палитровое изображение и метаданные"""
+        ret = self.libir.evo_irimager_get_thermal_palette_image_metadata(
+            self.thermal_width, self.thermal_height, 
+            self.np_thermal.ctypes.data_as(ct.POINTER(ct.c_ushort)), 
+            self.palette_width, self.palette_height, 
+            palette_buffer.ctypes.data_as(ct.POINTER(ct.c_ubyte)), 
+            ct.byref(self.metadata)
+        )
+        
+        if ret != 0:
+            logger.error(f"Ошибка получения кадра от Optris: {ret}")
+            return False
+        return True
+    
+    def supports_radiometric(self) -> bool:
+        return True
+    
+    def get_radiometric_frame(self):
+        """Термограмма и метаданные, полученные тем же вызовом библиотеки, что и кадр"""
+        return self.np_thermal, self.metadata
+    
+    def get_radiometric_resolution(self) -> List[int]:
+        return [self.thermal_width.value, self.thermal_height.value]
+    
+    def get_frame_clock(self) -> Tuple[Optional[float], Optional[int]]:
+        """Метка времени кадра (единицы по 100 нс) и аппаратный счётчик из метаданных"""
+        timestamp = self.metadata.timestamp
+        return (timestamp * self.TIMESTAMP_UNIT if timestamp > 0 else None), self.metadata.counterHW
+    
     def release_resources(self):
         """Освобождает ресурсы тепловизора"""
         try:
@@ -700,6 +1569,12 @@ class OptrisCamera(BaseCamera):
     
     def get_record_fps(self) -> int:
         return self.settings.thermal_camera_recordFPS
+    
+    def get_record_averaging(self) -> bool:
+        return self.settings.thermal_camera_record_averaging
+    
+    def get_record_format(self) -> str:
+        return self.settings.thermal_camera_record_format
 
 # Define EvoIRFrameMetadata structure for Optris camera
 class EvoIRFrameMetadata(ct.Structure):
@@ -754,12 +1629,25 @@ class CameraFactory:
 class CameraManager:
     """Управляет несколькими камерами и их синхронизацией"""
     
-    def __init__(self):
+    REFERENCE_CAMERA = 'thermal'  # Опорная камера при сопоставлении кадров
+    HEATING_EVENT = HEATING_EVENT
+    COOLING_EVENT = COOLING_EVENT
+    
+    def __init__(self, sync_tolerance: float = 0.05):
         self.cameras = {}
+        self.synchronizer = FrameSynchronizer(self.REFERENCE_CAMERA, sync_tolerance)
+        self.sidecar_path: Optional[str] = None
+        self.events: List[dict] = []    # События текущей записи (включение нагрева и т.п.)
+        self.modulation: Optional[dict] = None  # Профиль нагрева текущей записи и его фронты
+        # Телеметрия канала нагревателя (heater.HeaterTelemetry), сохраняемая с каждой записью
+        self.heater_telemetry = None
+        self.recording_start: Optional[float] = None    # time.monotonic() начала текущей записи
     
     def add_camera(self, name: str, camera: BaseCamera):
         """Добавляет камеру в менеджер"""
         self.cameras[name] = camera
+        camera.synchronizer = self.synchronizer
+        camera.sync_name = name
     
     def initialize_all(self):
         """Инициализирует все камеры"""
@@ -770,14 +1658,96 @@ class CameraManager:
     
     def start_recording_all(self, base_path: str):
         """Начинает запись на всех камерах"""
+        self.sidecar_path = base_path + SIDECAR_SUFFIX
+        self.events = []
+        self.modulation = None
+        self.recording_start = time.monotonic()
         for name, camera in self.cameras.items():
+            camera.recording_streams = {}
+            camera.recorded_times = {}
             if camera.is_initialized():
-                camera.start_recording(f"{base_path}_{name}.avi")
+                camera.start_recording(f"{base_path}_{name}")
     
     def stop_recording_all(self):
-        """Останавливает запись на всех камерах"""
+        """Останавливает запись на всех камерах и сохраняет sidecar-файл с парами кадров"""
+        was_recording = any(camera.is_recording for camera in self.cameras.values())
         for camera in self.cameras.values():
             camera.stop_recording()
+        if was_recording and self.sidecar_path is not None:
+            self.write_sidecar()
+    
+    def mark_event(self, name: str, event_time: Optional[float] = None, **details):
+        """
+        Отмечает событие текущей записи (например, 'heater_on') по
+        time.monotonic(). В sidecar-файле для события указывается первый
+        кадр каждого файла, снятый не раньше него. HEATING_EVENT, кроме того,
+        завершает накопление фона для вычитания (BaseCamera.mark_heating).
+        """
+        event = {'name': name, 'time': time.monotonic() if event_time is None else event_time}
+        event.update(details)
+        self.events.append(event)
+        if name == self.HEATING_EVENT:
+            for camera in self.cameras.values():
+                camera.mark_heating(event['time'])
+        logger.info(f"Событие записи {name}: {event['time']:.6f}")
+    
+    def start_modulation(self, profile: dict, start_time: float):
+        """Начинает запись фронтов профиля нагрева profile (HeatingProfile.to_dict()) с нулём в start_time"""
+        self.modulation = {'profile': profile, 'start': start_time, 'edges': []}
+    
+    def mark_modulation_edge(self, state: bool, event_time: float, **details):
+        """Отмечает фронт нагрева профиля (момент отправки команды, time.monotonic())"""
+        if self.modulation is None:
+            return
+        self.modulation['edges'].append({'state': state, 'time': event_time, **details})
+    
+    def write_sidecar(self):
+        """Записывает соответствие кадров файлов разных камер последней записи"""
+        recordings = {
+            name: {'files': camera.recording_streams, 'times': camera.recorded_times}
+            for name, camera in self.cameras.items() if camera.recording_streams
+        }
+        if not recordings:
+            return
+        sidecar = build_sidecar(
+            self.REFERENCE_CAMERA, self.synchronizer.tolerance, recordings,
+            self.synchronizer.stats(), self.events, self.modulation,
+            None if self.heater_telemetry is None else self.heater_telemetry.series(self.recording_start)
+        )
+        try:
+            write_sidecar(self.sidecar_path, sidecar)
+        except OSError as e:
+            logger.error(f"Не удалось записать {self.sidecar_path}: {e}")
+    
+    def get_sync_stats(self) -> dict:
+        """Возвращает оценки часов камер и счётчики сопоставления кадров"""
+        return self.synchronizer.stats()
+    
+    def get_recording_stats(self) -> dict:
+        """Возвращает суммарные счётчики очередей текущей записи всех камер"""
+        return self._sum_stats(camera.get_recording_stats() for camera in self.cameras.values())
+    
+    def get_last_recording_stats(self) -> dict:
+        """Возвращает итоговые счётчики последней завершённой записи"""
+        return self._sum_stats(camera.last_recording_stats for camera in self.cameras.values())
+    
+    @staticmethod
+    def _sum_stats(camera_stats) -> dict:
+        total = {'queued': 0, 'written': 0, 'dropped': 0}
+        for stats in camera_stats:
+            for key, value in stats.items():
+                total[key] += value
+        return total
+    
+    def get_recording_files(self, base_path: str) -> List[str]:
+        """Возвращает файлы всех камер, записанные под префиксом base_path"""
+        files = []
+        for name, camera in self.cameras.items():
+            prefix = f"{base_path}_{name}"
+            files.extend(path for path in camera.recording_files if path.startswith(prefix))
+        if self.sidecar_path == base_path + SIDECAR_SUFFIX:
+            files.append(self.sidecar_path)
+        return files
     
     def release_all(self):
         """Освобождает ресурсы всех камер"""
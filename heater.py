@@ -1,49 +1,559 @@
+"""
+Модуль управления нагревателем
+"""
+
+import bisect
 import logging
-from serial_communicator import SerialCommunicator
+import math
+import os
+import queue
+import select
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from concurrent.futures import Future
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+from PySide6.QtCore import QThread, Signal
+
+try:
+    import serial
+    SERIAL_AVAILABLE = True
+except ImportError:
+    SERIAL_AVAILABLE = False
+    logging.warning("pyserial not available. Only MockHeater will work.")
+
+try:
+    import tty
+    TTY_AVAILABLE = True
+except ImportError:
+    # Windows: нет псевдотерминалов, FakeHeaterController недоступен
+    TTY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Команды контроллера нагревателя: имя -> (команда, ожидаемый ответ); протокол -
+# как у serial_communicator 1.0.0, через который работала прежняя версия (см. Heater)
+HEATER_COMMANDS: Dict[str, Tuple[str, str]] = {
+    'on': ('COMMAND1', 'ACK1'),
+    'off': ('COMMAND2', 'ACK2'),
+}
+# Поля телеметрии, которые контроллер может добавить к ответу
+# ('ACK1 T=85.2 I=1.35'): ключ ответа -> поле HeaterSample
+REPLY_FIELDS: Dict[str, str] = {
+    'T': 'temperature',     # °C, температура нагревательного элемента
+    'I': 'current',         # А, ток нагревателя
+}
+
+
+class HeaterError(Exception):
+    """Команда нагревателю не подтверждена"""
+    pass
+
+
+class HeaterCommand(NamedTuple):
+    """Команда в очереди нагревателя"""
+    name: str
+    timeout: float              # с, ожидание подтверждения одной попытки
+    retries: int                # Повторов после неудачной попытки
+    future: Future              # Результат - time.monotonic() подтверждения
+    poll: bool = False          # Проверка связи, а не команда оператора или циклограммы
+
+
+def parse_reply(line: str, expected: str) -> Optional[Dict[str, float]]:
+    """
+    Ответ контроллера -> поля телеметрии (REPLY_FIELDS) или None, если это
+    не подтверждение expected. Подтверждение - строка, содержащая expected
+    без учёта регистра (как SerialCommunicator.send_command в
+    serial_communicator 1.0.0). Неизвестные и нечисловые поля пропускаются.
+    """
+    if expected.lower() not in line.lower():
+        return None
+    fields = {}
+    for token in line.split():
+        key, _, value = token.partition('=')
+        if key in REPLY_FIELDS:
+            try:
+                fields[REPLY_FIELDS[key]] = float(value)
+            except ValueError:
+                pass
+    return fields
+
+
+class HeaterSample(NamedTuple):
+    """Одна попытка обмена с контроллером"""
+    time: float                 # time.monotonic() отправки
+    command: str
+    attempt: int                # 0 - первая отправка, далее повторы
+    outcome: str                # 'ack', 'timeout' или 'error'
+    latency: float              # с от отправки до ответа, тайм-аута или ошибки
+    poll: bool                  # Проверка связи
+    temperature: float = math.nan   # Сообщённые контроллером значения (NaN - нет)
+    current: float = math.nan
+
+
+class HeaterTelemetry:
+    """
+    Временной ряд попыток обмена с контроллером нагревателя за сессию:
+    время прохождения команды, тайм-ауты подтверждения, повторы и
+    сообщённые контроллером температура и ток элемента.
 
-class Heater(SerialCommunicator):
+    Пополняется потоком обмена, читается GUI (строка состояния) и записью
+    зоны (series). Рост времени ответа и тайм-ауты в окне summary() -
+    признак деградации линии: выключение нагрева по такой линии запоздает.
     """
-    Класс для управления нагревателем через последовательный порт.
+
+    LATENCY_WARNING = 0.1   # с, 95-й процентиль времени ответа, выше которого линия считается деградировавшей
+    WINDOW = 60.0           # с, окно оценки состояния линии
+
+    def __init__(self):
+        self._samples: List[HeaterSample] = []
+        self._times: List[float] = []
+        self._lock = threading.Lock()
+
+    def add(self, sample: HeaterSample):
+        with self._lock:
+            self._samples.append(sample)
+            self._times.append(sample.time)
+
+    def samples(self, since: float = -math.inf, until: float = math.inf) -> List[HeaterSample]:
+        """Попытки, отправленные в [since, until) по time.monotonic()"""
+        with self._lock:
+            first = bisect.bisect_left(self._times, since)
+            last = bisect.bisect_left(self._times, until)
+            return self._samples[first:last]
+
+    def summary(self, window: float = WINDOW) -> dict:
+        """
+        Состояние линии за последние window секунд: попытки, повторы,
+        тайм-ауты и ошибки, время ответа подтверждённых попыток (мс: среднее,
+        95-й процентиль, наибольшее), последние температура и ток.
+        """
+        samples = self.samples(since=time.monotonic() - window)
+        acks = np.array([sample.latency for sample in samples if sample.outcome == 'ack']) * 1000
+        timeouts = sum(sample.outcome == 'timeout' for sample in samples)
+        errors = sum(sample.outcome == 'error' for sample in samples)
+        summary = {
+            'attempts': len(samples),
+            'retries': sum(sample.attempt > 0 for sample in samples),
+            'timeouts': timeouts,
+            'errors': errors,
+        }
+        if len(acks):
+            summary.update(
+                latency_ms=round(float(acks.mean()), 3),
+                p95_ms=round(float(np.percentile(acks, 95)), 3),
+                max_ms=round(float(acks.max()), 3),
+            )
+        for field in REPLY_FIELDS.values():
+            reported = [getattr(sample, field) for sample in samples if not math.isnan(getattr(sample, field))]
+            if reported:
+                summary[field] = reported[-1]
+        summary['degraded'] = bool(
+            timeouts or errors or summary.get('p95_ms', 0) > self.LATENCY_WARNING * 1000
+        )
+        return summary
+
+    def series(self, since: float, until: float = math.inf) -> dict:
+        """
+        Попытки [since, until) по столбцам для sidecar-файла записи: время от
+        since (с), время ответа (мс); несообщённые значения - None.
+        """
+        samples = self.samples(since, until)
+
+        def optional(value: float) -> Optional[float]:
+            return None if math.isnan(value) else value
+
+        return {
+            'start': since,
+            'time': [round(sample.time - since, 6) for sample in samples],
+            'command': [sample.command for sample in samples],
+            'attempt': [sample.attempt for sample in samples],
+            'outcome': [sample.outcome for sample in samples],
+            'latency_ms': [round(sample.latency * 1000, 3) for sample in samples],
+            'poll': [sample.poll for sample in samples],
+            **{field: [optional(getattr(sample, field)) for sample in samples] for field in REPLY_FIELDS.values()},
+        }
+
+
+class _QThreadABCMeta(ABCMeta, type(QThread)):
+    """Метакласс абстрактного QThread (ABCMeta поверх метакласса Qt)"""
+    pass
+
+
+class HeaterClient(QThread, metaclass=_QThreadABCMeta):
     """
+    Очередь команд нагревателю с обменом в отдельном потоке.
+
+    Команды выполняются строго по очереди, в порядке отправки: выключение,
+    отправленное во время ожидания подтверждения включения, выполнится после
+    него, и нагреватель останется выключенным. Каждая попытка ждёт ответа
+    не дольше timeout, неподтверждённая команда повторяется retries раз.
+
+    turn_on_async()/turn_off_async() возвращают сразу concurrent.futures.Future
+    (результат - время подтверждения по time.monotonic(), ошибка - HeaterError),
+    о результате также сообщают сигналы. turn_on()/turn_off() ждут
+    подтверждения и предназначены для рабочих потоков (циклограмма), не для GUI.
+
+    Поток запускается при первой команде, то есть после создания QApplication.
+
+    Каждая попытка обмена записывается в telemetry (HeaterTelemetry). По
+    желанию (set_poll_interval, по умолчанию выключено) поток в простое
+    проверяет связь, чтобы деградация линии была видна до следующего нагрева.
+    """
+
+    TIMEOUT = 0.5           # с, ожидание подтверждения одной попытки
+    RETRIES = 2             # Повторов неподтверждённой команды
+    RETRY_DELAY = 0.05      # с, пауза перед повтором
+
+    command_finished = Signal(str, float)   # команда, время подтверждения (time.monotonic)
+    command_failed = Signal(str, str)       # команда, текст ошибки
+    state_changed = Signal(bool)            # Подтверждённое состояние нагревателя
 
-    def __init__(self, com_port_number, baud_rate):
-        super().__init__(com_port_number, baud_rate)
+    def __init__(self, timeout: float = TIMEOUT, retries: int = RETRIES, parent=None):
+        super().__init__(parent)
+        # Конструктор Qt не проверяет абстрактные методы, как object.__new__
+        if self.__abstractmethods__:
+            raise TypeError(
+                f"Can't instantiate abstract class {type(self).__name__} "
+                f"with abstract methods {', '.join(sorted(self.__abstractmethods__))}"
+            )
+        self.timeout = timeout
+        self.retries = retries
         self.state = False
+        self.attempts = 0           # Всего отправок, включая повторы
+        self.telemetry = HeaterTelemetry()
+        self.poll_interval = 0.0    # с, проверка связи в простое (0 - выкл)
+        self._queue: "queue.Queue[Optional[HeaterCommand]]" = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._closed = False
 
-    def turn_on(self) -> None:
-        command = 'COMMAND1'
-        expected_response = 'ACK1'
+    # ---------- Интерфейс ----------
+    def submit(self, name: str, timeout: Optional[float] = None, retries: Optional[int] = None) -> Future:
+        """Ставит команду HEATER_COMMANDS[name] в очередь и сразу возвращает её Future"""
+        if name not in HEATER_COMMANDS:
+            raise ValueError(f"Неизвестная команда нагревателя: {name}")
+        future = Future()
+        with self._start_lock:
+            if self._closed:
+                future.set_exception(HeaterError("Канал нагревателя закрыт"))
+                return future
+            if not self.isRunning():
+                self.start()
+            self._queue.put(HeaterCommand(
+                name, self.timeout if timeout is None else timeout,
+                self.retries if retries is None else retries, future
+            ))
+        return future
 
-        if self.send_command(command, expected_response):
-            self.state = True
-            logging.info("Нагреватель включен")
-        else:
-            logging.error("Не удалось включить нагреватель")
+    def open_channel(self):
+        """
+        Запускает поток обмена, который сразу открывает соединение
+        (_connect), чтобы первая команда не ждала открытия порта
+        """
+        with self._start_lock:
+            if not self._closed and not self.isRunning():
+                self.start()
+
+    def set_poll_interval(self, interval: float):
+        """
+        Проверка связи в простое раз в interval секунд (0 - выкл, по умолчанию).
+
+        В протоколе контроллера нет запроса состояния или пустой команды,
+        поэтому проверка - настоящая команда выключения (COMMAND2) без
+        повторов. Она отправляется, только когда очередь пуста и нагрев по
+        подтверждённому состоянию выключен; включение нагревателя в обход
+        этого канала (вручную, другой программой) она выключит. На время
+        циклограммы проверку следует выключать: уже начатая проверка
+        задерживает следующую команду на время ответа.
+        """
+        with self._start_lock:
+            self.poll_interval = interval
+            if interval > 0 and not self._closed and not self.isRunning():
+                self.start()
+
+    def turn_on_async(self) -> Future:
+        return self.submit('on')
+
+    def turn_off_async(self) -> Future:
+        return self.submit('off')
 
-    def turn_off(self) -> None:
-        command = 'COMMAND2'
-        expected_response = 'ACK2'
+    def turn_on(self) -> float:
+        """Включает нагрев и ждёт подтверждения; время подтверждения или HeaterError"""
+        return self.turn_on_async().result()
 
-        if self.send_command(command, expected_response):
-            self.state = False
-            logging.info("Нагреватель выключен")
+    def turn_off(self) -> float:
+        """Выключает нагрев и ждёт подтверждения; время подтверждения или HeaterError"""
+        return self.turn_off_async().result()
+
+    def close(self):
+        """Выполняет уже отправленные команды и останавливает поток"""
+        with self._start_lock:
+            self._closed = True
+            running = self.isRunning()
+            if running:
+                self._queue.put(None)
+        if running:
+            self.wait()
+
+    # ---------- Поток обмена ----------
+    def run(self):
+        try:
+            self._connect()
+            while True:
+                interval = self.poll_interval
+                try:
+                    command = self._queue.get(timeout=interval if interval > 0 else None)
+                except queue.Empty:
+                    if self.poll_interval > 0 and not self.state:
+                        self._execute(HeaterCommand('off', self.timeout, 0, Future(), poll=True))
+                    continue
+                if command is None:
+                    break
+                self._execute(command)
+        finally:
+            self._disconnect()
+            # Команды, не дождавшиеся выполнения
+            while True:
+                try:
+                    command = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if command is not None:
+                    command.future.set_exception(HeaterError("Канал нагревателя закрыт"))
+
+    def _execute(self, command: HeaterCommand):
+        error = "нет ответа"
+        for attempt in range(command.retries + 1):
+            if attempt:
+                time.sleep(self.RETRY_DELAY)
+                logger.warning(f"Повтор команды нагревателя {command.name} ({attempt}/{command.retries})")
+            self.attempts += 1
+            sent = time.monotonic()
+            reply = None
+            outcome = 'timeout'
+            try:
+                reply = self._exchange(command.name, command.timeout)
+                if reply is not None:
+                    outcome = 'ack'
+            except Exception as e:
+                error = str(e)
+                outcome = 'error'
+                self._disconnect()
+            self.telemetry.add(HeaterSample(
+                sent, command.name, attempt, outcome, time.monotonic() - sent, command.poll, **(reply or {})
+            ))
+            if reply is not None:
+                break
         else:
-            logging.error("Не удалось выключить нагреватель")
+            message = f"Команда {command.name} не подтверждена: {error}"
+            command.future.set_exception(HeaterError(message))
+            if command.poll:
+                logger.warning(f"Проверка связи с нагревателем: {message}")
+                return
+            logger.error(message)
+            self.command_failed.emit(command.name, message)
+            return
+        if command.poll:
+            command.future.set_result(time.monotonic())
+            return
+
+        confirmed = time.monotonic()
+        state = command.name == 'on'
+        changed = state != self.state
+        self.state = state
+        logger.info(f"Нагреватель {'включен' if state else 'выключен'}")
+        command.future.set_result(confirmed)
+        self.command_finished.emit(command.name, confirmed)
+        if changed:
+            self.state_changed.emit(state)
+
+    @abstractmethod
+    def _exchange(self, name: str, timeout: float) -> Optional[Dict[str, float]]:
+        """
+        Одна попытка: отправка команды и ожидание ответа. Поля телеметрии
+        подтверждения (parse_reply) или None - нет подтверждения за timeout
+        """
+        pass
+
+    def _connect(self):
+        """Открывает соединение при запуске потока; ошибка - повторно при первой команде"""
+        pass
+
+    def _disconnect(self):
+        """Закрывает соединение (следующая попытка откроет заново)"""
+        pass
+
+
+class Heater(HeaterClient):
+    """
+    Нагреватель на последовательном порту.
+
+    Кадрирование повторяет serial_communicator 1.0.0 (SerialCommunicator,
+    через который прежде работал Heater): перед командой очищаются буферы
+    приёма и передачи, команда - command.strip() с переводом строки в
+    UTF-8, ответ - строка до перевода строки; подтверждение - строка,
+    содержащая ожидаемый ответ без учёта регистра (parse_reply). Поля
+    телеметрии (REPLY_FIELDS), если контроллер их добавит, разбираются из
+    той же строки. После открытия
+    порта выдерживается OPEN_SETTLE, как в SerialCommunicator: контроллер
+    перезапускается при открытии порта и первые команды теряет.
+
+    В отличие от SerialCommunicator ответ ждётся не дольше timeout, а
+    строки, не являющиеся подтверждением, пропускаются до истечения срока.
+    Порт открывается при запуске потока (open_channel) и переоткрывается после
+    ошибки ввода-вывода.
+    """
+
+    TERMINATOR = b'\n'
+    ENCODING = 'utf-8'
+    OPEN_SETTLE = 2.0       # с, пауза после открытия порта (перезапуск контроллера)
 
-class MockHeater:
-    
-    def __init__(self, com_port_number, baud_rate):
+    def __init__(self, com_port_number: Union[int, str], baud_rate: int,
+                 timeout: float = HeaterClient.TIMEOUT, retries: int = HeaterClient.RETRIES, parent=None):
+        if not SERIAL_AVAILABLE:
+            raise ImportError("pyserial is not available. Cannot create Heater.")
+        super().__init__(timeout, retries, parent)
+        self.port = self.port_name(com_port_number)
+        self.baud_rate = baud_rate
+        self._serial = None
+
+    @staticmethod
+    def port_name(port: Union[int, str]) -> str:
+        """Номер порта из настроек -> имя устройства; строка (например, /dev/pts/3) - как есть"""
+        if isinstance(port, str):
+            return port
+        return f"COM{port}" if os.name == 'nt' else f"/dev/ttyUSB{port}"
+
+    def _open(self):
+        self._serial = serial.Serial(self.port, self.baud_rate, timeout=self.timeout, write_timeout=self.timeout)
+        logger.info(f"Открыт порт нагревателя {self.port} ({self.baud_rate} бод)")
+        time.sleep(self.OPEN_SETTLE)
+
+    def _connect(self):
+        try:
+            self._open()
+        except Exception as e:
+            logger.error(f"Не удалось открыть порт нагревателя {self.port}: {e}")
+            self._disconnect()
+
+    def _exchange(self, name: str, timeout: float) -> Optional[Dict[str, float]]:
+        command, expected = HEATER_COMMANDS[name]
+        if self._serial is None:
+            self._open()
+        # Запоздавшие ответы на прошлые попытки не должны подтвердить эту
+        self._serial.reset_input_buffer()
+        self._serial.reset_output_buffer()
+        self._serial.write(command.strip().encode(self.ENCODING) + self.TERMINATOR)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self._serial.timeout = remaining
+            line = self._serial.read_until(self.TERMINATOR)
+            fields = parse_reply(line.decode(self.ENCODING, errors='replace'), expected)
+            if fields is not None:
+                return fields
+
+    def _disconnect(self):
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            except Exception:
+                pass
+            self._serial = None
+
+
+class MockHeater(HeaterClient):
+    """Заглушка нагревателя с той же очередью команд и задержкой ответа контроллера"""
+
+    def __init__(self, com_port_number, baud_rate, response_delay: float = 0.0, parent=None):
+        super().__init__(parent=parent)
         self.com_port_number = com_port_number
         self.baud_rate = baud_rate
-        self.state = False
+        self.response_delay = response_delay    # с, имитация ответа контроллера по COM-порту
+        self.switch_times = []                  # (состояние, time.monotonic()) каждой команды
         logging.info(f"СИМУЛЯЦИЯ: MockHeater инициализирован (Порт: {com_port_number}, Бод: {baud_rate})")
 
-    def turn_on(self) -> None:
-        self.state = True
-        logging.info("СИМУЛЯЦИЯ: Нагреватель включен")
-        
+    def state_at(self, times: np.ndarray) -> np.ndarray:
+        """
+        Состояние нагревателя (0/1) в моменты times (time.monotonic()) по
+        выполненным командам - мощность нагрева для имитации отклика объекта
+        на профиль нагрева.
+        """
+        switch_times = np.array([t for _, t in self.switch_times], dtype=np.float64)
+        states = np.array([state for state, _ in self.switch_times] + [False], dtype=np.float32)
+        return states[np.searchsorted(switch_times, np.asarray(times, dtype=np.float64), side='right') - 1]
+
+    def _exchange(self, name: str, timeout: float) -> Optional[Dict[str, float]]:
+        self.switch_times.append((name == 'on', time.monotonic()))
+        if self.response_delay:
+            time.sleep(self.response_delay)
+        logging.info(f"СИМУЛЯЦИЯ: Нагреватель {'включен' if name == 'on' else 'выключен'}")
+        return {}
+
 
-    def turn_off(self) -> None:
+class FakeHeaterController:
+    """
+    Имитатор контроллера нагревателя на псевдотерминале (только POSIX):
+    Heater(controller.port, ...) обменивается с ним, как с COM-портом.
+    Отвечает на команды HEATER_COMMANDS с задержкой response_delay;
+    drop(n) пропускает ответы на n следующих команд (проверка повторов),
+    silent - не отвечает вовсе (проверка тайм-аутов). reported - поля
+    телеметрии ответа ({'T': 85.2, 'I': 1.35}); response_delay можно менять
+    на ходу (деградация линии).
+    """
+
+    def __init__(self, response_delay: float = 0.0):
+        if not TTY_AVAILABLE or not hasattr(os, 'openpty'):
+            raise OSError("Псевдотерминалы доступны только в POSIX")
+        self.response_delay = response_delay
+        self.silent = False
+        self.reported: Dict[str, float] = {}
         self.state = False
-        logging.info("СИМУЛЯЦИЯ: Нагреватель выключен")
-        
\ No newline at end of file
+        self.received: List[Tuple[str, float]] = []     # (команда, time.monotonic())
+        self._drop = 0
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="FakeHeaterController", daemon=True)
+        self._thread.start()
+
+    def drop(self, count: int):
+        self._drop += count
+
+    def _serve(self):
+        responses = {command: (name, response) for name, (command, response) in HEATER_COMMANDS.items()}
+        buffer = b''
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                buffer += os.read(self._master, 1024)
+            except OSError:
+                break
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                command = line.strip().decode('ascii', errors='replace')
+                self.received.append((command, time.monotonic()))
+                if command not in responses or self.silent:
+                    continue
+                if self._drop:
+                    self._drop -= 1
+                    continue
+                name, response = responses[command]
+                if self.response_delay:
+                    time.sleep(self.response_delay)
+                self.state = name == 'on'
+                fields = ''.join(f" {key}={value:g}" for key, value in self.reported.items())
+                os.write(self._master, (response + fields).encode('ascii') + b'\r\n')
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        for fd in (self._master, self._slave):
+            os.close(fd)
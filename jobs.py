@@ -0,0 +1,440 @@
+"""
+Модуль фоновой обработки записанных зон
+"""
+
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PySide6.QtCore import QObject, Signal
+
+from cache import ResultCache
+from processing import (
+    DifferentialWriter, lock_in, principal_components, pulsed_phase, thermographic_signal_reconstruction
+)
+from recording import NpySequenceWriter, ThermogramReader, ThermogramWriter
+from sync import COOLING_EVENT, HEATING_EVENT, SIDECAR_SUFFIX, event_frame, modulation_timeline, read_sidecar
+
+logger = logging.getLogger(__name__)
+
+# Камера, записи которой обрабатываются
+PROCESSING_CAMERA = 'thermal'
+
+# Окончание базы имён файлов зоны: {объект}_zone(x,y)
+ZONE_PATTERN = re.compile(r'_zone\((-?\d+),(-?\d+)\)$')
+
+
+# ==================== ZONE FILES ====================
+class ZoneRecording(NamedTuple):
+    """Файлы и разметка записи зоны, нужные алгоритмам"""
+    thermogram: str
+    differential: Optional[str]     # None, если вычитание фона при записи было выключено
+    fps: float
+    frames: int
+    heating_frame: int              # Первый кадр термограммы после включения нагрева
+    cooling_frame: int              # Первый кадр термограммы после выключения нагрева
+    profile: Optional[dict] = None  # Профиль нагрева (profiles.HeatingProfile.to_dict()), если записан
+    timeline: Optional[Tuple[np.ndarray, np.ndarray]] = None  # Время кадров от начала профиля и состояние нагрева
+
+
+def thermogram_path(zone_base: str, camera: str = PROCESSING_CAMERA) -> str:
+    return f"{zone_base}_{camera}{ThermogramWriter.EXTENSION}"
+
+
+def differential_path(zone_base: str, camera: str = PROCESSING_CAMERA) -> str:
+    return f"{zone_base}_{camera}{DifferentialWriter.SUFFIX}{NpySequenceWriter.EXTENSION}"
+
+
+def find_zones(directory: str) -> Dict[Tuple[int, int], str]:
+    """
+    Записанные зоны в папке сессии: позиция (x, y) -> база имён файлов
+    (как MainWindow.current_base_path). Зона - это sidecar-файл записи.
+    """
+    zones = {}
+    if not os.path.isdir(directory):
+        return zones
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(SIDECAR_SUFFIX):
+            continue
+        base = name[:-len(SIDECAR_SUFFIX)]
+        match = ZONE_PATTERN.search(base)
+        if match:
+            zones[(int(match.group(1)), int(match.group(2)))] = os.path.join(directory, base)
+    return zones
+
+
+def result_path(zone_base: str, algorithm: str, camera: str = PROCESSING_CAMERA) -> str:
+    """Файл результата алгоритма для зоны (.npz)"""
+    return f"{zone_base}_{camera}_{algorithm}.npz"
+
+
+def load_zone(zone_base: str, camera: str = PROCESSING_CAMERA) -> ZoneRecording:
+    """
+    Находит термограмму зоны и по sidecar-файлу - кадры включения и
+    выключения нагрева. Без событий нагревом считается вся запись.
+    """
+    path = thermogram_path(zone_base, camera)
+    with ThermogramReader(path) as reader:
+        fps, frames = reader.fps, len(reader)
+
+    heating_frame = cooling_frame = profile = timeline = None
+    sidecar_path = zone_base + SIDECAR_SUFFIX
+    if os.path.exists(sidecar_path):
+        sidecar = read_sidecar(sidecar_path)
+        heating_frame = event_frame(sidecar, HEATING_EVENT, f"{camera}.thermogram")
+        cooling_frame = event_frame(sidecar, COOLING_EVENT, f"{camera}.thermogram")
+        timeline = modulation_timeline(sidecar, f"{camera}.thermogram")
+        if timeline is not None:
+            profile = sidecar['modulation']['profile']
+    heating_frame = heating_frame or 0
+    cooling_frame = heating_frame if cooling_frame is None else cooling_frame
+
+    differential = differential_path(zone_base, camera)
+    return ZoneRecording(
+        path, differential if os.path.exists(differential) else None,
+        fps, frames, heating_frame, cooling_frame, profile, timeline
+    )
+
+
+def _save_result(path: str, **arrays):
+    """Сохраняет результат целиком или никак: прерванная запись не оставит битый файл"""
+    temporary = path + '.part'
+    with open(temporary, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temporary, path)
+
+
+# ==================== ALGORITHMS ====================
+def _run_background_subtraction(zone: ZoneRecording, output: str, cache: Optional[ResultCache]) -> str:
+    """
+    Разностная последовательность (_diff.npy), если она не была получена при
+    записи. output не используется: результат - тот же файл, что и при записи.
+    Последовательность не кэшируется: она размером с саму запись.
+    """
+    if zone.differential is not None:
+        return zone.differential
+    with ThermogramReader(zone.thermogram) as reader:
+        differential = DifferentialWriter(zone.thermogram[:-len(ThermogramWriter.EXTENSION)], reader.frames.shape[1:])
+        differential.start_heating(zone.heating_frame)
+        try:
+            for index in range(len(reader)):
+                differential.write(reader.frames[index], index)
+        finally:
+            differential.close()
+    return differential.file_path
+
+
+def _cached(cache: Optional[ResultCache], source: str, algorithm: str, parameters: dict,
+            compute: Callable[[], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    if cache is None:
+        return compute()
+    return cache.fetch(source, algorithm, parameters, compute)
+
+
+def _run_pulsed_phase(zone: ZoneRecording, output: str, cache: Optional[ResultCache]) -> str:
+    parameters = {'fps': zone.fps, 'start': zone.cooling_frame, 'bins': 10}
+
+    def compute():
+        result = pulsed_phase(zone.thermogram, **parameters)
+        return {'amplitude': result.amplitude, 'phase': result.phase,
+                'frequencies': result.frequencies, 'bins': result.bins}
+
+    _save_result(output, **_cached(cache, zone.thermogram, 'fft', parameters, compute))
+    return output
+
+
+def _run_principal_components(zone: ZoneRecording, output: str, cache: Optional[ResultCache]) -> str:
+    parameters = {'start': zone.cooling_frame, 'components': 5}
+
+    def compute():
+        result = principal_components(zone.thermogram, **parameters)
+        return {'images': result.images, 'temporal': result.temporal,
+                'singular_values': result.singular_values, 'explained': result.explained}
+
+    _save_result(output, **_cached(cache, zone.thermogram, 'pca', parameters, compute))
+    return output
+
+
+def _run_signal_reconstruction(zone: ZoneRecording, output: str, cache: Optional[ResultCache]) -> str:
+    if zone.differential is not None:
+        # Разностная последовательность начинается с кадра включения нагрева
+        source = zone.differential
+        parameters = {'fps': zone.fps, 'start': zone.cooling_frame - zone.heating_frame, 'order': 7}
+    else:
+        source = zone.thermogram
+        parameters = {'fps': zone.fps, 'start': zone.cooling_frame, 'order': 7,
+                      'background_frames': max(1, zone.heating_frame)}
+
+    def compute():
+        arguments = dict(parameters)
+        background = None
+        if 'background_frames' in arguments:
+            with ThermogramReader(zone.thermogram) as reader:
+                background = reader.frames[:arguments.pop('background_frames')].mean(axis=0, dtype=np.float32)
+        result = thermographic_signal_reconstruction(source, background=background, **arguments)
+        return {'coefficients': result.coefficients, 'times': result.times,
+                'derivative_times': result.derivative_times, 'first': result.first,
+                'second': result.second, 'second_peak_time': result.second_peak_time}
+
+    _save_result(output, **_cached(cache, source, 'tsr', parameters, compute))
+    return output
+
+
+def _run_lock_in(zone: ZoneRecording, output: str, cache: Optional[ResultCache]) -> str:
+    """Lock-in демодуляция кадров, снятых во время модуляции нагрева"""
+    if zone.profile is None or zone.profile['kind'] == 'pulse':
+        raise ValueError("Запись без модуляции нагрева: lock-in обработка неприменима")
+    times, heating = zone.timeline
+    modulated = np.flatnonzero((times >= 0) & (times < zone.profile['heating_duration']))
+    if not len(modulated):
+        raise ValueError("Нет кадров термограммы во время модуляции нагрева")
+    # Времена кадров и нагрев берутся из sidecar: они входят в ключ кэша вместе с термограммой
+    timeline_hash = hashlib.sha1(times.tobytes() + heating.tobytes()).hexdigest()
+    parameters = {'frequency': zone.profile['frequency'], 'start': int(modulated[0]),
+                  'stop': int(modulated[-1]) + 1, 'timeline': timeline_hash}
+
+    def compute():
+        result = lock_in(zone.thermogram, times, parameters['frequency'], heating,
+                         parameters['start'], parameters['stop'])
+        return {'in_phase': result.in_phase, 'quadrature': result.quadrature, 'amplitude': result.amplitude,
+                'phase': result.phase, 'frequency': np.float64(result.frequency)}
+
+    _save_result(output, **_cached(cache, zone.thermogram, 'lockin', parameters, compute))
+    return output
+
+
+class Algorithm(NamedTuple):
+    title: str
+    function: Callable[[ZoneRecording, str, Optional[ResultCache]], str]
+
+
+# Порядок словаря - порядок запуска алгоритмов одной зоны
+ALGORITHMS: Dict[str, Algorithm] = {
+    'bs': Algorithm("Вычитание фона", _run_background_subtraction),
+    'fft': Algorithm("Фазовая термография", _run_pulsed_phase),
+    'pca': Algorithm("Главные компоненты", _run_principal_components),
+    'tsr': Algorithm("Реконструкция сигнала", _run_signal_reconstruction),
+    'lockin': Algorithm("Lock-in термография", _run_lock_in),
+}
+
+# Алгоритм -> алгоритмы той же зоны, которые должны завершиться до его запуска.
+# TSR считается по разностной последовательности, если она есть: без ожидания
+# 'bs' результат (и ключ кэша) зависел бы от того, успел ли _diff.npy появиться
+DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    'tsr': ('bs',),
+}
+
+
+def run_algorithm(algorithm: str, zone_base: str, cache_root: Optional[str] = None,
+                  cache_bytes: int = 0) -> str:
+    """
+    Выполняет алгоритм для зоны (в процессе пула) и возвращает путь к
+    результату. При заданном cache_root результат берётся из кэша, если
+    эта запись уже обрабатывалась с теми же параметрами.
+    """
+    zone = load_zone(zone_base)
+    cache = ResultCache(cache_root, cache_bytes) if cache_root else None
+    return ALGORITHMS[algorithm].function(zone, result_path(zone_base, algorithm), cache)
+
+
+# Изображение результата для мозаики зон: массив .npz и индекс по первой оси (None - массив двумерный)
+RESULT_IMAGES: Dict[str, Tuple[str, Optional[int]]] = {
+    'fft': ('phase', 0),                # Фаза на низшей частоте
+    'pca': ('images', 0),               # Первая главная компонента
+    'tsr': ('second_peak_time', None),  # Время пика второй производной
+    'lockin': ('phase', None),          # Фаза отклика на частоте модуляции
+}
+
+
+def result_image(path: str, algorithm: str) -> np.ndarray:
+    """Двумерное изображение из результата алгоритма (RESULT_IMAGES)"""
+    name, index = RESULT_IMAGES[algorithm]
+    with np.load(path) as data:
+        image = data[name]
+    return image if index is None else image[index]
+
+
+def zone_result_files(zone_base: str) -> List[str]:
+    """Файлы, которые обработка могла создать для зоны"""
+    return [differential_path(zone_base)] + [result_path(zone_base, algorithm) for algorithm in ALGORITHMS
+                                             if algorithm != 'bs']
+
+
+# ==================== SCHEDULER ====================
+class Job:
+    """Запуск одного алгоритма для одной зоны"""
+
+    def __init__(self, zone_base: str, algorithm: str):
+        self.zone_base = zone_base
+        self.algorithm = algorithm
+        self.future = None
+        self.cancelled = False
+
+    @property
+    def zone_name(self) -> str:
+        return os.path.basename(self.zone_base)
+
+
+class JobScheduler(QObject):
+    """
+    Очередь фоновой обработки зон в пуле процессов.
+
+    Пока оператор перемещает установку к следующей зоне, алгоритмы
+    (ALGORITHMS) обрабатывают только что записанные. Пулу одновременно
+    передаётся не больше workers задач, остальные ждут в очереди с
+    приоритетом: сначала последняя поставленная зона, внутри зоны - в
+    порядке ALGORITHMS. Задача не запускается, пока в очереди или в работе
+    есть задачи той же зоны, от которых она зависит (DEPENDENCIES); после
+    их завершения, в том числе с ошибкой, она запускается. cancel_zone() снимает задачи зоны из очереди, а
+    результаты уже запущенных отбрасывает (процесс пула не прерывается).
+    Сигналы испускаются в потоке, которому принадлежит планировщик.
+    """
+
+    progress_changed = Signal(dict)
+    job_finished = Signal(str, str, str)    # зона, алгоритм, файл результата
+    job_failed = Signal(str, str, str)      # зона, алгоритм, текст ошибки
+    _job_done = Signal(object)
+
+    def __init__(self, workers: int = 1, parent=None):
+        super().__init__(parent)
+        self.workers = max(1, workers)
+        # Кэш результатов (set_cache): папка и предельный размер
+        self.cache_root: Optional[str] = None
+        self.cache_bytes = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: List[Tuple[int, int, int, Job]] = []
+        self._running: List[Job] = []
+        self._zone_order = itertools.count()
+        self._counter = itertools.count()
+        self.done = 0
+        self.failed = 0
+        self.total = 0
+        self._job_done.connect(self._on_job_done)
+
+    def set_cache(self, root: Optional[str], max_bytes: int):
+        """Задаёт кэш результатов для следующих задач (None - без кэша)"""
+        self.cache_root = root
+        self.cache_bytes = max_bytes
+
+    def submit_zone(self, zone_base: str, algorithms: List[str]):
+        """Ставит в очередь алгоритмы для записанной зоны"""
+        if not self._queue and not self._running:
+            # Предыдущая партия обработана - счёт прогресса начинается заново
+            self.done = self.failed = self.total = 0
+        priority = -next(self._zone_order)
+        order = list(ALGORITHMS)
+        for algorithm in algorithms:
+            if algorithm not in ALGORITHMS:
+                logger.warning(f"Неизвестный алгоритм обработки: {algorithm}")
+                continue
+            job = Job(zone_base, algorithm)
+            heapq.heappush(self._queue, (priority, order.index(algorithm), next(self._counter), job))
+            self.total += 1
+        logger.info(f"Обработка зоны {os.path.basename(zone_base)} поставлена в очередь: {algorithms}")
+        self._dispatch()
+
+    def cancel_zone(self, zone_base: str):
+        """Отменяет обработку зоны (например, перед повторным контролем)"""
+        kept = [item for item in self._queue if item[3].zone_base != zone_base]
+        removed = len(self._queue) - len(kept)
+        self._queue = kept
+        heapq.heapify(self._queue)
+        self.total -= removed
+        for job in self._running:
+            if job.zone_base == zone_base and not job.cancelled:
+                job.cancelled = True
+                self.total -= 1
+                removed += 1
+        if removed:
+            logger.info(f"Обработка зоны {os.path.basename(zone_base)} отменена")
+        self._emit_progress()
+
+    def _blocked(self, job: Job, deferred: List[Tuple[int, int, int, Job]]) -> bool:
+        """Есть ли незавершённые задачи зоны, от которых зависит job"""
+        required = DEPENDENCIES.get(job.algorithm, ())
+        if not required:
+            return False
+        pending = self._running + [item[3] for item in self._queue] + [item[3] for item in deferred]
+        return any(other.zone_base == job.zone_base and other.algorithm in required and not other.cancelled
+                   for other in pending)
+
+    def _dispatch(self):
+        deferred = []
+        while self._queue and len(self._running) < self.workers:
+            item = heapq.heappop(self._queue)
+            job = item[3]
+            if self._blocked(job, deferred):
+                deferred.append(item)
+                continue
+            if self._executor is None:
+                # spawn: дочерний процесс не наследует потоки Qt и камер
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context('spawn'))
+            job.future = self._executor.submit(
+                run_algorithm, job.algorithm, job.zone_base, self.cache_root, self.cache_bytes
+            )
+            # Обратный вызов приходит из служебного потока пула - в поток
+            # планировщика результат передаётся сигналом
+            job.future.add_done_callback(lambda _, job=job: self._job_done.emit(job))
+            self._running.append(job)
+        for item in deferred:
+            heapq.heappush(self._queue, item)
+        self._emit_progress()
+
+    def _on_job_done(self, job: Job):
+        if job not in self._running:
+            return
+        self._running.remove(job)
+        error = job.future.exception()
+        if job.cancelled:
+            # Зона удалена или переснимается - результат больше не нужен
+            if error is None:
+                self._remove(job.future.result())
+        elif error is not None:
+            self.failed += 1
+            logger.error(f"Ошибка обработки {job.zone_name} ({job.algorithm}): {error}")
+            self.job_failed.emit(job.zone_base, job.algorithm, str(error))
+        else:
+            self.done += 1
+            logger.info(f"Обработка {job.zone_name} ({job.algorithm}) завершена: {job.future.result()}")
+            self.job_finished.emit(job.zone_base, job.algorithm, job.future.result())
+        self._dispatch()
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.error(f"Не удалось удалить {path}: {e}")
+
+    def is_idle(self) -> bool:
+        return not self._queue and not self._running
+
+    def stats(self) -> dict:
+        """Состояние очереди для строки состояния"""
+        return {
+            'total': self.total,
+            'done': self.done,
+            'failed': self.failed,
+            'queued': len(self._queue),
+            'running': [(job.zone_name, job.algorithm) for job in self._running if not job.cancelled],
+        }
+
+    def _emit_progress(self):
+        self.progress_changed.emit(self.stats())
+
+    def shutdown(self, wait: bool = False):
+        """Отменяет очередь и останавливает пул (вызывается при закрытии приложения)"""
+        self._queue.clear()
+        for job in self._running:
+            job.cancelled = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
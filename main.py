@@ -36,7 +36,7 @@ preview_settings = PreviewSettings.get_instance()
 if settings.mock_heater:
     heater = MockHeater(settings.heater_COM_port_number, settings.heater_baud_rate)
 else:
-    heater = Heater(settings.heater_COM_port_number, settings.heater_baud_rate)
+    heater = Heater(settings.heater_COM_port_number, settings.heater_baud_rate, timeout=settings.heater_timeout)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+"""
+Модуль сшивки зон контроля в мозаику
+"""
+
+import logging
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Соседние зоны сетки: (dx, dy) в координатах MainWindow.current_position
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class ZoneTile(NamedTuple):
+    """Зона в мозаике"""
+    image: np.ndarray           # (H, W) float32, обработанное изображение зоны (NaN заменены нулями)
+    weights: np.ndarray         # (H, W) float32, веса сглаживания шва (0 - нет значения)
+    frame: Optional[np.ndarray]  # (H, W) float32, яркость кадра видимой камеры для совмещения
+    origin: Tuple[int, int]     # (строка, столбец) левого верхнего угла в координатах мозаики
+    response: float             # Качество совмещения с соседями (0 - по номинальному шагу)
+
+
+class ZoneMosaic:
+    """
+    Инкрементальная мозаика обработанных изображений зон.
+
+    Зона ставится по координатам сетки (x вправо, y вверх) с номинальным
+    шагом tile * (1 - overlap), затем положение уточняется фазовой
+    корреляцией кадров видимой камеры в перекрытиях с уже поставленными
+    соседями: двигается только новая зона, соседи остаются на местах.
+
+    Швы сглаживаются весами, спадающими к краям зоны на ширине feather.
+    Мозаика хранится как накопленные сумма весов и взвешенная сумма, поэтому
+    добавление или замена зоны пересчитывает только её прямоугольник (в
+    нём же - перекрытия с соседями), а не всю мозаику.
+
+    Кадр видимой камеры должен быть совмещён с обработанным изображением
+    (одна оптическая ось) - он приводится к размеру изображения.
+    """
+
+    MIN_RESPONSE = 0.05     # Ниже - перекрытие без деталей, сдвиг не надёжен
+
+    def __init__(self, tile_shape: Tuple[int, int], overlap: float = 0.2,
+                 max_shift: float = 0.1, feather: Optional[int] = None):
+        """
+        Args:
+            tile_shape: (H, W) обработанного изображения зоны
+            overlap: номинальная доля перекрытия соседних зон
+            max_shift: наибольшая поправка совмещения, доля размера зоны
+            feather: ширина сглаживания шва, пикселей (по умолчанию - половина перекрытия)
+        """
+        self.tile_shape = tuple(tile_shape)
+        height, width = self.tile_shape
+        self.step = (int(round(height * (1 - overlap))), int(round(width * (1 - overlap))))
+        self.max_shift = (height * max_shift, width * max_shift)
+        if feather is None:
+            feather = max(1, int(min(height, width) * overlap / 2))
+        self.weights = self._feather_weights(self.tile_shape, feather)
+        self.zones: Dict[Tuple[int, int], ZoneTile] = {}
+
+        # Холст: (строка, столбец) его левого верхнего пикселя в координатах мозаики
+        self._offset = (0, 0)
+        self._weight_sum = np.zeros((0, 0), dtype=np.float32)
+        self._value_sum = np.zeros((0, 0), dtype=np.float32)
+        self._image = np.zeros((0, 0), dtype=np.float32)
+        self.pixels_updated = 0     # Пикселей холста, пересчитанных последним изменением
+        self.updated_rects = []     # Их области (строка, столбец, высота, ширина) в координатах мозаики
+
+    @staticmethod
+    def _feather_weights(shape: Tuple[int, int], feather: int) -> np.ndarray:
+        height, width = shape
+        rows = np.minimum(np.arange(height) + 1, height - np.arange(height))
+        columns = np.minimum(np.arange(width) + 1, width - np.arange(width))
+        distance = np.minimum(rows[:, None], columns[None, :]).astype(np.float32)
+        return np.minimum(distance / feather, 1.0)
+
+    # ---------- Совмещение ----------
+    def _nominal_origin(self, position: Tuple[int, int], neighbour: Tuple[int, int]) -> Tuple[int, int]:
+        """Номинальное положение зоны position относительно поставленного соседа"""
+        row, column = self.zones[neighbour].origin
+        dx, dy = position[0] - neighbour[0], position[1] - neighbour[1]
+        # Ось y сетки направлена вверх, строки мозаики - вниз
+        return row - dy * self.step[0], column + dx * self.step[1]
+
+    def _register(self, frame: np.ndarray, origin: Tuple[int, int],
+                  neighbour: ZoneTile) -> Tuple[Optional[Tuple[float, float]], float]:
+        """Поправка (строки, столбцы) положения зоны по перекрытию с соседом и качество совмещения"""
+        height, width = self.tile_shape
+        top = max(origin[0], neighbour.origin[0])
+        left = max(origin[1], neighbour.origin[1])
+        bottom = min(origin[0], neighbour.origin[0]) + height
+        right = min(origin[1], neighbour.origin[1]) + width
+        if bottom - top < 8 or right - left < 8:
+            return None, 0.0
+        ours = frame[top - origin[0]:bottom - origin[0], left - origin[1]:right - origin[1]]
+        theirs = neighbour.frame[top - neighbour.origin[0]:bottom - neighbour.origin[0],
+                                 left - neighbour.origin[1]:right - neighbour.origin[1]]
+        window = cv2.createHanningWindow((right - left, bottom - top), cv2.CV_32F)
+        (shift_x, shift_y), response = cv2.phaseCorrelate(theirs, ours, window)
+        # Содержимое нашего кадра сдвинуто на shift - сама зона сдвинута на -shift
+        correction = (-shift_y, -shift_x)
+        if response < self.MIN_RESPONSE or abs(correction[0]) > self.max_shift[0] \
+                or abs(correction[1]) > self.max_shift[1]:
+            return None, response
+        return correction, response
+
+    def _place(self, position: Tuple[int, int], frame: Optional[np.ndarray]) -> Tuple[Tuple[int, int], float]:
+        placed = [neighbour for neighbour in
+                  ((position[0] + dx, position[1] + dy) for dx, dy in NEIGHBOURS) if neighbour in self.zones]
+        if not placed:
+            if self.zones:
+                # Не граничит ни с одной зоной: ставится по шагу сетки от любой
+                anchor = next(iter(self.zones))
+                return self._nominal_origin(position, anchor), 0.0
+            return (-position[1] * self.step[0], position[0] * self.step[1]), 0.0
+
+        # Каждый сосед предлагает положение, итоговое - среднее, взвешенное качеством совмещения
+        proposals, weights = [], []
+        for neighbour in placed:
+            nominal = self._nominal_origin(position, neighbour)
+            correction, response = None, 0.0
+            tile = self.zones[neighbour]
+            if frame is not None and tile.frame is not None:
+                correction, response = self._register(frame, nominal, tile)
+            if correction is None:
+                proposals.append(nominal)
+                weights.append(1e-3)
+            else:
+                proposals.append((nominal[0] + correction[0], nominal[1] + correction[1]))
+                weights.append(response)
+        origin = np.average(np.array(proposals, dtype=np.float64), axis=0, weights=weights)
+        return (int(round(origin[0])), int(round(origin[1]))), float(max(weights))
+
+    # ---------- Холст ----------
+    def _ensure_canvas(self, origin: Tuple[int, int]):
+        """Расширяет холст так, чтобы поместилась зона с углом origin (с запасом в зону)"""
+        height, width = self.tile_shape
+        top, left = self._offset
+        bottom, right = top + self._weight_sum.shape[0], left + self._weight_sum.shape[1]
+        if self._weight_sum.size and top <= origin[0] and left <= origin[1] \
+                and origin[0] + height <= bottom and origin[1] + width <= right:
+            return
+        if not self._weight_sum.size:
+            top, left, bottom, right = origin[0], origin[1], origin[0] + height, origin[1] + width
+        # Запас в одну зону со стороны роста: соседняя зона не потребует нового холста
+        new_top = min(top, origin[0] - (height if origin[0] < top else 0))
+        new_left = min(left, origin[1] - (width if origin[1] < left else 0))
+        new_bottom = max(bottom, origin[0] + height + (height if origin[0] + height > bottom else 0))
+        new_right = max(right, origin[1] + width + (width if origin[1] + width > right else 0))
+        shape = (new_bottom - new_top, new_right - new_left)
+
+        canvases = []
+        for canvas, fill in ((self._weight_sum, 0.0), (self._value_sum, 0.0), (self._image, np.nan)):
+            grown = np.full(shape, fill, dtype=np.float32)
+            if canvas.size:
+                grown[top - new_top:top - new_top + canvas.shape[0],
+                      left - new_left:left - new_left + canvas.shape[1]] = canvas
+            canvases.append(grown)
+        self._weight_sum, self._value_sum, self._image = canvases
+        self._offset = (new_top, new_left)
+
+    def _accumulate(self, tile: ZoneTile, sign: float):
+        """Добавляет (sign = 1) или вычитает (-1) вклад зоны и обновляет её прямоугольник"""
+        height, width = self.tile_shape
+        rows = slice(tile.origin[0] - self._offset[0], tile.origin[0] - self._offset[0] + height)
+        columns = slice(tile.origin[1] - self._offset[1], tile.origin[1] - self._offset[1] + width)
+        self._weight_sum[rows, columns] += sign * tile.weights
+        self._value_sum[rows, columns] += sign * tile.weights * tile.image
+        weight = self._weight_sum[rows, columns]
+        # Остаток округления после вычитания зоны не должен давать деления на ~0
+        covered = weight > 1e-4
+        out = self._image[rows, columns]
+        out[:] = np.nan
+        np.divide(self._value_sum[rows, columns], weight, out=out, where=covered)
+        self.pixels_updated += height * width
+        self.updated_rects.append(tile.origin + self.tile_shape)
+
+    # ---------- Интерфейс ----------
+    def add_zone(self, position: Tuple[int, int], image: np.ndarray,
+                 frame: Optional[np.ndarray] = None) -> ZoneTile:
+        """
+        Добавляет зону (или заменяет переснятую) и возвращает её положение.
+
+        Args:
+            position: (x, y) зоны в сетке
+            image: обработанное изображение зоны, размер tile_shape (NaN - нет значения)
+            frame: кадр видимой камеры (BGR или яркость) для совмещения с соседями
+        """
+        position = tuple(position)
+        image = np.asarray(image, dtype=np.float32)
+        if image.shape != self.tile_shape:
+            raise ValueError(f"Размер изображения зоны {image.shape} вместо {self.tile_shape}")
+        # Пиксели без значения (NaN) не участвуют в смешивании
+        valid = np.isfinite(image)
+        weights = np.where(valid, self.weights, 0).astype(np.float32)
+        image = np.where(valid, image, 0).astype(np.float32)
+        if frame is not None:
+            if frame.ndim == 3:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2GRAY if frame.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+            frame = cv2.resize(frame, self.tile_shape[::-1], interpolation=cv2.INTER_AREA).astype(np.float32)
+
+        self.pixels_updated = 0
+        self.updated_rects = []
+        self._remove(position)
+        origin, response = self._place(position, frame)
+        tile = ZoneTile(image, weights, frame, origin, response)
+        self._ensure_canvas(origin)
+        self._accumulate(tile, 1.0)
+        self.zones[position] = tile
+        logger.debug(f"Зона {position} в мозаике: {origin}, совмещение {response:.2f}")
+        return tile
+
+    def _remove(self, position: Tuple[int, int]):
+        tile = self.zones.pop(tuple(position), None)
+        if tile is not None:
+            self._accumulate(tile, -1.0)
+
+    def remove_zone(self, position: Tuple[int, int]):
+        """Убирает зону из мозаики (холст не сжимается)"""
+        self.pixels_updated = 0
+        self.updated_rects = []
+        self._remove(position)
+
+    def image(self) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """Мозаика (NaN вне зон) и координаты её левого верхнего пикселя"""
+        return self._image, self._offset
+
+    def zone_rect(self, position: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        """(строка, столбец, высота, ширина) зоны в пикселях массива image()"""
+        tile = self.zones[tuple(position)]
+        return (tile.origin[0] - self._offset[0], tile.origin[1] - self._offset[1]) + self.tile_shape
@@ -0,0 +1,701 @@
+"""
+Модуль алгоритмов обработки термограмм
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from recording import NpySequenceWriter, ThermogramReader, ThermogramWriter
+
+logger = logging.getLogger(__name__)
+
+# Память на одну полосу кадров при обработке по умолчанию
+DEFAULT_MEMORY_BUDGET = 64 * 2 ** 20
+
+# Версия алгоритмов: увеличивается при любом изменении, меняющем результаты,
+# чтобы кэш (cache.ResultCache) не отдавал результаты прежней версии
+PROCESSING_VERSION = 1
+
+# Последовательность кадров: массив (T, H, W) или путь к файлу .tgs или .npy
+SequenceSource = Union[np.ndarray, str]
+
+
+# ==================== SEQUENCE ACCESS ====================
+def _file_layout(path: str) -> Tuple[int, Tuple[int, int, int], np.dtype]:
+    """Смещение первого кадра, форма (T, H, W) и тип отсчётов файла последовательности"""
+    if path.endswith(NpySequenceWriter.EXTENSION):
+        with open(path, 'rb') as f:
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if fortran_order or len(shape) != 3:
+                raise ValueError(f"{path}: ожидается массив (T, H, W) в порядке C")
+            return f.tell(), shape, dtype
+    with ThermogramReader(path) as reader:
+        return ThermogramWriter.HEADER_SIZE, reader.shape, np.dtype('<u2')
+
+
+def sequence_shape(source: SequenceSource) -> Tuple[int, int, int]:
+    """Возвращает форму (T, H, W) последовательности"""
+    if isinstance(source, str):
+        return _file_layout(source)[1]
+    return source.shape
+
+
+def read_band(source: SequenceSource, start: int, stop: int, y0: int, y1: int,
+              indices: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Читает строки y0:y1 кадров start:stop (или только кадров start + indices)
+    как float32 (T, строки, W).
+
+    Файл читается обычным чтением по кадру, а не через отображение: при
+    отображении ядро подключает к процессу страницы кэша крупными блоками,
+    и RSS от полосы к полосе дорастает до размера всей записи.
+    """
+    frames = np.arange(start, stop) if indices is None else start + np.asarray(indices)
+    if not isinstance(source, str):
+        if indices is None:
+            return np.array(source[start:stop, y0:y1], dtype=np.float32)
+        return np.array(source[frames, y0:y1], dtype=np.float32)
+
+    offset, (_, height, width), dtype = _file_layout(source)
+    band = np.empty((len(frames), y1 - y0, width), dtype=dtype)
+    row_bytes = width * band.itemsize
+    with open(source, 'rb') as f:
+        for i, index in enumerate(frames):
+            f.seek(offset + (index * height + y0) * row_bytes)
+            f.readinto(band[i])
+    return band.astype(np.float32, copy=False)
+
+
+def iter_bands(height: int, rows: int) -> Iterator[Tuple[int, int]]:
+    """Делит кадр на горизонтальные полосы по rows строк"""
+    for y0 in range(0, height, rows):
+        yield y0, min(height, y0 + rows)
+
+
+def band_rows(frames: int, width: int, bytes_per_sample: int, memory_budget: int) -> int:
+    """
+    Возвращает высоту полосы, при которой обработка помещается в
+    memory_budget. Полосы во всю ширину кадра: в файле строки кадра лежат
+    подряд, поэтому полоса читается T непрерывными кусками.
+    """
+    return max(1, memory_budget // max(1, frames * width * bytes_per_sample))
+
+
+def _run_tasks(function, tasks, workers: int):
+    """Выполняет задачи по полосам в текущем процессе или в пуле из workers процессов"""
+    if workers <= 0:
+        for task in tasks:
+            yield function(*task)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(function, *task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+# ==================== BACKGROUND SUBTRACTION ====================
+class StreamingBackground:
+    """
+    Фон для вычитания, накапливаемый по мере поступления кадров до нагрева.
+
+    median_frames = 0: среднее всех кадров, обновляемое на месте по
+    Уэлфорду (mean += (x - mean) / n) в буферах float32. Иначе медиана
+    последних median_frames кадров: кадры хранятся в кольце, медиана
+    считается один раз в freeze(). Медиана устойчивее к отдельным бликам,
+    но требует median_frames копий кадра.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], median_frames: int = 0):
+        self.shape = tuple(shape)
+        self.median_frames = median_frames
+        self.count = 0
+        self.frozen = False
+        self.image = np.zeros(self.shape, dtype=np.float32)
+        self._scratch = np.empty(self.shape, dtype=np.float32)
+        self._window: Optional[np.ndarray] = None
+
+    def add(self, frame: np.ndarray):
+        """Добавляет кадр до нагрева"""
+        if self.frozen:
+            raise RuntimeError("Фон уже зафиксирован")
+        frame = frame.reshape(self.shape)
+        if self.median_frames:
+            if self._window is None:
+                self._window = np.empty((self.median_frames,) + self.shape, dtype=frame.dtype)
+            np.copyto(self._window[self.count % self.median_frames], frame)
+            self.count += 1
+            return
+        self.count += 1
+        np.subtract(frame, self.image, out=self._scratch, dtype=np.float32)
+        self._scratch *= 1.0 / self.count
+        self.image += self._scratch
+
+    def freeze(self):
+        """Фиксирует фон: последующие кадры только вычитаются"""
+        if self.median_frames and self.count:
+            filled = min(self.count, self.median_frames)
+            np.median(self._window[:filled], axis=0, out=self._scratch)
+            self.image, self._scratch = self._scratch, self.image
+            self._window = None
+        self.frozen = True
+
+    def subtract(self, frame: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Разность кадра и фона в float32 (в out, если задан)"""
+        if out is None:
+            out = self._scratch
+        return np.subtract(frame.reshape(self.shape), self.image, out=out, dtype=np.float32)
+
+
+class DifferentialWriter:
+    """
+    Вычитание фона во время записи.
+
+    Кадры до начала нагрева (start_heating) копят фон, каждый следующий
+    сразу вычитается из него и дописывается в .npy float32. К концу записи
+    разностная последовательность готова к просмотру без второго прохода
+    по термограмме. Первый разностный кадр - первый кадр не раньше начала
+    нагрева (как у события 'heater_on' в sidecar-файле).
+    """
+
+    SUFFIX = '_diff'
+
+    def __init__(self, file_base: str, shape: Tuple[int, ...], median_frames: int = 0):
+        self.background = StreamingBackground(shape, median_frames)
+        self.writer = NpySequenceWriter(file_base + self.SUFFIX + NpySequenceWriter.EXTENSION, shape)
+        self.file_path = self.writer.file_path
+        self._heating_time: Optional[float] = None
+
+    def start_heating(self, event_time: float):
+        """Отмечает начало нагрева (может вызываться из другого потока)"""
+        self._heating_time = event_time
+
+    def write(self, frame: np.ndarray, frame_time: float) -> bool:
+        """Обрабатывает кадр; возвращает True, если в файл записан разностный кадр"""
+        background = self.background
+        if not background.frozen:
+            if self._heating_time is None or frame_time < self._heating_time:
+                background.add(frame)
+                return False
+            if background.count == 0:
+                # Кадров до нагрева нет (предзапись выключена): фоном служит первый кадр
+                logger.warning(f"Нет кадров до нагрева для фона {self.file_path}, используется первый кадр")
+                background.add(frame)
+            background.freeze()
+        self.writer.write(background.subtract(frame))
+        return True
+
+    def close(self):
+        self.writer.close()
+        logger.info(f"Записана разностная последовательность: {self.file_path} ({self.writer.frames_written} кадров)")
+
+
+# ==================== PULSED PHASE THERMOGRAPHY ====================
+class PhaseResult(NamedTuple):
+    """Амплитудные и фазовые изображения на выбранных частотах"""
+    bins: np.ndarray            # Номера частотных отсчётов ДПФ
+    frequencies: np.ndarray     # Гц (при fps=None - в долях частоты кадров)
+    amplitude: np.ndarray       # (F, H, W) float32, амплитуда гармоники
+    phase: np.ndarray           # (F, H, W) float32, рад
+
+
+# Для небольшого числа частот прямое ДПФ (умножение на матрицу базиса через
+# BLAS) быстрее полного БПФ, из которого нужна лишь малая часть отсчётов
+DFT_MAX_BINS = 32
+
+
+def _dft_basis(frames: int, bins: np.ndarray) -> np.ndarray:
+    """Матрица (2F, T) float32: косинусы и синусы выбранных частот"""
+    angle = 2 * np.pi * np.outer(bins, np.arange(frames)) / frames
+    return np.concatenate([np.cos(angle), -np.sin(angle)]).astype(np.float32)
+
+
+def _pulsed_phase_band(band: np.ndarray, bins: np.ndarray, method: str) -> Tuple[np.ndarray, np.ndarray]:
+    frames, rows, width = band.shape
+    pixels = band.reshape(frames, rows * width)
+    # Постоянная составляющая не влияет на ненулевые частоты, но её вычитание
+    # сохраняет точность float32 при сырых значениях ~10^4
+    pixels -= pixels.mean(axis=0)
+
+    if method == 'dft':
+        products = _dft_basis(frames, bins) @ pixels
+        count = len(bins)
+        spectrum = products[:count] + 1j * products[count:]
+    else:
+        spectrum = np.fft.rfft(np.ascontiguousarray(pixels.T), axis=-1)[:, bins].T
+
+    amplitude = (np.abs(spectrum) * (2.0 / frames)).astype(np.float32)
+    phase = np.angle(spectrum).astype(np.float32)
+    return amplitude.reshape(-1, rows, width), phase.reshape(-1, rows, width)
+
+
+def _pulsed_phase_task(source: SequenceSource, start: int, stop: int, y0: int, y1: int,
+                       bins: np.ndarray, method: str):
+    """Обработка одной полосы (выполняется и в дочерних процессах)"""
+    amplitude, phase = _pulsed_phase_band(read_band(source, start, stop, y0, y1), bins, method)
+    return y0, y1, amplitude, phase
+
+
+def pulsed_phase(source: SequenceSource, bins: Union[int, Sequence[int]] = 10, fps: Optional[float] = None,
+                 start: int = 0, stop: Optional[int] = None, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 workers: int = 0, method: str = 'auto') -> PhaseResult:
+    """
+    Импульсная фазовая термография: амплитуда и фаза ДПФ по времени для
+    каждого пикселя.
+
+    Последовательность обрабатывается горизонтальными полосами, так что
+    память ограничена memory_budget, а не размером записи.
+
+    Args:
+        source: массив (T, H, W) или путь к файлу .tgs
+        bins: число первых ненулевых частот или список номеров отсчётов ДПФ
+        fps: частота кадров, для перевода номеров отсчётов в Гц
+        start, stop: диапазон кадров (например, только охлаждение)
+        memory_budget: память на одну полосу, байт
+        workers: число процессов (0 - в текущем процессе). Для массива
+            полосы передаются процессам копией, для файла - читаются ими сами
+        method: 'fft', 'dft' или 'auto' (dft при числе частот до DFT_MAX_BINS)
+    """
+    total, height, width = sequence_shape(source)
+    stop = total if stop is None else min(stop, total)
+    frames = stop - start
+    if frames < 2:
+        raise ValueError("Для ДПФ нужно не меньше двух кадров")
+
+    bins = np.arange(1, bins + 1) if np.isscalar(bins) else np.asarray(bins)
+    bins = bins[(bins >= 1) & (bins <= frames // 2)]
+    if method == 'auto':
+        method = 'dft' if len(bins) <= DFT_MAX_BINS else 'fft'
+    if method not in ('fft', 'dft'):
+        raise ValueError(f"Неизвестный метод ДПФ: {method}")
+
+    # float32-полоса, её копия для БПФ и комплексный спектр (или базис ДПФ)
+    rows = band_rows(frames, width, 4 + 4 + 8, memory_budget)
+    amplitude = np.empty((len(bins), height, width), dtype=np.float32)
+    phase = np.empty_like(amplitude)
+
+    tasks = [(source, start, stop, y0, y1, bins, method) for y0, y1 in iter_bands(height, rows)]
+    for y0, y1, band_amplitude, band_phase in _run_tasks(_pulsed_phase_task, tasks, workers):
+        amplitude[:, y0:y1] = band_amplitude
+        phase[:, y0:y1] = band_phase
+
+    frequencies = bins / frames * (fps if fps else 1.0)
+    return PhaseResult(bins, frequencies, amplitude, phase)
+
+
+# ==================== PRINCIPAL COMPONENT THERMOGRAPHY ====================
+class PCTResult(NamedTuple):
+    """Ведущие эмпирические ортогональные функции последовательности"""
+    images: np.ndarray          # (K, H, W) float32, пространственные компоненты
+    temporal: np.ndarray        # (K, T) float32, временные профили компонент
+    singular_values: np.ndarray # (K,)
+    explained: np.ndarray       # (K,) доля дисперсии стандартизованных данных
+
+
+def _standardized_pixels(source: SequenceSource, start: int, stop: int, y0: int, y1: int) -> np.ndarray:
+    """Полоса в виде (T, пиксели): у каждого пикселя нулевое среднее и единичное СКО по времени"""
+    band = read_band(source, start, stop, y0, y1)
+    pixels = band.reshape(band.shape[0], -1)
+    pixels -= pixels.mean(axis=0)
+    std = np.sqrt(np.einsum('ij,ij->j', pixels, pixels) / pixels.shape[0])
+    std[std == 0] = 1.0     # Постоянные пиксели остаются нулевыми
+    pixels *= 1.0 / std
+    return pixels
+
+
+def _pct_task(source: SequenceSource, start: int, stop: int, y0: int, y1: int, operation: str, operand):
+    """
+    Одна полоса X_b (пиксели полосы x T) стандартизованной матрицы X:
+    'project' - X_b @ operand и сумма квадратов X_b,
+    'transpose' - X_b.T @ operand (operand - строки Q этой полосы),
+    'gram' - X_b.T @ X_b.
+    """
+    pixels = _standardized_pixels(source, start, stop, y0, y1)
+    if operation == 'project':
+        return y0, y1, pixels.T @ operand, float(np.einsum('ij,ij->', pixels, pixels))
+    if operation == 'transpose':
+        return y0, y1, pixels @ operand, 0.0
+    return y0, y1, pixels @ pixels.T, 0.0
+
+
+# До этой длины записи точное разложение через матрицу T x T не медленнее
+# рандомизированного: время обоих определяется проходами по записи
+GRAM_MAX_FRAMES = 1000
+
+
+def principal_components(source: SequenceSource, components: int = 5, start: int = 0,
+                         stop: Optional[int] = None, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                         workers: int = 0, method: str = 'auto', oversampling: int = 10,
+                         power_iterations: int = 1, seed: int = 0) -> PCTResult:
+    """
+    Термография главных компонент (PCT): последовательность переводится в
+    матрицу X (H*W, T), профиль каждого пикселя стандартизуется по времени,
+    изображениями компонент служат ведущие левые сингулярные векторы X.
+
+    Матрица целиком не строится: каждый проход читает запись полосами
+    (память ограничена memory_budget) и накапливает только произведения
+    X на узкие матрицы H*W x (K + oversampling) или матрицу T x T.
+
+    Args:
+        source: массив (T, H, W) или путь к файлу .tgs
+        components: число компонент K
+        start, stop: диапазон кадров
+        memory_budget: память на одну полосу, байт
+        workers: число процессов (0 - в текущем процессе)
+        method: 'randomized' - рандомизированное SVD (2 + 2 * power_iterations
+            прохода по записи, матрицы H*W x (K + oversampling));
+            'gram' - точное разложение через матрицу T x T (2 прохода,
+            O(H*W*T^2) операций); 'auto' - 'gram' при T до GRAM_MAX_FRAMES
+        oversampling: дополнительные столбцы случайной проекции
+        power_iterations: степенные итерации, уточняющие проекцию при
+            медленно убывающем спектре
+        seed: зерно случайной проекции
+    """
+    total, height, width = sequence_shape(source)
+    stop = total if stop is None else min(stop, total)
+    frames = stop - start
+    components = min(components, frames)
+    if components < 1:
+        raise ValueError("Нужна хотя бы одна компонента и один кадр")
+    if method == 'auto':
+        method = 'gram' if frames <= GRAM_MAX_FRAMES else 'randomized'
+    if method not in ('randomized', 'gram'):
+        raise ValueError(f"Неизвестный метод PCT: {method}")
+
+    # float32-полоса и её стандартизованная копия
+    rows = band_rows(frames, width, 4 + 4, memory_budget)
+    bands = list(iter_bands(height, rows))
+    pixels = height * width
+
+    def project(matrix: np.ndarray) -> Tuple[np.ndarray, float]:
+        """X @ matrix (H*W x столбцы) и квадрат нормы Фробениуса X"""
+        result = np.empty((pixels, matrix.shape[1]), dtype=np.float32)
+        tasks = [(source, start, stop, y0, y1, 'project', matrix) for y0, y1 in bands]
+        norm = 0.0
+        for y0, y1, product, sumsq in _run_tasks(_pct_task, tasks, workers):
+            result[y0 * width:y1 * width] = product
+            norm += sumsq
+        return result, norm
+
+    def transpose(matrix: np.ndarray) -> np.ndarray:
+        """X.T @ matrix (T x столбцы)"""
+        tasks = [(source, start, stop, y0, y1, 'transpose', matrix[y0 * width:y1 * width]) for y0, y1 in bands]
+        result = np.zeros((frames, matrix.shape[1]), dtype=np.float64)
+        for _, _, product, _ in _run_tasks(_pct_task, tasks, workers):
+            result += product
+        return result.astype(np.float32)
+
+    if method == 'gram':
+        gram = np.zeros((frames, frames), dtype=np.float64)
+        tasks = [(source, start, stop, y0, y1, 'gram', None) for y0, y1 in bands]
+        for _, _, product, _ in _run_tasks(_pct_task, tasks, workers):
+            gram += product
+        norm = float(np.trace(gram))
+        eigenvalues, eigenvectors = np.linalg.eigh(gram)
+        order = np.argsort(eigenvalues)[::-1][:components]
+        singular_values = np.sqrt(np.clip(eigenvalues[order], 0, None))
+        temporal = eigenvectors[:, order].astype(np.float32)
+        spatial, _ = project(temporal)
+        spatial /= np.where(singular_values > 0, singular_values, 1.0).astype(np.float32)
+    else:
+        width_sketch = min(frames, components + oversampling)
+        rng = np.random.default_rng(seed)
+        sketch, norm = project(rng.standard_normal((frames, width_sketch), dtype=np.float32))
+        basis, _ = np.linalg.qr(sketch)
+        for _ in range(power_iterations):
+            # Ортогонализация на каждом шаге сохраняет точность в float32
+            row_basis, _ = np.linalg.qr(transpose(basis))
+            basis, _ = np.linalg.qr(project(row_basis)[0])
+        # Малая матрица B = Q.T @ X (столбцы x T) и её точное SVD
+        small_u, singular_values, vt = np.linalg.svd(transpose(basis).T, full_matrices=False)
+        spatial = basis @ small_u[:, :components].astype(np.float32)
+        singular_values = singular_values[:components]
+        temporal = vt[:components].T.astype(np.float32)
+
+    # Знак компоненты произволен: делаем положительным наибольший по модулю отсчёт профиля
+    signs = np.sign(temporal[np.abs(temporal).argmax(axis=0), np.arange(temporal.shape[1])])
+    signs[signs == 0] = 1.0
+    spatial *= signs
+    temporal *= signs
+
+    return PCTResult(
+        images=np.ascontiguousarray(spatial.T).reshape(-1, height, width),
+        temporal=np.ascontiguousarray(temporal.T),
+        singular_values=np.asarray(singular_values, dtype=np.float64),
+        explained=np.asarray(singular_values, dtype=np.float64) ** 2 / norm if norm > 0 else np.zeros(components),
+    )
+
+
+# ==================== THERMOGRAPHIC SIGNAL RECONSTRUCTION ====================
+# Превышение над фоном не выше этого уровня (шум у фона) логарифмируется как он
+TSR_MIN_DELTA = 1e-3
+
+
+def log_polynomial_basis(log_times: np.ndarray, order: int, derivative: int = 0) -> np.ndarray:
+    """
+    Матрица Вандермонда (len(log_times), order + 1) по степеням x = ln t
+    (столбец j - x^j) или её производная порядка derivative по x.
+    """
+    x = np.asarray(log_times, dtype=np.float64)[:, None]
+    powers = np.arange(order + 1)
+    factor = np.ones(order + 1)
+    for k in range(derivative):
+        factor *= powers - k
+    return factor * x ** np.clip(powers - derivative, 0, None)
+
+
+class TSRResult(NamedTuple):
+    """Полиномы ln(ΔT) от ln(t) для каждого пикселя и производные"""
+    times: np.ndarray           # (T,) с от начала охлаждения для каждого кадра
+    coefficients: np.ndarray    # (order + 1, H, W) float32, при степенях ln t от нулевой
+    derivative_times: np.ndarray  # (K,) с, моменты изображений производных
+    first: np.ndarray           # (K, H, W) float32, d ln(ΔT) / d ln(t)
+    second: np.ndarray          # (K, H, W) float32, d² ln(ΔT) / d ln(t)²
+    second_peak_time: np.ndarray  # (H, W) float32, с, момент максимума второй производной (NaN - нет)
+
+    def reconstruct(self, times: Optional[np.ndarray] = None) -> np.ndarray:
+        """Восстановленные кадры ΔT (len(times), H, W) в моменты times (по умолчанию - кадров записи)"""
+        times = self.times if times is None else np.asarray(times, dtype=np.float64)
+        basis = log_polynomial_basis(np.log(times), len(self.coefficients) - 1).astype(np.float32)
+        order, height, width = self.coefficients.shape
+        log_delta = basis @ self.coefficients.reshape(order, -1)
+        return np.exp(log_delta, out=log_delta).reshape(-1, height, width)
+
+
+def _tsr_task(source: SequenceSource, start: int, stop: int, y0: int, y1: int, indices: np.ndarray,
+              background, fit: np.ndarray, derivatives: np.ndarray, peak_basis: np.ndarray):
+    """Подгонка полиномов для одной полосы (выполняется и в дочерних процессах)"""
+    band = read_band(source, start, stop, y0, y1, indices)
+    if background is not None:
+        band -= background
+    np.maximum(band, TSR_MIN_DELTA, out=band)
+    np.log(band, out=band)
+    frames, rows, width = band.shape
+    coefficients = fit @ band.reshape(frames, -1)
+
+    derivative_images = derivatives @ coefficients
+    # Полином расходится на краях интервала, поэтому ищется наибольший из
+    # внутренних локальных максимумов второй производной (-1 - его нет)
+    second = peak_basis @ coefficients
+    inner = second[1:-1]
+    inner = np.where((inner > second[:-2]) & (inner >= second[2:]), inner, -np.inf)
+    peak = inner.argmax(axis=0) + 1
+    peak[np.isneginf(inner.max(axis=0))] = -1
+    return y0, y1, coefficients.reshape(-1, rows, width), derivative_images.reshape(-1, rows, width), \
+        peak.reshape(rows, width)
+
+
+def thermographic_signal_reconstruction(source: SequenceSource, fps: float, start: int = 0,
+                                        stop: Optional[int] = None, order: int = 7, samples: int = 100,
+                                        background: Union[None, float, np.ndarray] = None,
+                                        derivative_times: Optional[Sequence[float]] = None,
+                                        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                                        workers: int = 0) -> TSRResult:
+    """
+    Реконструкция термографического сигнала (TSR): для каждого пикселя
+    ln(ΔT) фазы охлаждения приближается полиномом степени order от ln(t).
+
+    Полином подбирается по samples кадрам, равномерно распределённым по
+    ln(t): при всех кадрах подряд поздние моменты получили бы почти весь вес
+    и начало охлаждения (где видны неглубокие дефекты) приближалось бы
+    плохо. Моменты кадров у всех пикселей одинаковы, поэтому матрица
+    Вандермонда общая и её псевдообратная считается один раз: коэффициенты
+    всех пикселей полосы - одно матричное произведение
+    (order + 1, samples) @ (samples, пиксели).
+
+    Args:
+        source: массив (T, H, W) или путь к файлу .tgs/.npy; для разностной
+            последовательности (_diff.npy) кадры уже являются ΔT
+        fps: частота кадров; кадр start + i снят в момент t = (i + 1) / fps
+        start, stop: кадры охлаждения (start - первый кадр после выключения
+            нагрева, см. sync.event_frame)
+        order: степень полинома
+        samples: число кадров для подбора (не больше числа кадров охлаждения)
+        background: вычитаемый фон - число или изображение (H, W);
+            None, если source уже содержит ΔT
+        derivative_times: моменты (с) изображений производных; по умолчанию
+            10 моментов, равномерных по ln(t)
+        memory_budget: память на одну полосу, байт
+        workers: число процессов (0 - в текущем процессе)
+    """
+    total, height, width = sequence_shape(source)
+    stop = total if stop is None else min(stop, total)
+    frames = stop - start
+    if frames <= order:
+        raise ValueError(f"Для полинома степени {order} нужно больше {order} кадров охлаждения")
+
+    times = np.arange(1, frames + 1) / fps
+    indices = np.unique(np.geomspace(1, frames, min(samples, frames)).round().astype(np.int64)) - 1
+    if len(indices) <= order:
+        raise ValueError(f"Для полинома степени {order} нужно больше {order} кадров подбора")
+    log_times = np.log(times[indices])
+    fit = np.linalg.pinv(log_polynomial_basis(log_times, order)).astype(np.float32)
+    if derivative_times is None:
+        derivative_times = np.exp(np.linspace(log_times[0], log_times[-1], 10))
+    derivative_times = np.asarray(derivative_times, dtype=np.float64)
+    log_derivative_times = np.log(derivative_times)
+    derivatives = np.concatenate([
+        log_polynomial_basis(log_derivative_times, order, 1),
+        log_polynomial_basis(log_derivative_times, order, 2),
+    ]).astype(np.float32)
+    peak_basis = log_polynomial_basis(log_times, order, 2).astype(np.float32)
+
+    # float32-полоса и вторая производная в кадрах подбора для поиска максимума
+    rows = band_rows(len(indices), width, 4 + 4, memory_budget)
+    coefficients = np.empty((order + 1, height, width), dtype=np.float32)
+    derivative_images = np.empty((len(derivatives), height, width), dtype=np.float32)
+    peak_time = np.empty((height, width), dtype=np.float32)
+
+    background_is_image = isinstance(background, np.ndarray) and background.ndim == 2
+    tasks = [
+        (source, start, stop, y0, y1, indices, background[y0:y1] if background_is_image else background,
+         fit, derivatives, peak_basis)
+        for y0, y1 in iter_bands(height, rows)
+    ]
+    for y0, y1, band_coefficients, band_derivatives, band_peak in _run_tasks(_tsr_task, tasks, workers):
+        coefficients[:, y0:y1] = band_coefficients
+        derivative_images[:, y0:y1] = band_derivatives
+        peak_time[y0:y1] = np.where(band_peak >= 0, times[indices[band_peak]], np.nan)
+
+    count = len(derivative_times)
+    return TSRResult(times, coefficients, derivative_times, derivative_images[:count],
+                     derivative_images[count:], peak_time)
+
+
+# ==================== LOCK-IN THERMOGRAPHY ====================
+class LockInResult(NamedTuple):
+    """Квадратурные, амплитудное и фазовое изображения на частоте модуляции"""
+    frequency: float            # Гц
+    frames: int                 # Кадров в оценке
+    in_phase: np.ndarray        # (H, W) float32, составляющая в фазе с первой гармоникой нагрева
+    quadrature: np.ndarray      # (H, W) float32, составляющая в квадратуре
+    amplitude: np.ndarray       # (H, W) float32, амплитуда первой гармоники отклика
+    phase: np.ndarray           # (H, W) float32, рад, запаздывание отклика относительно нагрева
+
+
+class LockInDemodulator:
+    """
+    Lock-in демодуляция, обновляемая по мере поступления кадров.
+
+    Каждый пиксель приближается по методу наименьших квадратов суммой
+    c0 + c1 t + a cos(wt) + b sin(wt), где t - время кадра от начала
+    модуляции. Нормальные уравнения накапливаются по пачкам кадров: для
+    пачки - одно произведение базиса (4, T) на кадры (T, H*W) через BLAS и
+    матрица Грама базиса 4x4, так что оценку можно получить в любой момент
+    записи (result()), а не только после неё. В отличие от корреляции с
+    опорой на целом числе периодов, подгонка не требует ни целого числа
+    периодов, ни равномерных кадров (пропуски при записи допустимы), а
+    постоянная составляющая и линейный дрейф нагрева не просачиваются в
+    квадратуры. detrend=False убирает из базиса дрейф.
+
+    Фаза отсчитывается от первой гармоники мощности нагрева: по heating
+    (состояние нагревателя или заданная мощность в моменты кадров), иначе
+    - от косинуса.
+    """
+
+    def __init__(self, shape: Tuple[int, int], frequency: float, detrend: bool = True):
+        self.shape = tuple(shape)
+        self.frequency = frequency
+        self.detrend = detrend
+        self.frames = 0
+        size = 4 if detrend else 3
+        self._gram = np.zeros((size, size), dtype=np.float64)
+        self._projections = np.zeros((size, self.shape[0] * self.shape[1]), dtype=np.float64)
+        self._reference = np.zeros(size, dtype=np.float64)
+        self._baseline: Optional[np.ndarray] = None
+        self._buffer: Optional[np.ndarray] = None
+
+    def _basis(self, times: np.ndarray) -> np.ndarray:
+        """(4, T): 1, t в периодах модуляции, cos, sin"""
+        cycles = np.asarray(times, dtype=np.float64) * self.frequency
+        angle = 2 * np.pi * cycles
+        rows = [np.ones_like(cycles)] + ([cycles] if self.detrend else []) + [np.cos(angle), np.sin(angle)]
+        return np.array(rows)
+
+    def update(self, frames: np.ndarray, times: Sequence[float], heating: Optional[Sequence[float]] = None):
+        """
+        Добавляет кадры (T, H, W) или один кадр (H, W), снятые в моменты times
+        (с от начала модуляции); heating - мощность нагрева в эти моменты.
+        """
+        frames = np.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[None]
+        count = len(frames)
+        if count == 0:
+            return
+        pixels = frames.reshape(count, -1)
+        if self._baseline is None:
+            # Вычитание первого кадра сохраняет точность float32 при сырых значениях ~10^4
+            self._baseline = pixels[0].astype(np.float32)
+        if self._buffer is None or len(self._buffer) < count:
+            self._buffer = np.empty((count, pixels.shape[1]), dtype=np.float32)
+        buffer = self._buffer[:count]
+        np.subtract(pixels, self._baseline, out=buffer, dtype=np.float32)
+
+        basis = self._basis(times)
+        self._projections += basis.astype(np.float32) @ buffer
+        self._gram += basis @ basis.T
+        if heating is not None:
+            self._reference += basis @ np.asarray(heating, dtype=np.float64)
+        self.frames += count
+
+    def result(self) -> LockInResult:
+        """Текущая оценка; нужен хотя бы период модуляции (иначе квадратуры неразличимы)"""
+        if self.frames < len(self._gram):
+            raise ValueError("Недостаточно кадров для lock-in оценки")
+        inverse = np.linalg.pinv(self._gram)
+        cos_row, sin_row = inverse[-2:]
+        a = (cos_row @ self._projections).astype(np.float32)
+        b = (sin_row @ self._projections).astype(np.float32)
+
+        reference = 0.0
+        if self._reference.any():
+            # Отклик x = A cos(wt - phi): a = A cos(phi), b = A sin(phi), так же для мощности нагрева
+            reference = float(np.arctan2(sin_row @ self._reference, cos_row @ self._reference))
+        cos_ref, sin_ref = np.float32(np.cos(reference)), np.float32(np.sin(reference))
+        in_phase = a * cos_ref + b * sin_ref
+        quadrature = b * cos_ref - a * sin_ref
+        height, width = self.shape
+        return LockInResult(
+            self.frequency, self.frames,
+            in_phase.reshape(height, width), quadrature.reshape(height, width),
+            np.hypot(a, b).reshape(height, width), np.arctan2(quadrature, in_phase).reshape(height, width)
+        )
+
+
+def lock_in_chunk_frames(height: int, width: int, memory_budget: int = DEFAULT_MEMORY_BUDGET) -> int:
+    """Кадров в пачке обновления: исходная пачка и её копия float32 в memory_budget"""
+    return max(4, memory_budget // (height * width * (4 + 4)))
+
+
+def lock_in(source: SequenceSource, times: np.ndarray, frequency: float,
+            heating: Optional[np.ndarray] = None, start: int = 0, stop: Optional[int] = None,
+            detrend: bool = True, memory_budget: int = DEFAULT_MEMORY_BUDGET) -> LockInResult:
+    """
+    Lock-in термография записи с модулированным нагревом (LockInDemodulator
+    по пачкам целых кадров).
+
+    Args:
+        source: массив (T, H, W) или путь к файлу .tgs или .npy
+        times: (T,) с от начала модуляции для каждого кадра записи
+            (sync.modulation_timeline)
+        frequency: частота модуляции, Гц
+        heating: (T,) состояние нагревателя в моменты кадров - опора фазы
+        start, stop: диапазон кадров (обычно - время модуляции)
+        memory_budget: память на пачку кадров, байт
+    """
+    total, height, width = sequence_shape(source)
+    stop = total if stop is None else min(stop, total)
+    times = np.asarray(times, dtype=np.float64)
+    demodulator = LockInDemodulator((height, width), frequency, detrend)
+    chunk = lock_in_chunk_frames(height, width, memory_budget)
+    for first in range(start, stop, chunk):
+        last = min(stop, first + chunk)
+        frames = read_band(source, first, last, 0, height)
+        demodulator.update(frames, times[first:last], None if heating is None else heating[first:last])
+    return demodulator.result()
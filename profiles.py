@@ -0,0 +1,139 @@
+"""
+Модуль профилей нагрева: одиночный импульс, серия импульсов и синусоидальная модуляция
+"""
+
+import math
+from dataclasses import asdict, dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+# Профили нагрева: ключ -> название
+PROFILE_KINDS = {
+    'pulse': 'Одиночный импульс',
+    'pulse_train': 'Серия импульсов (прямоугольная модуляция)',
+    'sine': 'Синусоидальная модуляция (ШИМ)',
+}
+
+
+@dataclass
+class HeatingProfile:
+    """
+    Профиль нагрева в пределах heating_duration от включения.
+
+    Нагреватель только включается и выключается, поэтому профиль задаётся
+    интервалами включения. Серия импульсов - период 1 / frequency с долей
+    включения duty (duty = 0.5 - прямоугольная lock-in модуляция).
+    Синусоидальная мощность 0.5 * (1 - cos(2 pi frequency t)) получается
+    ШИМ с несущей carrier_frequency: в каждом периоде несущей импульс,
+    доля которого равна средней мощности на этом периоде, стоит по центру
+    периода, чтобы не сдвигать фазу модуляции.
+
+    Включений и пауз короче min_pulse нет (короткие импульсы отбрасываются
+    или удлиняются, паузы - сливаются): команда нагревателю идёт по COM-порту
+    десятки миллисекунд.
+    """
+    kind: str = 'pulse'
+    heating_duration: float = 3.0   # с, длительность нагрева (импульса или модуляции)
+    frequency: float = 0.2          # Гц, частота серии импульсов или модуляции
+    duty: float = 0.5               # Доля включения в периоде серии импульсов
+    carrier_frequency: float = 5.0  # Гц, несущая ШИМ синусоидальной модуляции
+    min_pulse: float = 0.05         # с, наименьшая длительность включения и паузы
+
+    def __post_init__(self):
+        if self.kind not in PROFILE_KINDS:
+            raise ValueError(f"Неизвестный профиль нагрева: {self.kind}")
+        if self.heating_duration <= 0 or self.frequency <= 0 or self.carrier_frequency <= 0:
+            raise ValueError("Длительность и частоты профиля нагрева должны быть положительными")
+        if not 0 < self.duty <= 1:
+            raise ValueError(f"Доля включения вне (0, 1]: {self.duty}")
+
+    @classmethod
+    def from_settings(cls, settings) -> 'HeatingProfile':
+        return cls(
+            kind=settings.heating_profile,
+            heating_duration=float(settings.heating_duration),
+            frequency=settings.modulation_frequency,
+            duty=settings.pulse_duty,
+            carrier_frequency=settings.pwm_frequency,
+        )
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    # ---------- Заданная мощность ----------
+    def power(self, t: np.ndarray) -> np.ndarray:
+        """Заданная мощность нагрева 0..1 в моменты t (с от начала нагрева)"""
+        t = np.asarray(t, dtype=np.float64)
+        inside = (t >= 0) & (t < self.heating_duration)
+        if self.kind == 'pulse':
+            power = np.ones_like(t)
+        elif self.kind == 'pulse_train':
+            power = (np.mod(t * self.frequency, 1.0) < self.duty).astype(np.float64)
+        else:
+            power = 0.5 * (1 - np.cos(2 * np.pi * self.frequency * t))
+        return np.where(inside, power, 0.0)
+
+    def _mean_sine_power(self, start: float, end: float) -> float:
+        """Средняя мощность 0.5 * (1 - cos(w t)) на [start, end]"""
+        omega = 2 * math.pi * self.frequency
+        mean_cos = (math.sin(omega * end) - math.sin(omega * start)) / (omega * (end - start))
+        return 0.5 * (1 - mean_cos)
+
+    # ---------- Интервалы включения ----------
+    def intervals(self) -> List[Tuple[float, float]]:
+        """Интервалы включения (начало, конец), с от начала нагрева"""
+        duration = self.heating_duration
+        if self.kind == 'pulse':
+            raw = [(0.0, duration)]
+        elif self.kind == 'pulse_train':
+            period = 1 / self.frequency
+            raw = [(index * period, min(index * period + self.duty * period, duration))
+                   for index in range(int(math.ceil(duration * self.frequency)))]
+        else:
+            return self._pwm_intervals()
+
+        merged: List[Tuple[float, float]] = []
+        for start, end in raw:
+            if end - start < self.min_pulse:
+                continue
+            if merged and start - merged[-1][1] < self.min_pulse:
+                merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    def _pwm_intervals(self) -> List[Tuple[float, float]]:
+        """
+        ШИМ синусоидальной мощности. Время включения в периоде несущей
+        округляется до ближайшего выполнимого: 0, от min_pulse до периода без
+        min_pulse, или весь период; импульсы с паузой короче min_pulse
+        сливаются. Округление симметрично относительно максимумов и минимумов
+        мощности, поэтому не сдвигает фазу первой гармоники (перенос ошибки
+        на следующий период сохранил бы среднюю мощность, но запаздывал бы).
+        """
+        duration = self.heating_duration
+        period = 1 / self.carrier_frequency
+        intervals: List[Tuple[float, float]] = []
+        for index in range(int(math.ceil(duration * self.carrier_frequency))):
+            start = index * period
+            end = min(start + period, duration)
+            length = end - start
+            width = self._mean_sine_power(start, end) * length
+            if width < self.min_pulse:
+                width = 0.0 if width < self.min_pulse / 2 else self.min_pulse
+            elif length - width < self.min_pulse:
+                width = length if length - width < self.min_pulse / 2 else length - self.min_pulse
+            if width <= 0:
+                continue
+            middle = (start + end) / 2
+            on, off = middle - width / 2, middle + width / 2
+            if intervals and on - intervals[-1][1] < self.min_pulse:
+                intervals[-1] = (intervals[-1][0], off)
+            else:
+                intervals.append((on, off))
+        return intervals
+
+    def edges(self) -> List[Tuple[float, bool]]:
+        """Фронты (время от начала нагрева, состояние нагревателя) по возрастанию времени"""
+        return [edge for start, end in self.intervals() for edge in ((start, True), (end, False))]
@@ -0,0 +1,318 @@
+"""
+Модуль многоуровневого тайлового хранения мозаики зон
+"""
+
+import json
+import logging
+import math
+import os
+import shutil
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Папка пирамиды мозаики внутри папки сохранения сессии
+PYRAMID_DIR = 'mosaic'
+
+TileKey = Tuple[int, int, int]     # (уровень, строка, столбец)
+Rect = Tuple[int, int, int, int]    # (строка, столбец, высота, ширина)
+
+
+def _tile_range(start: int, length: int, tile: int) -> range:
+    """Номера тайлов, которые пересекает отрезок [start, start + length)"""
+    return range(start // tile, (start + length - 1) // tile + 1)
+
+
+# ==================== PYRAMID ====================
+class TilePyramid:
+    """
+    Пирамида мозаики на диске: уровень 0 - полное разрешение, каждый
+    следующий уменьшен вдвое. Уровень разбит на тайлы tile_size x tile_size,
+    каждый тайл - отдельный .npy ({root}/{уровень}/{строка}_{столбец}.npy).
+
+    Тайлы адресуются абсолютными координатами мозаики (ZoneMosaic), поэтому
+    рост мозаики в любую сторону, в том числе в отрицательные координаты,
+    не перестраивает уже записанные тайлы. update() переписывает тайлы
+    уровня 0, которые пересекают изменённые области, и по цепочке только
+    зависящие от них тайлы верхних уровней. Тайлы без данных не хранятся.
+
+    Для вещественных данных NaN - нет значения: при уменьшении такие
+    пиксели не учитываются. Целочисленные (RGB uint8) уменьшаются простым
+    средним, отсутствие данных - 0.
+    """
+
+    META_FILE = 'pyramid.json'
+
+    def __init__(self, root: str, tile_size: int = 256, dtype=np.float32, channels: int = 0,
+                 reset: bool = False):
+        """
+        Args:
+            root: папка пирамиды
+            tile_size: сторона тайла (степень двойки)
+            dtype: тип пикселей
+            channels: число каналов (0 - одноканальное изображение)
+            reset: удалить существующую пирамиду в root
+        """
+        if tile_size <= 0 or tile_size & (tile_size - 1):
+            raise ValueError(f"Размер тайла должен быть степенью двойки: {tile_size}")
+        self.root = root
+        if reset and os.path.exists(os.path.join(root, self.META_FILE)):
+            shutil.rmtree(root)
+        meta = self.read_meta(root)
+        if meta is not None:
+            tile_size, dtype, channels = meta['tile_size'], meta['dtype'], meta['channels']
+        self.tile_size = tile_size
+        self.dtype = np.dtype(dtype)
+        self.channels = channels
+        self.levels = meta['levels'] if meta else 0
+        self.bounds: Optional[Rect] = tuple(meta['bounds']) if meta and meta['bounds'] else None
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def read_meta(cls, root: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(root, cls.META_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self):
+        path = os.path.join(self.root, self.META_FILE)
+        temporary = path + '.part'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({
+                'tile_size': self.tile_size,
+                'dtype': self.dtype.str,
+                'channels': self.channels,
+                'levels': self.levels,
+                'bounds': list(self.bounds) if self.bounds else None,
+            }, f)
+        os.replace(temporary, path)
+
+    # ---------- Тайлы ----------
+    @property
+    def tile_shape(self) -> Tuple[int, ...]:
+        shape = (self.tile_size, self.tile_size)
+        return shape + (self.channels,) if self.channels else shape
+
+    @property
+    def fill_value(self):
+        return np.nan if self.dtype.kind == 'f' else 0
+
+    def tile_path(self, key: TileKey) -> str:
+        level, row, column = key
+        return os.path.join(self.root, str(level), f"{row}_{column}.npy")
+
+    def read_tile(self, key: TileKey) -> Optional[np.ndarray]:
+        """Тайл или None, если в нём нет данных"""
+        try:
+            return np.load(self.tile_path(key))
+        except FileNotFoundError:
+            return None
+
+    def _empty_tile(self) -> np.ndarray:
+        return np.full(self.tile_shape, self.fill_value, dtype=self.dtype)
+
+    def _has_data(self, tile: np.ndarray) -> bool:
+        if self.dtype.kind == 'f':
+            return not np.isnan(tile).all()
+        return bool(tile.any())
+
+    def _write_tile(self, key: TileKey, tile: np.ndarray):
+        """Сохраняет тайл целиком или удаляет пустой: загрузчик не увидит недописанный файл"""
+        path = self.tile_path(key)
+        if not self._has_data(tile):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = path + '.part'
+        with open(temporary, 'wb') as f:
+            np.save(f, tile)
+        os.replace(temporary, path)
+
+    def _level_tiles(self, level: int) -> List[TileKey]:
+        """Все записанные тайлы уровня"""
+        directory = os.path.join(self.root, str(level))
+        if not os.path.isdir(directory):
+            return []
+        keys = []
+        for name in os.listdir(directory):
+            if name.endswith('.npy'):
+                row, column = name[:-len('.npy')].split('_')
+                keys.append((level, int(row), int(column)))
+        return keys
+
+    def _downsample(self, key: TileKey) -> np.ndarray:
+        """Тайл уровня key[0] из четырёх тайлов уровня ниже"""
+        level, row, column = key
+        size = self.tile_size
+        tile = self._empty_tile()
+        # Четыре дочерних тайла собираются в тайл двойного размера по частям
+        combined = np.full((2 * size, 2 * size) + self.tile_shape[2:], self.fill_value, dtype=np.float32)
+        for dy in range(2):
+            for dx in range(2):
+                child = self.read_tile((level - 1, 2 * row + dy, 2 * column + dx))
+                if child is not None:
+                    combined[dy * size:(dy + 1) * size, dx * size:(dx + 1) * size] = child
+        blocks = combined.reshape((size, 2, size, 2) + self.tile_shape[2:])
+        if self.dtype.kind == 'f':
+            valid = ~np.isnan(blocks)
+            total = np.where(valid, blocks, 0).sum(axis=(1, 3))
+            count = valid.sum(axis=(1, 3))
+            np.divide(total, count, out=tile, where=count > 0)
+        else:
+            tile[:] = np.rint(blocks.mean(axis=(1, 3)))
+        return tile
+
+    # ---------- Обновление ----------
+    def _required_levels(self) -> int:
+        """Уровней, пока вся мозаика не уместится в 2x2 тайла верхнего"""
+        _, _, height, width = self.bounds
+        return 1 + max(0, math.ceil(math.log2(max(height, width) / self.tile_size)))
+
+    def update(self, image: np.ndarray, offset: Tuple[int, int], rects: Iterable[Rect]) -> Set[TileKey]:
+        """
+        Переносит в пирамиду изменённые области мозаики.
+
+        Args:
+            image: изображение мозаики (ZoneMosaic.image())
+            offset: координаты мозаики левого верхнего пикселя image
+            rects: изменённые области (строка, столбец, высота, ширина) в координатах мозаики
+
+        Returns:
+            Переписанные тайлы всех уровней (для TileLoader.invalidate)
+        """
+        size = self.tile_size
+        image_rect = (offset[0], offset[1], image.shape[0], image.shape[1])
+        self.bounds = self._union(self.bounds, image_rect)
+
+        dirty: Set[TileKey] = set()
+        for top, left, height, width in rects:
+            for row in _tile_range(top, height, size):
+                for column in _tile_range(left, width, size):
+                    dirty.add((0, row, column))
+
+        written = set()
+        for _, row, column in dirty:
+            tile = self.read_tile((0, row, column))
+            if tile is None:
+                tile = self._empty_tile()
+            # Пересечение тайла с изображением мозаики
+            top, left = max(row * size, offset[0]), max(column * size, offset[1])
+            bottom = min((row + 1) * size, offset[0] + image.shape[0])
+            right = min((column + 1) * size, offset[1] + image.shape[1])
+            if bottom > top and right > left:
+                tile[top - row * size:bottom - row * size, left - column * size:right - column * size] = \
+                    image[top - offset[0]:bottom - offset[0], left - offset[1]:right - offset[1]]
+            self._write_tile((0, row, column), tile)
+            written.add((0, row, column))
+
+        levels = self._required_levels()
+        for level in range(1, levels):
+            dirty = {(level, row // 2, column // 2) for _, row, column in dirty}
+            if level >= self.levels:
+                # Новый верхний уровень строится из всего уровня ниже
+                dirty |= {(level, row // 2, column // 2) for _, row, column in self._level_tiles(level - 1)}
+            for key in dirty:
+                self._write_tile(key, self._downsample(key))
+            written |= dirty
+        self.levels = max(self.levels, levels)
+        self._write_meta()
+        return written
+
+    @staticmethod
+    def _union(a: Optional[Rect], b: Rect) -> Rect:
+        if a is None:
+            return b
+        top, left = min(a[0], b[0]), min(a[1], b[1])
+        bottom, right = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+        return top, left, bottom - top, right - left
+
+
+# ==================== LOADER ====================
+class TileLoader:
+    """
+    Загрузка тайлов пирамиды для просмотра с LRU-кэшем в памяти.
+
+    region() собирает видимую область уровня только из тайлов, которые её
+    пересекают; при панорамировании с диска читаются лишь новые тайлы.
+    Отсутствие тайла тоже кэшируется, чтобы пустые участки не проверялись
+    на диске при каждой перерисовке.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 64 * 2 ** 20):
+        self.pyramid = TilePyramid(root)
+        self.max_bytes = max_bytes
+        self._tiles: 'OrderedDict[TileKey, Optional[np.ndarray]]' = OrderedDict()
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def refresh(self):
+        """Перечитывает размеры пирамиды после обновления"""
+        meta = TilePyramid.read_meta(self.pyramid.root)
+        if meta is not None:
+            self.pyramid.levels = meta['levels']
+            self.pyramid.bounds = tuple(meta['bounds']) if meta['bounds'] else None
+
+    def tile(self, key: TileKey) -> Optional[np.ndarray]:
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return self._tiles[key]
+        self.misses += 1
+        tile = self.pyramid.read_tile(key)
+        self._tiles[key] = tile
+        self.cached_bytes += tile.nbytes if tile is not None else 0
+        while self.cached_bytes > self.max_bytes and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self.cached_bytes -= evicted.nbytes if evicted is not None else 0
+        return tile
+
+    def clear(self):
+        """Забывает все тайлы (пирамида перестроена)"""
+        self._tiles.clear()
+        self.cached_bytes = 0
+        self.refresh()
+
+    def invalidate(self, keys: Iterable[TileKey]):
+        """Забывает переписанные тайлы (TilePyramid.update)"""
+        for key in keys:
+            tile = self._tiles.pop(key, None)
+            self.cached_bytes -= tile.nbytes if tile is not None else 0
+        self.refresh()
+
+    def level_for_scale(self, scale: float) -> int:
+        """Уровень, разрешение которого не меньше масштаба отображения scale (экран/мозаика)"""
+        if scale <= 0 or self.pyramid.levels == 0:
+            return 0
+        return int(min(self.pyramid.levels - 1, max(0, math.floor(math.log2(1 / scale)))))
+
+    def region(self, level: int, top: int, left: int, height: int, width: int) -> np.ndarray:
+        """
+        Область уровня level (координаты мозаики, делённые на 2 ** level).
+        Пиксели вне тайлов - NaN (для целочисленных - 0).
+        """
+        pyramid = self.pyramid
+        size = pyramid.tile_size
+        out = np.full((height, width) + pyramid.tile_shape[2:], pyramid.fill_value, dtype=pyramid.dtype)
+        for row in _tile_range(top, height, size):
+            for column in _tile_range(left, width, size):
+                tile = self.tile((level, row, column))
+                if tile is None:
+                    continue
+                y0, x0 = max(row * size, top), max(column * size, left)
+                y1, x1 = min((row + 1) * size, top + height), min((column + 1) * size, left + width)
+                out[y0 - top:y1 - top, x0 - left:x1 - left] = \
+                    tile[y0 - row * size:y1 - row * size, x0 - column * size:x1 - column * size]
+        return out
+
+    def stats(self) -> dict:
+        return {'tiles': len(self._tiles), 'cached_mb': round(self.cached_bytes / 2 ** 20, 1),
+                'hits': self.hits, 'misses': self.misses}
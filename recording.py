@@ -0,0 +1,1088 @@
+"""
+Модуль записи данных с камер на диск
+"""
+
+import io
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple, Type
+
+import cv2
+import numpy as np
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+# Метаданные кадра Optris (EvoIRFrameMetadata) + время захвата на хосте
+FRAME_METADATA_DTYPE = np.dtype([
+    ('host_time', '<f8'),       # time.monotonic() в момент захвата, с
+    ('counter', '<u4'),
+    ('counterHW', '<u4'),
+    ('timestamp', '<i8'),
+    ('timestampMedia', '<i8'),
+    ('flagState', '<i4'),
+    ('tempChip', '<f4'),
+    ('tempFlag', '<f4'),
+    ('tempBox', '<f4'),
+])
+
+
+def copy_frame_metadata(records: np.ndarray, index: int, metadata):
+    """Копирует метаданные кадра (EvoIRFrameMetadata или запись FRAME_METADATA_DTYPE) в records[index]"""
+    if isinstance(metadata, np.void):
+        records[index] = metadata
+        return
+    record = records[index]
+    record['counter'] = metadata.counter
+    record['counterHW'] = metadata.counterHW
+    record['timestamp'] = metadata.timestamp
+    record['timestampMedia'] = metadata.timestampMedia
+    record['flagState'] = metadata.flagState
+    record['tempChip'] = metadata.tempChip
+    record['tempFlag'] = metadata.tempFlag
+    record['tempBox'] = metadata.tempBox
+
+
+def frame_metadata_record(metadata) -> Optional[np.void]:
+    """
+    Копия метаданных кадра в отдельной записи FRAME_METADATA_DTYPE: структуру
+    библиотеки камера перезаписывает следующим кадром, а запись можно
+    передать в поток записи.
+    """
+    if metadata is None:
+        return None
+    records = np.zeros(1, dtype=FRAME_METADATA_DTYPE)
+    copy_frame_metadata(records, 0, metadata)
+    return records[0]
+
+
+class RecordingError(Exception):
+    """Исключение при ошибках записи и чтения файлов записи"""
+    pass
+
+
+# ==================== RECORDER BACKENDS ====================
+RECORDER_BACKENDS: Dict[str, Type['RecorderBackend']] = {}
+
+
+def register_backend(cls):
+    """Регистрирует формат записи под именем cls.name"""
+    RECORDER_BACKENDS[cls.name] = cls
+    return cls
+
+
+def get_available_backends() -> List[Type['RecorderBackend']]:
+    """Возвращает форматы записи, доступные в текущем окружении"""
+    return [cls for cls in RECORDER_BACKENDS.values() if cls.is_available()]
+
+
+def create_backend(name: str, file_base: str, width: int, height: int, fps: float,
+                   channels: int = 3, dtype=np.uint8) -> 'RecorderBackend':
+    """
+    Создаёт запись в формате name. Путь к файлу - file_base + расширение формата.
+
+    Raises:
+        RecordingError: формат неизвестен, недоступен или не поддерживает тип кадров
+    """
+    cls = RECORDER_BACKENDS.get(name)
+    if cls is None:
+        raise RecordingError(f"Неизвестный формат записи: {name}")
+    if not cls.is_available():
+        raise RecordingError(f"Формат записи {cls.title} недоступен: не установлены зависимости")
+    if np.dtype(dtype) not in cls.dtypes:
+        raise RecordingError(f"Формат записи {cls.title} не поддерживает кадры {np.dtype(dtype)}")
+    return cls(file_base, width, height, fps, channels, dtype)
+
+
+class RecorderBackend(ABC):
+    """Базовый класс формата записи кадров"""
+
+    name = ''                           # Ключ в настройках
+    title = ''                          # Название для интерфейса
+    extension = ''
+    lossless = False
+    dtypes = (np.dtype(np.uint8),)      # Поддерживаемые типы элементов кадра
+
+    def __init__(self, file_base: str, width: int, height: int, fps: float,
+                 channels: int = 3, dtype=np.uint8):
+        self.path = file_base + self.extension
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.frames_written = 0
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    @abstractmethod
+    def write(self, frame: np.ndarray):
+        """Записывает кадр (вызывается из потока записи)"""
+        pass
+
+    @abstractmethod
+    def close(self):
+        """Завершает запись"""
+        pass
+
+
+class OpenCVVideoBackend(RecorderBackend):
+    """Видеофайл через cv2.VideoWriter"""
+
+    extension = '.avi'
+    fourcc = ''
+
+    def __init__(self, file_base: str, width: int, height: int, fps: float,
+                 channels: int = 3, dtype=np.uint8):
+        super().__init__(file_base, width, height, fps, channels, dtype)
+        self._writer = cv2.VideoWriter(
+            self.path, cv2.VideoWriter_fourcc(*self.fourcc), fps, (width, height),
+            isColor=channels == 3
+        )
+        if not self._writer.isOpened():
+            raise RecordingError(f"Не удалось открыть {self.path} для записи {self.title}")
+
+    def write(self, frame: np.ndarray):
+        self._writer.write(frame)
+        self.frames_written += 1
+
+    def close(self):
+        self._writer.release()
+
+
+@register_backend
+class XvidBackend(OpenCVVideoBackend):
+    name = 'xvid'
+    title = 'XVID (AVI, с потерями)'
+    fourcc = 'XVID'
+
+
+@register_backend
+class Ffv1Backend(OpenCVVideoBackend):
+    name = 'ffv1'
+    title = 'FFV1 (AVI, без потерь)'
+    fourcc = 'FFV1'
+    lossless = True
+
+    @classmethod
+    def is_available(cls) -> bool:
+        # FFV1 кодирует только FFmpeg-бэкенд OpenCV
+        return cv2.videoio_registry.hasBackend(cv2.CAP_FFMPEG)
+
+
+@register_backend
+class PngSequenceBackend(RecorderBackend):
+    """Последовательность PNG (8 или 16 бит) в отдельной папке"""
+
+    name = 'png'
+    title = 'PNG-последовательность (без потерь)'
+    extension = '_png'
+    lossless = True
+    dtypes = (np.dtype(np.uint8), np.dtype(np.uint16))
+
+    # Сжатие 1 из 9: на слабом CPU почти тот же размер файла при кратно меньшем времени
+    PNG_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+
+    def __init__(self, file_base: str, width: int, height: int, fps: float,
+                 channels: int = 3, dtype=np.uint8):
+        super().__init__(file_base, width, height, fps, channels, dtype)
+        os.makedirs(self.path, exist_ok=True)
+
+    def write(self, frame: np.ndarray):
+        file_path = os.path.join(self.path, f"{self.frames_written:06d}.png")
+        if not cv2.imwrite(file_path, frame, self.PNG_PARAMS):
+            raise RecordingError(f"Не удалось записать {file_path}")
+        self.frames_written += 1
+
+    def close(self):
+        pass
+
+
+class CompressedNpyBackend(RecorderBackend):
+    """
+    Блоки кадров в формате .npy, сжатые без потерь и записанные подряд в один
+    файл: заголовок (MAGIC, кодек), затем [длина блока uint64, сжатый блок]...
+    Блок - это .npy массива (кадров в блоке, высота, ширина[, каналы]),
+    читается функцией read_npy_chunks.
+    """
+
+    extension = '.npyc'
+    lossless = True
+    dtypes = (np.dtype(np.uint8), np.dtype(np.uint16))
+    codec = ''
+    MAGIC = b'TNDTNPYC'
+    HEADER = struct.Struct('<8s8s')     # magic, кодек
+    CHUNK_SIZE = struct.Struct('<Q')
+    CHUNK_FRAMES = 16
+
+    def __init__(self, file_base: str, width: int, height: int, fps: float,
+                 channels: int = 3, dtype=np.uint8):
+        super().__init__(file_base, width, height, fps, channels, dtype)
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        self._chunk = np.empty((self.CHUNK_FRAMES, *shape), dtype=self.dtype)
+        self._count = 0
+        self._file = open(self.path, 'wb')
+        self._file.write(self.HEADER.pack(self.MAGIC, self.codec.encode('ascii')))
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        pass
+
+    def write(self, frame: np.ndarray):
+        np.copyto(self._chunk[self._count], frame.reshape(self._chunk.shape[1:]))
+        self._count += 1
+        self.frames_written += 1
+        if self._count == self.CHUNK_FRAMES:
+            self._flush()
+
+    def _flush(self):
+        buffer = io.BytesIO()
+        np.lib.format.write_array(buffer, self._chunk[:self._count], allow_pickle=False)
+        data = self.compress(buffer.getbuffer())
+        self._file.write(self.CHUNK_SIZE.pack(len(data)))
+        self._file.write(data)
+        self._count = 0
+
+    def close(self):
+        if self._count:
+            self._flush()
+        self._file.close()
+
+
+@register_backend
+class ZstdNpyBackend(CompressedNpyBackend):
+    name = 'npy-zstd'
+    title = 'NPY + zstd (без потерь)'
+    codec = 'zstd'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Уровень 1 - компромисс между степенью сжатия и нагрузкой на Intel m3
+        self._compressor = zstandard.ZstdCompressor(level=1)
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return ZSTD_AVAILABLE
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+
+@register_backend
+class Lz4NpyBackend(CompressedNpyBackend):
+    name = 'npy-lz4'
+    title = 'NPY + lz4 (без потерь)'
+    codec = 'lz4'
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return LZ4_AVAILABLE
+
+    def compress(self, data: bytes) -> bytes:
+        return lz4.frame.compress(data)
+
+
+@register_backend
+class ZlibNpyBackend(CompressedNpyBackend):
+    """Резервный вариант без внешних зависимостей"""
+
+    name = 'npy-zlib'
+    title = 'NPY + zlib (без потерь)'
+    codec = 'zlib'
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, 1)
+
+
+def _npy_chunks_decompressor(f, file_path: str):
+    """Проверяет заголовок файла CompressedNpyBackend и возвращает функцию распаковки блока"""
+    decompressors = {
+        'zlib': zlib.decompress,
+        'zstd': lambda data: zstandard.ZstdDecompressor().decompress(data),
+        'lz4': lambda data: lz4.frame.decompress(data),
+    }
+    magic, codec = CompressedNpyBackend.HEADER.unpack(f.read(CompressedNpyBackend.HEADER.size))
+    if magic != CompressedNpyBackend.MAGIC:
+        raise RecordingError(f"Файл {file_path} не является записью NPY")
+    return decompressors[codec.rstrip(b'\x00').decode('ascii')]
+
+
+def read_npy_chunks(file_path: str) -> Iterator[np.ndarray]:
+    """Читает файл CompressedNpyBackend, возвращая блоки кадров по очереди"""
+    with open(file_path, 'rb') as f:
+        decompress = _npy_chunks_decompressor(f, file_path)
+        while True:
+            size_bytes = f.read(CompressedNpyBackend.CHUNK_SIZE.size)
+            if len(size_bytes) < CompressedNpyBackend.CHUNK_SIZE.size:
+                break
+            (size,) = CompressedNpyBackend.CHUNK_SIZE.unpack(size_bytes)
+            data = f.read(size)
+            if len(data) < size:
+                logger.warning(f"Незавершённый блок в {file_path}")
+                break
+            yield np.lib.format.read_array(io.BytesIO(decompress(data)), allow_pickle=False)
+
+
+# ==================== ASYNC WRITER ====================
+# Политики поведения при переполнении очереди записи
+BACKPRESSURE_BLOCK = 'block'                # ждать освобождения места (тормозит захват)
+BACKPRESSURE_DROP_OLDEST = 'drop_oldest'    # выбросить самый старый кадр из очереди
+BACKPRESSURE_DROP_NEWEST = 'drop_newest'    # не ставить новый кадр в очередь
+BACKPRESSURE_POLICIES = (BACKPRESSURE_BLOCK, BACKPRESSURE_DROP_OLDEST, BACKPRESSURE_DROP_NEWEST)
+
+
+class AsyncFrameWriter:
+    """
+    Фоновый поток записи кадров с ограниченной очередью.
+
+    Кадр копируется в один из max_queue предвыделенных слотов и ставится в
+    очередь, кодирование и запись (write_fn) выполняются в отдельном потоке.
+    Поток захвата тратит на кадр одно копирование вместо кодирования XVID.
+    При переполнении очереди действует политика policy, выброшенные кадры
+    учитываются в счётчике dropped. prologue, если задан, вызывается в
+    потоке записи до первого кадра очереди (например, дозапись кадров
+    предзаписи, не задерживая поток захвата).
+    """
+
+    def __init__(self, write_fn, close_fn=None, max_queue: int = 32,
+                 policy: str = BACKPRESSURE_DROP_OLDEST, name: str = 'writer', prologue=None):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Неизвестная политика очереди записи: {policy}")
+        if max_queue < 1:
+            raise ValueError("Размер очереди записи должен быть не меньше 1")
+        self.name = name
+        self.policy = policy
+        self.max_queue = max_queue
+        self._write_fn = write_fn
+        self._close_fn = close_fn
+        self._prologue = prologue
+
+        self._slots: Optional[np.ndarray] = None
+        self._free = list(range(max_queue))
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._error: Optional[Exception] = None
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.max_backlog = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"AsyncFrameWriter({name})", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame: np.ndarray, *args) -> bool:
+        """
+        Ставит копию кадра в очередь записи. Дополнительные аргументы
+        передаются в write_fn как есть. Возвращает False, если кадр выброшен.
+        """
+        if self._error is not None:
+            raise RecordingError(f"Ошибка записи {self.name}: {self._error}")
+
+        with self._cond:
+            if self._closing:
+                raise RecordingError(f"Запись {self.name} уже остановлена")
+            self.submitted += 1
+            if self._slots is None or self._slots.shape[1:] != frame.shape or self._slots.dtype != frame.dtype:
+                self._reallocate(frame)
+            while not self._free:
+                if self.policy == BACKPRESSURE_DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.policy == BACKPRESSURE_DROP_OLDEST and self._queue:
+                    index, _ = self._queue.popleft()
+                    self._free.append(index)
+                    self.dropped += 1
+                else:
+                    self._cond.wait()
+            index = self._free.pop()
+
+        # Слот принадлежит производителю, пока не поставлен в очередь
+        np.copyto(self._slots[index], frame)
+
+        with self._cond:
+            self._queue.append((index, args))
+            self.max_backlog = max(self.max_backlog, len(self._queue))
+            self._cond.notify_all()
+        return True
+
+    def _reallocate(self, frame: np.ndarray):
+        # Смена формата кадра посреди записи: дожидаемся записи очереди
+        while len(self._free) != self.max_queue:
+            self._cond.wait()
+        self._slots = np.empty((self.max_queue, *frame.shape), dtype=frame.dtype)
+
+    def _run(self):
+        if self._prologue is not None:
+            try:
+                self._prologue()
+            except Exception as e:
+                logger.error(f"Ошибка записи {self.name}: {e}")
+                self._error = e
+            self._prologue = None
+
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    self._cond.wait()
+                if not self._queue:
+                    break
+                index, args = self._queue.popleft()
+
+            try:
+                if self._error is None:
+                    self._write_fn(self._slots[index], *args)
+            except Exception as e:
+                logger.error(f"Ошибка записи {self.name}: {e}")
+                self._error = e
+
+            with self._cond:
+                self._free.append(index)
+                if self._error is None:
+                    self.written += 1
+                self._cond.notify_all()
+
+    def close(self):
+        """Дописывает очередь, останавливает поток и закрывает файл"""
+        with self._cond:
+            if self._closing:
+                return
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self._close_fn is not None:
+            self._close_fn()
+        logger.info(
+            f"Запись {self.name} завершена: записано {self.written}, пропущено {self.dropped}"
+        )
+
+    def stats(self) -> dict:
+        """Возвращает счётчики очереди записи"""
+        with self._cond:
+            return {
+                'queued': len(self._queue),
+                'written': self.written,
+                'dropped': self.dropped,
+                'max_backlog': self.max_backlog,
+            }
+
+
+# ==================== DECIMATION ====================
+class FrameDecimator:
+    """
+    Прореживание потока кадров до частоты записи по времени захвата.
+
+    Кадр пропускается к записи, когда его метка времени достигает очередного
+    узла сетки с шагом 1/record_fps. Узлы отсчитываются от первого кадра
+    (или от общего для всех камер origin, чтобы их видео содержали кадры
+    одних и тех же моментов), а не от предыдущего пропущенного, поэтому
+    джиттер захвата не накапливается и частота файла совпадает с заявленной.
+    В режиме усреднения вместо выбранного кадра выдаётся среднее всех кадров
+    интервала, что снижает шум без потери частоты записи. Буферы усреднения
+    выделяются один раз.
+    """
+
+    def __init__(self, record_fps: float, average: bool = False, origin: Optional[float] = None):
+        if record_fps <= 0:
+            raise ValueError("Частота записи должна быть положительной")
+        self.interval = 1.0 / record_fps
+        self.average = average
+        self.origin = origin
+        self.frames_in = 0
+        self.frames_out = 0
+        self._next_due: Optional[float] = None
+        self._last_timestamp: Optional[float] = None
+        self._sum: Optional[np.ndarray] = None
+        self._mean: Optional[np.ndarray] = None
+        self._count = 0
+
+    def reset(self):
+        """Начинает новую сетку (например, при начале новой записи)"""
+        self._next_due = None
+        self._last_timestamp = None
+        self._count = 0
+
+    def push(self, frame: np.ndarray, timestamp: float) -> Optional[np.ndarray]:
+        """
+        Принимает кадр и возвращает кадр для записи или None.
+
+        Возвращённый в режиме усреднения массив переиспользуется: его нужно
+        записать до следующего вызова push().
+        """
+        self.frames_in += 1
+        if self.average:
+            self._accumulate(frame)
+
+        if self._next_due is None:
+            self._next_due = self._first_node(timestamp)
+        # Допуск в полкадра захвата, чтобы кадр, пришедший чуть раньше узла,
+        # не откладывал запись на целый интервал захвата
+        tolerance = 0.0
+        if self._last_timestamp is not None:
+            tolerance = 0.5 * max(0.0, timestamp - self._last_timestamp)
+        self._last_timestamp = timestamp
+
+        if timestamp + tolerance < self._next_due:
+            return None
+
+        self._next_due += self.interval
+        if timestamp - self._next_due >= self.interval:
+            # После длительного разрыва потока начинаем сетку заново
+            self._next_due = self._first_node(timestamp) + self.interval
+        self.frames_out += 1
+
+        if not self.average:
+            return frame
+        return self._take_mean()
+
+    def _first_node(self, timestamp: float) -> float:
+        if self.origin is None:
+            return timestamp
+        # Ближайший узел общей сетки, не раньше первого кадра больше чем на полинтервала
+        return self.origin + max(0, round((timestamp - self.origin) / self.interval)) * self.interval
+
+    def _accumulate(self, frame: np.ndarray):
+        if self._sum is None or self._sum.shape != frame.shape:
+            self._sum = np.zeros(frame.shape, dtype=np.float32)
+            self._mean = np.empty(frame.shape, dtype=frame.dtype)
+            self._count = 0
+        if self._count == 0:
+            np.copyto(self._sum, frame, casting='unsafe')
+        else:
+            np.add(self._sum, frame, out=self._sum, casting='unsafe')
+        self._count += 1
+
+    def _take_mean(self) -> np.ndarray:
+        # + 0.5 - округление к ближайшему при приведении к целому типу
+        np.multiply(self._sum, 1.0 / self._count, out=self._sum)
+        if np.issubdtype(self._mean.dtype, np.integer):
+            np.add(self._sum, 0.5, out=self._sum)
+        np.copyto(self._mean, self._sum, casting='unsafe')
+        self._count = 0
+        return self._mean
+
+
+# ==================== PRE-TRIGGER ====================
+class PreTriggerBuffer:
+    """
+    Кольцо последних кадров, снятых до начала записи (предзапись).
+
+    Пока запись не идёт, поток захвата копирует кадры в предвыделенные
+    слоты; при старте записи drain() отдаёт кадры за последние seconds
+    секунд, и они записываются в начало файла - так запись содержит
+    холодное состояние объекта до включения нагрева. Ёмкость ограничена и
+    временем, и бюджетом памяти: при нехватке памяти хранится меньше секунд.
+    """
+
+    def __init__(self, seconds: float, fps: float, shape, dtype=np.uint8,
+                 memory_budget: int = 256 * 2 ** 20, with_metadata: bool = False):
+        self.seconds = seconds
+        frame_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        self.capacity = max(0, min(int(np.ceil(seconds * fps)), memory_budget // frame_bytes))
+        self._frames = np.empty((self.capacity, *shape), dtype=dtype)
+        self._times = np.zeros((self.capacity, 2), dtype=np.float64)   # время хоста, синхронизированное
+        self._metadata = np.zeros(self.capacity, dtype=FRAME_METADATA_DTYPE) if with_metadata else None
+        self._next = 0
+        self._count = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Память, занятая кадрами буфера"""
+        return self._frames.nbytes
+
+    def __len__(self) -> int:
+        return self._count
+
+    def push(self, frame: np.ndarray, host_time: float, sync_time: float, metadata=None):
+        """Копирует кадр в буфер, вытесняя самый старый"""
+        if self.capacity == 0:
+            return
+        index = self._next
+        self._frames[index].reshape(-1)[:] = frame.reshape(-1)
+        self._times[index] = (host_time, sync_time)
+        if self._metadata is not None and metadata is not None:
+            copy_frame_metadata(self._metadata, index, metadata)
+        self._next = (index + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def drain(self, now: Optional[float] = None) -> Iterator[Tuple[np.ndarray, float, float, Optional[np.void]]]:
+        """
+        Отдаёт кадры не старше seconds от now (по умолчанию - время хоста
+        последнего кадра) от старых к новым и очищает буфер:
+        (кадр, время хоста, синхронизированное время, метаданные или None).
+        """
+        count, self._count = self._count, 0
+        if count == 0:
+            return
+        start = (self._next - count) % self.capacity
+        indices = [(start + i) % self.capacity for i in range(count)]
+        if now is None:
+            now = self._times[indices[-1], 0]
+        for index in indices:
+            host_time, sync_time = self._times[index]
+            if now - host_time > self.seconds:
+                continue
+            metadata = self._metadata[index] if self._metadata is not None else None
+            yield self._frames[index], float(host_time), float(sync_time), metadata
+
+
+# ==================== THERMOGRAM SEQUENCE ====================
+class ThermogramWriter:
+    """
+    Запись последовательности сырых радиометрических кадров (uint16) зоны
+    контроля в файл термограммы (.tgs), читаемый через np.memmap.
+
+    Структура файла:
+        заголовок (64 байта) | MAGIC, версия, ширина, высота, FPS,
+                             | число кадров, смещение таблицы метаданных
+        кадры                | frame_count x height x width uint16, шаг фиксирован
+        таблица метаданных   | frame_count x FRAME_METADATA_DTYPE
+
+    Файл пишется только дозаписью: кадры копируются в предвыделенный буфер
+    блока, заполненный блок сбрасывается на диск отдельным потоком, пока
+    захват пишет во второй буфер. Так поток захвата не ждёт диск, а на диск
+    уходит одна крупная запись в секунду вместо 32 мелких. Таблица
+    метаданных и итоговый заголовок пишутся в close(); если запись оборвалась,
+    ThermogramReader восстанавливает число кадров по размеру файла.
+    """
+
+    MAGIC = b'TNDTTGS\x00'
+    VERSION = 1
+    EXTENSION = '.tgs'
+    HEADER = struct.Struct('<8sHHIIfQQ')    # magic, version, reserved, width, height, fps, frames, meta offset
+    HEADER_SIZE = 64                        # заголовок дополнен нулями для выравнивания кадров
+
+    def __init__(self, file_path: str, width: int, height: int, fps: float = 0.0,
+                 chunk_frames: int = 32):
+        self.file_path = file_path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.chunk_frames = chunk_frames
+        self.frames_written = 0
+
+        # Два буфера блока: один заполняется захватом, другой пишется на диск
+        self._buffers = [
+            (np.empty((chunk_frames, height, width), dtype=np.uint16),
+             np.zeros(chunk_frames, dtype=FRAME_METADATA_DTYPE))
+            for _ in range(2)
+        ]
+        self._active = 0
+        self._count = 0
+        self._metadata_parts = []
+
+        self._file = open(file_path, 'wb')
+        self._write_header(frame_count=0, metadata_offset=0)
+
+        self._flush_queue = queue.Queue()
+        self._free_buffers = queue.Queue()
+        self._free_buffers.put(1)
+        self._flush_error: Optional[Exception] = None
+        self._flush_thread = threading.Thread(
+            target=self._flush_loop, name=f"ThermogramWriter({os.path.basename(file_path)})",
+            daemon=True
+        )
+        self._flush_thread.start()
+
+    def _write_header(self, frame_count: int, metadata_offset: int):
+        header = self.HEADER.pack(
+            self.MAGIC, self.VERSION, 0, self.width, self.height, self.fps,
+            frame_count, metadata_offset
+        )
+        self._file.write(header.ljust(self.HEADER_SIZE, b'\x00'))
+
+    def write(self, thermal: np.ndarray, metadata=None, host_time: Optional[float] = None):
+        """
+        Добавляет кадр в текущий блок.
+
+        thermal - массив uint16 размером height*width (любой формы),
+        metadata - структура EvoIRFrameMetadata, запись FRAME_METADATA_DTYPE
+        или None.
+        """
+        if self._flush_error is not None:
+            raise RecordingError(f"Ошибка записи {self.file_path}: {self._flush_error}")
+
+        frames, meta = self._buffers[self._active]
+        i = self._count
+        frames[i].reshape(-1)[:] = thermal.reshape(-1)
+        record = meta[i]
+        if metadata is not None:
+            copy_frame_metadata(meta, i, metadata)
+        record['host_time'] = time.monotonic() if host_time is None else host_time
+
+        self._count += 1
+        self.frames_written += 1
+        if self._count == self.chunk_frames:
+            self._submit_chunk()
+
+    def _submit_chunk(self):
+        self._flush_queue.put((self._active, self._count))
+        # Блокируется, только если диск не успел записать предыдущий блок
+        self._active = self._free_buffers.get()
+        self._count = 0
+
+    def _flush_loop(self):
+        while True:
+            item = self._flush_queue.get()
+            if item is None:
+                break
+            index, count = item
+            frames, meta = self._buffers[index]
+            try:
+                self._file.write(frames[:count].data)
+                self._metadata_parts.append(meta[:count].copy())
+            except Exception as e:
+                logger.error(f"Ошибка записи термограммы {self.file_path}: {e}")
+                self._flush_error = e
+            self._free_buffers.put(index)
+
+    def stats(self) -> dict:
+        """Возвращает счётчики записи (кадры не выбрасываются: при отставании диска write() ждёт)"""
+        return {
+            'queued': self._count + self._flush_queue.qsize() * self.chunk_frames,
+            'written': self.frames_written,
+            'dropped': 0,
+        }
+
+    def close(self):
+        """Дописывает неполный блок, таблицу метаданных и итоговый заголовок"""
+        if self._file is None:
+            return
+        if self._count:
+            self._submit_chunk()
+        self._flush_queue.put(None)
+        self._flush_thread.join()
+
+        frame_count = sum(len(part) for part in self._metadata_parts)
+        metadata_offset = self.HEADER_SIZE + frame_count * self.width * self.height * 2
+        try:
+            self._file.seek(metadata_offset)
+            for part in self._metadata_parts:
+                self._file.write(part.data)
+            self._file.seek(0)
+            self._write_header(frame_count, metadata_offset)
+        finally:
+            self._file.close()
+            self._file = None
+        logger.info(f"Запись термограммы завершена: {self.file_path} ({frame_count} кадров)")
+
+
+class ThermogramReader:
+    """
+    Чтение файла термограммы (.tgs) через np.memmap.
+
+    frames - массив (кадры, высота, ширина) uint16, отображённый на файл:
+    срезы по кадрам, областям и временной ряд пикселя не копируют данные
+    и не читают с диска ничего, кроме затронутых страниц.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        header_size = ThermogramWriter.HEADER.size
+        with open(file_path, 'rb') as f:
+            header = f.read(header_size)
+        if len(header) < header_size:
+            raise RecordingError(f"Файл {file_path} повреждён: нет заголовка")
+        (magic, version, _, self.width, self.height, self.fps,
+         frame_count, metadata_offset) = ThermogramWriter.HEADER.unpack(header)
+        if magic != ThermogramWriter.MAGIC:
+            raise RecordingError(f"Файл {file_path} не является термограммой")
+        if version != ThermogramWriter.VERSION:
+            raise RecordingError(f"Неподдерживаемая версия термограммы: {version}")
+
+        frame_bytes = self.width * self.height * 2
+        if metadata_offset:
+            self.metadata = np.fromfile(
+                file_path, dtype=FRAME_METADATA_DTYPE, count=frame_count, offset=metadata_offset
+            )
+        else:
+            # Запись не была завершена: таблицы метаданных нет
+            data_size = os.path.getsize(file_path) - ThermogramWriter.HEADER_SIZE
+            frame_count = max(0, data_size) // frame_bytes
+            self.metadata = np.zeros(frame_count, dtype=FRAME_METADATA_DTYPE)
+            logger.warning(f"Термограмма {file_path} не завершена, восстановлено кадров: {frame_count}")
+
+        if frame_count:
+            self.frames = np.memmap(
+                file_path, dtype='<u2', mode='r', offset=ThermogramWriter.HEADER_SIZE,
+                shape=(frame_count, self.height, self.width)
+            )
+        else:
+            self.frames = np.zeros((0, self.height, self.width), dtype=np.uint16)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __getitem__(self, key) -> np.ndarray:
+        return self.frames[key]
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.frames.shape
+
+    def frame(self, index: int) -> np.ndarray:
+        """Возвращает кадр index как массив (высота, ширина) без копирования"""
+        return self.frames[index]
+
+    def pixel_series(self, y: int, x: int) -> np.ndarray:
+        """Возвращает временной ряд пикселя (y, x) без копирования"""
+        return self.frames[:, y, x]
+
+    def close(self):
+        """Освобождает отображение файла (нужно перед удалением файла в Windows)"""
+        mm = getattr(self.frames, '_mmap', None)
+        self.frames = np.zeros((0, self.height, self.width), dtype=np.uint16)
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                # Остались срезы у вызывающего кода: файл закроется вместе с ними
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# ==================== NPY SEQUENCE ====================
+class NpySequenceWriter:
+    """
+    Запись последовательности кадров в .npy дозаписью.
+
+    Число кадров заранее неизвестно: заголовок резервируется под
+    MAX_FRAMES_DIGITS-значное число кадров и переписывается в close(), так что
+    готовый файл открывается np.load(path, mmap_mode='r') без копирования.
+    До close() запись идёт в file_path + '.part', который затем заменяет
+    file_path: файл по этому пути всегда целый, а его заголовок - верный.
+    """
+
+    EXTENSION = '.npy'
+    MAX_FRAMES_DIGITS = 12
+
+    def __init__(self, file_path: str, frame_shape: Tuple[int, ...], dtype=np.float32):
+        self.file_path = file_path
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.frames_written = 0
+        # Магия (6), версия (2), длина текста (2), текст с '\n', кратно 64 байтам
+        longest = len(self._describe(10 ** self.MAX_FRAMES_DIGITS - 1)) + 11
+        self._header_size = -(-longest // 64) * 64
+        self._temporary = file_path + '.part'
+        self._file = open(self._temporary, 'wb')
+        self._file.write(self._header(0))
+
+    def _describe(self, frames: int) -> str:
+        return repr({
+            'descr': np.lib.format.dtype_to_descr(self.dtype),
+            'fortran_order': False,
+            'shape': (frames,) + self.frame_shape,
+        })
+
+    def _header(self, frames: int) -> bytes:
+        text = self._describe(frames).ljust(self._header_size - 11) + '\n'
+        return np.lib.format.magic(1, 0) + struct.pack('<H', len(text)) + text.encode('latin1')
+
+    def write(self, frame: np.ndarray):
+        """Дописывает кадр (форма frame_shape, тип dtype)"""
+        self._file.write(np.ascontiguousarray(frame, dtype=self.dtype).data)
+        self.frames_written += 1
+
+    def close(self):
+        """Записывает итоговое число кадров в заголовок и публикует файл"""
+        if self._file is None:
+            return
+        try:
+            self._file.seek(0)
+            self._file.write(self._header(self.frames_written))
+        finally:
+            self._file.close()
+            self._file = None
+        os.replace(self._temporary, self.file_path)
+
+
+# ==================== RANDOM ACCESS ====================
+class FrameSource(ABC):
+    """
+    Чтение отдельных кадров записи по номеру (для просмотра).
+    Открытие не читает кадры: только заголовок или оглавление файла.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def read(self, index: int) -> np.ndarray:
+        """Кадр index (массив только для чтения, может ссылаться на файл)"""
+        pass
+
+    def close(self):
+        pass
+
+
+class ArrayFrameSource(FrameSource):
+    """Термограмма (.tgs) или последовательность .npy, отображённые на память"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        if path.endswith(ThermogramWriter.EXTENSION):
+            self._reader: Optional[ThermogramReader] = ThermogramReader(path)
+            self.frames = self._reader.frames
+        else:
+            self._reader = None
+            self.frames = np.load(path, mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def read(self, index: int) -> np.ndarray:
+        return self.frames[index]
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+        self.frames = None
+
+
+class PngFrameSource(FrameSource):
+    """Папка PngSequenceBackend: кадр - отдельный файл"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._files = sorted(name for name in os.listdir(path) if name.endswith('.png'))
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def read(self, index: int) -> np.ndarray:
+        frame = cv2.imread(os.path.join(self.path, self._files[index]), cv2.IMREAD_UNCHANGED)
+        if frame is None:
+            raise RecordingError(f"Не удалось прочитать кадр {index} из {self.path}")
+        return frame
+
+
+class NpyChunkFrameSource(FrameSource):
+    """
+    Файл CompressedNpyBackend. При открытии строится оглавление блоков (с
+    диска читаются только длины блоков), кадр распаковывает один свой блок;
+    последний распакованный блок запоминается для соседних кадров.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._file = open(path, 'rb')
+        self._decompress = _npy_chunks_decompressor(self._file, path)
+        self._chunks: List[Tuple[int, int]] = []     # (смещение, длина) каждого блока
+        file_size = os.fstat(self._file.fileno()).st_size
+        offset = self._file.tell()
+        while offset + CompressedNpyBackend.CHUNK_SIZE.size <= file_size:
+            self._file.seek(offset)
+            (size,) = CompressedNpyBackend.CHUNK_SIZE.unpack(self._file.read(CompressedNpyBackend.CHUNK_SIZE.size))
+            offset += CompressedNpyBackend.CHUNK_SIZE.size
+            if offset + size > file_size:
+                logger.warning(f"Незавершённый блок в {path}")
+                break
+            self._chunks.append((offset, size))
+            offset += size
+        self._cached_index = -1
+        self._cached_chunk: Optional[np.ndarray] = None
+        # Неполным может быть только последний блок
+        self._frames = 0
+        if self._chunks:
+            self._frames = (len(self._chunks) - 1) * CompressedNpyBackend.CHUNK_FRAMES
+            self._frames += len(self._chunk(len(self._chunks) - 1))
+
+    def _chunk(self, index: int) -> np.ndarray:
+        if index != self._cached_index:
+            offset, size = self._chunks[index]
+            self._file.seek(offset)
+            data = self._decompress(self._file.read(size))
+            self._cached_chunk = np.lib.format.read_array(io.BytesIO(data), allow_pickle=False)
+            self._cached_index = index
+        return self._cached_chunk
+
+    def __len__(self) -> int:
+        return self._frames
+
+    def read(self, index: int) -> np.ndarray:
+        if not 0 <= index < self._frames:
+            raise IndexError(f"Кадр {index} вне записи {self.path}")
+        return self._chunk(index // CompressedNpyBackend.CHUNK_FRAMES)[index % CompressedNpyBackend.CHUNK_FRAMES]
+
+    def close(self):
+        self._file.close()
+        self._cached_chunk = None
+
+
+class VideoFrameSource(FrameSource):
+    """
+    Видеофайл через cv2.VideoCapture. Следующий кадр читается без
+    перемотки; переход к произвольному декодирует от ближайшего ключевого
+    кадра, поэтому последний прочитанный кадр запоминается.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._capture = cv2.VideoCapture(path)
+        if not self._capture.isOpened():
+            raise RecordingError(f"Не удалось открыть {path}")
+        self._frames = int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._next = 0
+        self._last: Optional[Tuple[int, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return self._frames
+
+    def read(self, index: int) -> np.ndarray:
+        if self._last is not None and self._last[0] == index:
+            return self._last[1]
+        if index != self._next:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ok, frame = self._capture.read()
+        if not ok:
+            raise RecordingError(f"Не удалось прочитать кадр {index} из {self.path}")
+        self._next = index + 1
+        self._last = (index, frame)
+        return frame
+
+    def close(self):
+        self._capture.release()
+        self._last = None
+
+
+def open_frame_source(path: str) -> FrameSource:
+    """Открывает запись любого формата записи (RecorderBackend, .tgs, .npy) для чтения кадров"""
+    if os.path.isdir(path):
+        return PngFrameSource(path)
+    if path.endswith((ThermogramWriter.EXTENSION, NpySequenceWriter.EXTENSION)):
+        return ArrayFrameSource(path)
+    if path.endswith(CompressedNpyBackend.extension):
+        return NpyChunkFrameSource(path)
+    return VideoFrameSource(path)
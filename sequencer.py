@@ -0,0 +1,235 @@
+"""
+Модуль точного выполнения циклограммы нагрева и записи
+"""
+
+import logging
+import sys
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from PySide6.QtCore import QThread, Signal
+
+from profiles import HeatingProfile
+from sync import COOLING_EVENT, HEATING_EVENT
+
+logger = logging.getLogger(__name__)
+
+# Шаги циклограммы контроля зоны (кроме событий нагрева sync.HEATING_EVENT / COOLING_EVENT)
+RECORDING_START = 'recording_start'
+RECORDING_STOP = 'recording_stop'
+# Шаги включения и выключения нагрева, отмечаемые событиями записи
+HEATER_STEPS = (HEATING_EVENT, COOLING_EVENT)
+# Промежуточные фронты профиля нагрева
+MODULATION_ON = 'modulation_on'
+MODULATION_OFF = 'modulation_off'
+# Все фронты нагрева: шаг -> состояние нагревателя после него
+EDGE_STATES = {HEATING_EVENT: True, MODULATION_ON: True, MODULATION_OFF: False, COOLING_EVENT: False}
+
+# Запись начинается раньше нагрева: файлы открыты до первого фронта
+RECORDING_LEAD = 0.2    # с
+
+
+class ScheduledStep(NamedTuple):
+    """Шаг циклограммы"""
+    offset: float                   # с от начала циклограммы
+    name: str
+    action: Callable[[], None]
+    critical: bool = True           # ошибка прерывает циклограмму
+
+
+class StepTiming(NamedTuple):
+    """Выполненный шаг; времена - time.monotonic(), как у кадров камер"""
+    name: str
+    planned: float                  # Плановое время
+    actual: float                   # Начало действия
+    confirmed: float                # Завершение действия (ответ устройства)
+    error: Optional[str] = None
+
+    @property
+    def lateness(self) -> float:
+        """Опоздание начала действия относительно плана, с"""
+        return self.actual - self.planned
+
+
+class Sequencer(QThread):
+    """
+    Выполнение циклограммы в отдельном потоке по монотонным часам.
+
+    Одноразовые QTimer главного окна срабатывают, когда освободится цикл
+    событий Qt: диалог, преобразование кадра или сборка мусора сдвигают
+    выключение нагрева на десятки и сотни миллисекунд. Здесь поток ждёт
+    шага на threading.Event (прерываемо) до SPIN_MARGIN до срока, затем
+    досчитывает время по time.perf_counter() в цикле: точность не зависит
+    ни от загрузки GUI, ни от шага системного таймера (15,6 мс в Windows).
+
+    Сроки отсчитываются по perf_counter, а в отчёт переводятся в
+    time.monotonic() через общую опорную точку, чтобы совпадать с
+    метками кадров и событий записи. После каждого шага в этом же потоке
+    вызывается on_step (отметка события в записи), затем испускается
+    step_done. Ошибка критичного шага прерывает циклограмму.
+
+    Прерванная циклограмма выполняет действия on_abort (выключение нагрева,
+    остановка записи) в своём потоке после текущего шага: abort() не ждёт
+    подтверждения команды, а выключение гарантированно следует за уже
+    начатым включением, а не обгоняет его.
+    """
+
+    SPIN_MARGIN = 0.02      # с, досчёт времени в цикле перед сроком шага
+    SPIN_SWITCH_INTERVAL = 0.0005   # с, интервал переключения GIL на время досчёта
+
+    step_done = Signal(str, float, float)   # шаг, плановое и фактическое время (time.monotonic)
+    step_failed = Signal(str, str)          # шаг, текст ошибки
+    sequence_finished = Signal(dict)        # stats(); 'completed' - все шаги выполнены
+
+    def __init__(self, steps: Sequence[ScheduledStep],
+                 on_step: Optional[Callable[[StepTiming], None]] = None,
+                 on_abort: Sequence[Callable[[], None]] = (), parent=None):
+        super().__init__(parent)
+        self.steps = sorted(steps, key=lambda step: step.offset)
+        self.on_step = on_step
+        self.on_abort = list(on_abort)
+        self.timings: List[StepTiming] = []
+        self.completed = False
+        self._abort = threading.Event()
+        self._anchor = (0.0, 0.0)   # (time.monotonic(), time.perf_counter()) начала циклограммы
+        self._switch_interval = sys.getswitchinterval()
+
+    def abort(self):
+        """Прерывает циклограмму: оставшиеся шаги не выполняются, выполняется on_abort"""
+        self._abort.set()
+
+    def _to_monotonic(self, perf_time: float) -> float:
+        return self._anchor[0] + (perf_time - self._anchor[1])
+
+    def _wait_until(self, deadline: float) -> bool:
+        """
+        Ждёт срока по perf_counter; False - циклограмма прервана. На время
+        досчёта интервал переключения GIL уменьшается до SPIN_SWITCH_INTERVAL
+        (восстанавливает run() после действия шага): занятый Python-кодом
+        главный поток отдаёт GIL через доли миллисекунды, а не через 5 мс.
+        """
+        remaining = deadline - time.perf_counter() - self.SPIN_MARGIN
+        if remaining > 0 and self._abort.wait(remaining):
+            return False
+        sys.setswitchinterval(min(self._switch_interval, self.SPIN_SWITCH_INTERVAL))
+        while time.perf_counter() < deadline:
+            if self._abort.is_set():
+                return False
+        return not self._abort.is_set()
+
+    def run(self):
+        self._switch_interval = sys.getswitchinterval()
+        self._anchor = (time.monotonic(), time.perf_counter())
+        start = self._anchor[1]
+        for step in self.steps:
+            deadline = start + step.offset
+            try:
+                if not self._wait_until(deadline):
+                    logger.warning(f"Циклограмма прервана перед шагом {step.name}")
+                    break
+                actual = time.perf_counter()
+                error = None
+                try:
+                    step.action()
+                except Exception as e:
+                    error = str(e)
+            finally:
+                sys.setswitchinterval(self._switch_interval)
+            timing = StepTiming(
+                step.name, self._to_monotonic(deadline), self._to_monotonic(actual),
+                self._to_monotonic(time.perf_counter()), error
+            )
+            self.timings.append(timing)
+            logger.info(
+                f"Шаг {step.name}: опоздание {timing.lateness * 1000:.3f} мс, "
+                f"выполнение {(timing.confirmed - timing.actual) * 1000:.1f} мс"
+            )
+            if error is not None:
+                logger.error(f"Ошибка шага {step.name}: {error}")
+                self.step_failed.emit(step.name, error)
+                if step.critical:
+                    break
+                continue
+            if self.on_step is not None:
+                try:
+                    self.on_step(timing)
+                except Exception as e:
+                    logger.error(f"Ошибка обработки шага {step.name}: {e}")
+            self.step_done.emit(step.name, timing.planned, timing.actual)
+        else:
+            self.completed = not self._abort.is_set()
+        if not self.completed:
+            for action in self.on_abort:
+                try:
+                    action()
+                except Exception as e:
+                    logger.error(f"Ошибка завершения прерванной циклограммы: {e}")
+        self.sequence_finished.emit(self.stats())
+
+    def stats(self) -> dict:
+        """Опоздание и длительность каждого выполненного шага, мс"""
+        return {
+            'completed': self.completed,
+            'steps': [
+                {
+                    'name': timing.name,
+                    'lateness_ms': round(timing.lateness * 1000, 3),
+                    'duration_ms': round((timing.confirmed - timing.actual) * 1000, 3),
+                    'error': timing.error,
+                }
+                for timing in self.timings
+            ],
+        }
+
+
+class JitterStats:
+    """Накопленная статистика опоздания шагов циклограмм за сессию"""
+
+    def __init__(self):
+        self.lateness: List[float] = []
+
+    def add(self, timings: Sequence[StepTiming]):
+        self.lateness.extend(timing.lateness for timing in timings if timing.error is None)
+
+    def summary(self) -> dict:
+        """Опоздание шагов, мс: среднее, 95-й процентиль, наибольшее"""
+        if not self.lateness:
+            return {'steps': 0}
+        lateness = np.array(self.lateness) * 1000
+        return {
+            'steps': len(lateness),
+            'mean_ms': round(float(lateness.mean()), 3),
+            'p95_ms': round(float(np.percentile(lateness, 95)), 3),
+            'max_ms': round(float(lateness.max()), 3),
+        }
+
+
+def testing_schedule(profile: HeatingProfile, duration_of_testing: float,
+                     start_recording: Callable[[], None], heater_on: Callable[[], None],
+                     heater_off: Callable[[], None], stop_recording: Callable[[], None],
+                     lead: float = RECORDING_LEAD) -> List[ScheduledStep]:
+    """
+    Циклограмма контроля зоны: начало записи, через lead - фронты профиля
+    нагрева (первое включение - HEATING_EVENT, последнее выключение -
+    COOLING_EVENT, промежуточные - MODULATION_ON/OFF), через
+    duration_of_testing от начала профиля - конец записи.
+
+    Ошибка включения прерывает циклограмму (прерванная выключает нагрев),
+    ошибка выключения - нет: запись охлаждения продолжается (как и раньше,
+    о ней сообщается оператору), как и ошибка остановки записи - завершение
+    контроля зоны.
+    """
+    edges = profile.edges()
+    steps = [ScheduledStep(0.0, RECORDING_START, start_recording)]
+    for index, (offset, state) in enumerate(edges):
+        if index == 0:
+            name = HEATING_EVENT
+        elif index == len(edges) - 1:
+            name = COOLING_EVENT
+        else:
+            name = MODULATION_ON if state else MODULATION_OFF
+        steps.append(ScheduledStep(lead + offset, name, heater_on if state else heater_off, critical=state))
+    steps.append(ScheduledStep(lead + duration_of_testing, RECORDING_STOP, stop_recording, critical=False))
+    return steps
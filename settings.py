@@ -62,6 +62,8 @@ class Settings(QObject):
     visible_camera_previewFPS: int = 30
     visible_camera_record: bool = False
     visible_camera_recordFPS: int = 5
+    visible_camera_record_averaging: bool = False  # Усреднять пропущенные при прореживании кадры
+    visible_camera_record_format: str = 'xvid'  # Ключ формата из recording.RECORDER_BACKENDS
 
     # Общие настройки камеры (тепловизора)
     thermal_camera_index: int = 0
@@ -69,12 +71,43 @@ class Settings(QObject):
     thermal_camera_previewFPS: int = 20
     thermal_camera_record: bool = True
     thermal_camera_recordFPS: int = 5
+    thermal_camera_record_averaging: bool = False
+    thermal_camera_record_format: str = 'xvid'
+    thermal_camera_record_radiometric: bool = True  # Запись сырых данных uint16 (тепловизоры с supports_radiometric(): Optris и заглушка)
     thermal_camera_type: str = 'optris'  # Тип тепловизора
     thermal_camera_xml_path: str = 'generic.xml'  # Путь к XML-конфигурации
 
+    # Настройки фоновой записи
+    record_queue_size: int = 16                 # Кадров в очереди записи каждой камеры (FLIR: 8,5 МБ на кадр)
+    record_backpressure: str = 'drop_oldest'    # 'block', 'drop_oldest' или 'drop_newest'
+    pretrigger_seconds: int = 3                 # Секунд до начала записи, которые попадут в файл (0 - выкл.)
+    pretrigger_memory_mb: int = 256             # Лимит памяти предзаписи на камеру
+    background_subtraction: str = 'mean'        # Фон термограммы до нагрева: 'mean', 'median' или 'off'
+    background_median_frames: int = 15          # Кадров в окне медианного фона
+
+    # Фоновая обработка зон (ключи jobs.ALGORITHMS)
+    processing_algorithms: List[str] = field(default_factory=lambda: ['bs', 'fft', 'pca', 'tsr'])
+    processing_workers: int = 1                 # Процессов обработки (каждому нужна память полосы ~64 МБ)
+    cache_size_mb: int = 2048                   # Предельный размер кэша результатов в папке сохранения
+    mosaic_algorithm: str = 'pca'               # Результат в мозаике зон (ключ jobs.RESULT_IMAGES, '' - выкл.)
+    mosaic_overlap: float = 0.2                 # Номинальная доля перекрытия соседних зон
+
+    # Профиль нагрева (ключ profiles.PROFILE_KINDS); heating_duration - полная длительность нагрева
+    heating_profile: str = 'pulse'
+    modulation_frequency: float = 0.2           # Гц, серия импульсов и синусоидальная модуляция
+    pulse_duty: float = 0.5                     # Доля включения в периоде серии импульсов
+    pwm_frequency: float = 5.0                  # Гц, несущая ШИМ синусоидальной модуляции
+
+    # Синхронизация камер
+    sync_tolerance_ms: int = 50                 # Допуск сопоставления кадров тепловизора и видимой камеры
+
     # Настройки нагревателя
     heater_COM_port_number: int = 0
     heater_baud_rate: int = 9600
+    heater_timeout: float = 0.5                 # с, ожидание подтверждения одной попытки команды
+    # с, проверка связи с контроллером между зонами (0 - выкл). В протоколе нет
+    # запроса состояния: проверка - команда выключения COMMAND2 (HeaterClient.set_poll_interval)
+    heater_poll_interval: float = 0.0
 
     _instance = None
 
@@ -121,6 +154,10 @@ class Settings(QObject):
         self.visible_camera_recordFPS = fps
         self.data_changed.emit()
 
+    def set_visible_camera_record_format(self, record_format: str):
+        self.visible_camera_record_format = record_format
+        self.data_changed.emit()
+
     def set_thermal_camera_index(self, index: int):
         self.thermal_camera_index = index
         self.data_changed.emit()
@@ -137,6 +174,10 @@ class Settings(QObject):
         self.thermal_camera_recordFPS = fps
         self.data_changed.emit()
 
+    def set_thermal_camera_record_format(self, record_format: str):
+        self.thermal_camera_record_format = record_format
+        self.data_changed.emit()
+
     def set_heater_COM_port_number(self, number: int):
         self.heater_COM_port_number = number
         self.data_changed.emit()
@@ -0,0 +1,422 @@
+"""
+Модуль синхронизации кадров камер
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== CLOCK MODEL ====================
+class ClockModel:
+    """
+    Оценка смещения и дрейфа часов камеры относительно time.monotonic().
+
+    Метка хоста ставится после того, как SDK отдал кадр, и включает
+    случайную задержку доставки. Аппаратная метка камеры джиттера не имеет,
+    но идёт по своим часам. Из каждого интервала BUCKET по часам камеры
+    берётся кадр с наименьшей задержкой (нижняя огибающая), по этим точкам
+    за последние WINDOW интервалов наклон 1 / (1 + дрейф) оценивается методом
+    наименьших квадратов, а смещение - по наименьшей задержке в окне.
+    Скорректированное время кадра = смещение + наклон * время камеры.
+    """
+
+    BUCKET = 0.5        # с, интервал выбора кадра с наименьшей задержкой
+    WINDOW = 240        # Интервалов в окне оценки (2 минуты)
+    MIN_SPAN = 2.0      # с, минимальный охват окна для оценки
+
+    def __init__(self):
+        self._device = np.zeros(self.WINDOW, dtype=np.float64)
+        self._host = np.zeros(self.WINDOW, dtype=np.float64)
+        self.resets = 0     # Перезапуски часов камеры
+        self.reset()
+
+    def reset(self):
+        """Сбрасывает оценку (камера переподключена, часы камеры начались заново)"""
+        self._count = 0
+        self._last_device: Optional[float] = None
+        self._bucket: Optional[int] = None
+        self._bucket_min: Optional[Tuple[float, float]] = None     # (время камеры, время хоста)
+        self.slope = 1.0
+        self.offset = 0.0
+        self.ready = False
+
+    @property
+    def drift_ppm(self) -> float:
+        """Дрейф часов камеры относительно хоста, миллионные доли (> 0 - камера спешит)"""
+        return (1.0 / self.slope - 1.0) * 1e6
+
+    def update(self, host_time: float, device_time: float) -> float:
+        """Добавляет пару меток и возвращает скорректированное время кадра"""
+        if self._last_device is not None and device_time <= self._last_device:
+            self.reset()
+            self.resets += 1
+        self._last_device = device_time
+
+        bucket = int(device_time // self.BUCKET)
+        if bucket != self._bucket:
+            if self._bucket_min is not None:
+                self._add_point(*self._bucket_min)
+            self._bucket = bucket
+            self._bucket_min = None
+        if self._bucket_min is None or host_time - device_time < self._bucket_min[1] - self._bucket_min[0]:
+            self._bucket_min = (device_time, host_time)
+
+        if not self.ready:
+            # Пока окно короткое, наклон не оценить - используем время хоста
+            return host_time
+        # Кадр с задержкой меньше оценённой сдвигает огибающую сразу
+        self.offset = min(self.offset, host_time - self.slope * device_time)
+        return self.offset + self.slope * device_time
+
+    def _add_point(self, device_time: float, host_time: float):
+        index = self._count % self.WINDOW
+        self._device[index] = device_time
+        self._host[index] = host_time
+        self._count += 1
+
+        n = min(self._count, self.WINDOW)
+        device = self._device[:n]
+        host = self._host[:n]
+        if device.max() - device.min() < self.MIN_SPAN:
+            return
+        device_centered = device - device.mean()
+        self.slope = float(np.dot(device_centered, host - host.mean()) / np.dot(device_centered, device_centered))
+        self.offset = float(np.min(host - self.slope * device))
+        self.ready = True
+
+    def stats(self) -> dict:
+        # Смещение на момент последнего кадра нагляднее, чем в нуле часов камеры
+        last_device = self._last_device or 0.0
+        return {
+            'ready': self.ready,
+            'offset': round(self.offset + (self.slope - 1.0) * last_device, 6),
+            'drift_ppm': round(self.drift_ppm, 2),
+            'resets': self.resets,
+        }
+
+
+# ==================== FRAME SYNCHRONIZER ====================
+class FramePair(NamedTuple):
+    """Совпавшие по времени кадры камер: номера кадров в FrameRing каждой камеры"""
+    time: float                 # Скорректированное время кадра опорной камеры
+    seqs: Dict[str, int]
+    skew: float                 # Наибольшее расхождение по времени с опорным кадром, с
+
+
+class _StreamState:
+    def __init__(self):
+        self.clock = ClockModel()
+        self.recent = deque(maxlen=64)      # (скорректированное время, seq)
+        self.last_counter: Optional[int] = None
+        self.hw_dropped = 0                 # Пропуски аппаратного счётчика кадров
+        self.frames = 0
+
+
+class FrameSynchronizer:
+    """
+    Синхронизация кадров нескольких камер.
+
+    Потоки захвата вызывают stamp() для каждого кадра (из своих потоков,
+    поэтому состояние защищено блокировкой). Кадр опорной камеры (тепловизор)
+    сопоставляется с ближайшими кадрами остальных камер, как только у них
+    появился кадр позже него на допуск: ближе уже ничего не придёт. Если у
+    всех камер нашёлся кадр в пределах допуска, выдаётся FramePair.
+    """
+
+    PENDING_TIMEOUT = 1.0   # с, после которого опорный кадр без пары отбрасывается
+
+    def __init__(self, reference: str, tolerance: float):
+        self.reference = reference
+        self.tolerance = tolerance
+        self.pairs_matched = 0
+        self.pairs_unmatched = 0
+        self.latest_pair: Optional[FramePair] = None
+        self._listeners: List[Callable[[FramePair], None]] = []
+        self._streams: Dict[str, _StreamState] = {}
+        self._pending = deque()             # Опорные кадры, ожидающие пары
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[FramePair], None]):
+        """Подписывает listener на новые пары (вызывается из потока захвата)"""
+        self._listeners.append(listener)
+
+    def stamp(self, name: str, seq: int, host_time: float,
+              device_time: Optional[float] = None, counter: Optional[int] = None) -> float:
+        """
+        Отмечает кадр камеры name и возвращает его скорректированное время.
+
+        Args:
+            seq: номер кадра в FrameRing камеры
+            host_time: time.monotonic() в момент захвата
+            device_time: аппаратная метка времени камеры, с (если есть)
+            counter: аппаратный счётчик кадров (если есть)
+        """
+        pairs = []
+        with self._lock:
+            stream = self._streams.get(name)
+            if stream is None:
+                stream = self._streams[name] = _StreamState()
+            stream.frames += 1
+            if counter is not None:
+                if stream.last_counter is not None and counter > stream.last_counter + 1:
+                    stream.hw_dropped += counter - stream.last_counter - 1
+                stream.last_counter = counter
+
+            sync_time = host_time
+            if device_time is not None:
+                sync_time = stream.clock.update(host_time, device_time)
+            stream.recent.append((sync_time, seq))
+            if name == self.reference:
+                self._pending.append((sync_time, seq))
+            self._match_pending(pairs)
+
+        for pair in pairs:
+            for listener in self._listeners:
+                listener(pair)
+        return sync_time
+
+    def _match_pending(self, pairs: List[FramePair]):
+        others = [(name, s) for name, s in self._streams.items() if name != self.reference]
+        if not others:
+            self._pending.clear()
+            return
+        while self._pending:
+            ref_time, ref_seq = self._pending[0]
+            if any(not s.recent or s.recent[-1][0] < ref_time + self.tolerance for _, s in others):
+                # Хотя бы одна камера ещё может прислать более близкий кадр
+                if self._latest_time() - ref_time < self.PENDING_TIMEOUT:
+                    return
+                self._pending.popleft()
+                self.pairs_unmatched += 1
+                continue
+
+            self._pending.popleft()
+            seqs = {self.reference: ref_seq}
+            skew = 0.0
+            for name, stream in others:
+                other_time, other_seq = min(stream.recent, key=lambda item: abs(item[0] - ref_time))
+                dt = abs(other_time - ref_time)
+                if dt > self.tolerance:
+                    break
+                seqs[name] = other_seq
+                skew = max(skew, dt)
+            else:
+                pair = FramePair(ref_time, seqs, skew)
+                self.latest_pair = pair
+                self.pairs_matched += 1
+                pairs.append(pair)
+                continue
+            self.pairs_unmatched += 1
+
+    def _latest_time(self) -> float:
+        return max(s.recent[-1][0] for s in self._streams.values() if s.recent)
+
+    def stats(self) -> dict:
+        """Возвращает оценки часов камер и счётчики сопоставления"""
+        with self._lock:
+            return {
+                'pairs_matched': self.pairs_matched,
+                'pairs_unmatched': self.pairs_unmatched,
+                'cameras': {
+                    name: {**s.clock.stats(), 'frames': s.frames, 'hw_dropped': s.hw_dropped}
+                    for name, s in self._streams.items()
+                },
+            }
+
+
+# ==================== SIDECAR ====================
+SIDECAR_SUFFIX = '_sidecar.json'
+SIDECAR_VERSION = 1
+
+# События записи
+HEATING_EVENT = 'heater_on'     # Отделяет фон термограммы от нагрева
+COOLING_EVENT = 'heater_off'    # Начало охлаждения
+
+
+def pair_streams(reference_times, other_times, tolerance: float):
+    """
+    Сопоставляет каждому кадру опорного файла ближайший по времени кадр
+    другого файла. Возвращает массивы индексов обоих файлов и расхождений
+    (с) только для пар в пределах допуска. Времена должны быть возрастающими.
+    """
+    reference_times = np.asarray(reference_times, dtype=np.float64)
+    other_times = np.asarray(other_times, dtype=np.float64)
+    if len(reference_times) == 0 or len(other_times) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+
+    right = np.clip(np.searchsorted(other_times, reference_times), 0, len(other_times) - 1)
+    left = np.clip(right - 1, 0, len(other_times) - 1)
+    take_left = np.abs(other_times[left] - reference_times) < np.abs(other_times[right] - reference_times)
+    nearest = np.where(take_left, left, right)
+    dt = other_times[nearest] - reference_times
+    matched = np.abs(dt) <= tolerance
+    return np.flatnonzero(matched), nearest[matched], dt[matched]
+
+
+def _frames_after(recordings: Dict[str, dict], event_time: float) -> Dict[str, Optional[int]]:
+    """Первый кадр каждого файла, снятый не раньше event_time: 'камера.поток' -> i"""
+    frames = {}
+    for name, recording in recordings.items():
+        for stream, times in recording['times'].items():
+            index = int(np.searchsorted(np.asarray(times, dtype=np.float64), event_time))
+            frames[f"{name}.{stream}"] = index if index < len(times) else None
+    return frames
+
+
+def build_sidecar(reference: str, tolerance: float, recordings: Dict[str, dict],
+                  sync_stats: Optional[dict] = None, events: Optional[List[dict]] = None,
+                  modulation: Optional[dict] = None, heater: Optional[dict] = None) -> dict:
+    """
+    Собирает содержимое sidecar-файла записи.
+
+    recordings: {камера: {'files': {поток: путь}, 'times': {поток: [время кадра]}}},
+    где поток - 'video' или 'thermogram', а i-е время соответствует i-му кадру
+    файла. Пары строятся для каждого файла опорной камеры с каждым файлом
+    остальных камер: 'thermal.thermogram:visible.video' -> [[i, j, dt_мс], ...].
+    Для событий (events: {'name', 'time', ...}) указывается первый кадр
+    каждого файла, снятый не раньше события: 'thermal.thermogram' -> i.
+
+    modulation: {'profile': profiles.HeatingProfile.to_dict(), 'start': время
+    начала профиля, 'edges': [{'state', 'time', ...}]} - фронты нагрева
+    профиля; для каждого фронта указываются кадры, как для событий, а для
+    каждого файла сохраняются времена кадров от начала профиля (с), чтобы
+    опорный сигнал lock-in строился по фактическим моментам кадров.
+
+    heater: телеметрия канала нагревателя за время записи
+    (heater.HeaterTelemetry.series) - сохраняется как есть.
+    """
+    cameras = {}
+    for name, recording in recordings.items():
+        cameras[name] = {
+            'files': {stream: os.path.basename(path) for stream, path in recording['files'].items()},
+            'frames': {stream: len(times) for stream, times in recording['times'].items()},
+        }
+        if sync_stats is not None and name in sync_stats.get('cameras', {}):
+            cameras[name]['clock'] = sync_stats['cameras'][name]
+
+    pairs = {}
+    reference_recording = recordings.get(reference)
+    if reference_recording is not None:
+        for name, recording in recordings.items():
+            if name == reference:
+                continue
+            for ref_stream, ref_times in reference_recording['times'].items():
+                for stream, times in recording['times'].items():
+                    ref_idx, other_idx, dt = pair_streams(ref_times, times, tolerance)
+                    pairs[f"{reference}.{ref_stream}:{name}.{stream}"] = [
+                        [int(i), int(j), round(float(d) * 1000, 3)]
+                        for i, j, d in zip(ref_idx, other_idx, dt)
+                    ]
+
+    marked_events = [{**event, 'frames': _frames_after(recordings, event['time'])} for event in events or []]
+
+    sidecar = {
+        'version': SIDECAR_VERSION,
+        'clock': 'time.monotonic',
+        'reference': reference,
+        'tolerance_ms': round(tolerance * 1000, 3),
+        'cameras': cameras,
+        'events': marked_events,
+        'pairs': pairs,
+    }
+    if modulation is not None:
+        start = modulation['start']
+        sidecar['modulation'] = {
+            'profile': modulation['profile'],
+            'start': start,
+            'edges': [{**edge, 'frames': _frames_after(recordings, edge['time'])} for edge in modulation['edges']],
+            'times': {
+                f"{name}.{stream}": [round(float(t) - start, 6) for t in times]
+                for name, recording in recordings.items() for stream, times in recording['times'].items()
+            },
+        }
+    if heater is not None:
+        sidecar['heater'] = heater
+    return sidecar
+
+
+def write_sidecar(path: str, sidecar: dict):
+    """Записывает sidecar-файл записи (JSON)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(sidecar, f, ensure_ascii=False)
+    logger.info(f"Записан файл синхронизации: {path}")
+
+
+def read_sidecar(path: str) -> dict:
+    """Читает sidecar-файл записи"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def event_frame(sidecar: dict, name: str, stream: str = 'thermal.thermogram') -> Optional[int]:
+    """
+    Номер первого кадра файла stream ('камера.поток'), снятого не раньше
+    события name (последнего с таким именем), или None.
+    """
+    for event in reversed(sidecar.get('events', [])):
+        if event['name'] == name:
+            return event['frames'].get(stream)
+    return None
+
+
+def paired_frame(sidecar: dict, index: int, pair: str = 'thermal.thermogram:visible.video') -> Optional[int]:
+    """
+    Кадр второго файла пары pair ('камера.поток:камера.поток', см.
+    build_sidecar), сопоставленный кадру index первого; если для index пары
+    нет - сопоставленный ближайшему кадру. None, если пара не записана.
+    """
+    pairs = sidecar.get('pairs', {}).get(pair)
+    if not pairs:
+        return None
+    reference = [i for i, _, _ in pairs]
+    position = int(np.searchsorted(reference, index))
+    if position == len(pairs) or (position > 0 and index - reference[position - 1] < reference[position] - index):
+        position -= 1
+    return pairs[position][1]
+
+
+def modulation_timeline(sidecar: dict, stream: str = 'thermal.thermogram') -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Времена кадров файла stream от начала профиля нагрева (с) и фактическое
+    состояние нагревателя (0/1) на каждом кадре - по моментам отправки
+    команд фронтов. None, если запись без профиля или без этого файла.
+    """
+    modulation = sidecar.get('modulation')
+    if modulation is None or stream not in modulation['times']:
+        return None
+    times = np.asarray(modulation['times'][stream], dtype=np.float64)
+    edges = modulation['edges']
+    edge_times = np.array([edge['time'] - modulation['start'] for edge in edges], dtype=np.float64)
+    edge_states = np.array([bool(edge['state']) for edge in edges] + [False], dtype=np.float32)
+    # -1 (кадр раньше всех фронтов) выбирает последний элемент - выключен
+    state = edge_states[np.searchsorted(edge_times, times, side='right') - 1]
+    return times, state
+
+
+def heater_telemetry(sidecar: dict) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Телеметрия канала нагревателя записи по столбцам: время от начала
+    записи (с), время ответа (мс), номер попытки, исход и т.д.; несообщённые
+    контроллером значения - NaN. None, если запись без телеметрии.
+    """
+    heater = sidecar.get('heater')
+    if heater is None:
+        return None
+    columns = {}
+    for name, values in heater.items():
+        if name == 'start':
+            continue
+        if name in ('command', 'outcome'):
+            columns[name] = np.array(values, dtype=str)
+        else:
+            columns[name] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    return columns